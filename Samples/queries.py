@@ -100,3 +100,13 @@ rs.get("bl_54e2e7228e9e44ec9e17e7848759e867", "?")
 """
 {'count': 2, 'key': ['1', '2'], 'result': [{'content': 'global item'}, {'content': 'global item 2'}]}
 """
+
+rs.get("bl_54e2e7228e9e44ec9e17e7848759e867", "*", Rocketstore._ORDER_NUMERIC | Rocketstore._KEYS)
+"""
+{'count': 7, 'key': ['1', '2', '3-ses_784dac38ee0c4f709bddc0deb0b421bd', '4-ses_784dac38ee0c4f709bddc0deb0b421bd', '5-ses_784dac38ee0c4f709bddc0deb0b421bd', '6-ses_784dac38ee0c4f709bddc0deb0b421bd', '7-ses_784dac38ee0c4f709bddc0deb0b421bd']}
+"""
+
+rs.get("bl_54e2e7228e9e44ec9e17e7848759e867", "*ses_784dac38ee0c4f709bddc0deb0b421bd", latest=2)
+"""
+{'count': 2, 'key': ['7-ses_784dac38ee0c4f709bddc0deb0b421bd', '6-ses_784dac38ee0c4f709bddc0deb0b421bd'], 'result': [{'content': 'user session 1'}, {'content': 'user session 1'}]}
+"""
@@ -0,0 +1,282 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+bench.py (c) 2026
+Created:  2026-10-19 10:02:11
+Desc: Benchmark suite of the store hot paths
+Docs: documentation
+
+Usage:
+    python benchmarks/bench.py --sizes 1000,100000 --out results.json
+    python benchmarks/bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json --tolerance 0.25
+
+Every case reports throughput (records per second) and p50/p99 latencies in
+microseconds. With --baseline the run fails (exit code 1) when the throughput of
+any case drops more than --tolerance below the stored baseline, and refuses to
+start (exit code 2) when the baseline file does not exist.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import multiprocessing
+
+try:
+    from Rocketstore import Rocketstore
+except ImportError:
+    sys.path.insert(0, os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    from Rocketstore import Rocketstore
+
+RECORD = {
+    "id": 22756,
+    "name": "Adam Smith",
+    "title": "developer",
+    "email": "adam@smith.com",
+    "phone": "+95 555 12345",
+    "zip": "DK4321",
+    "country": "Distan",
+    "address": "Elm tree road 555",
+}
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    pos = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+    return samples[pos]
+
+
+def report(name, size, records, latencies_ns, total_ns):
+    return {
+        "case": name,
+        "size": size,
+        "records": records,
+        "ops": len(latencies_ns),
+        "throughput": records / (total_ns / 1e9) if total_ns else 0.0,
+        "p50_us": percentile(latencies_ns, 50) / 1000,
+        "p99_us": percentile(latencies_ns, 99) / 1000,
+    }
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies
+
+
+def fresh_store(root):
+    shutil.rmtree(root, ignore_errors=True)
+    return Rocketstore(data_storage_area=root)
+
+
+def bench_post(root, size):
+    results = []
+    for name, flags, key in [
+        ("post", 0, None),
+        ("post_auto_inc", Rocketstore._ADD_AUTO_INC, "k"),
+        ("post_guid", Rocketstore._ADD_GUID, "k"),
+    ]:
+        rs = fresh_store(root)
+        latencies = []
+        for i in range(size):
+            k = f"k{i}" if key is None else key
+            start = time.perf_counter_ns()
+            rs.post("bench", k, RECORD, flags)
+            latencies.append(time.perf_counter_ns() - start)
+        results.append(report(name, size, size, latencies, sum(latencies)))
+    return results
+
+
+def bench_reads(root, size, repeat):
+    rs = fresh_store(root)
+    for i in range(size):
+        rs.post("bench", f"k{i}", RECORD)
+
+    results = []
+
+    # exact key lookups on a warm cache
+    sample = [f"k{random.randrange(size)}" for _ in range(min(size, 1000))]
+    latencies = []
+    for k in sample:
+        start = time.perf_counter_ns()
+        rs.get("bench", k)
+        latencies.append(time.perf_counter_ns() - start)
+    results.append(report("get_exact", size, len(sample),
+                   latencies, sum(latencies)))
+
+    # wildcard reads roughly one tenth of the collection
+    latencies = timed(lambda: rs.get("bench", "k1*"), repeat)
+    matched = rs.get("bench", "k1*", Rocketstore._COUNT)["count"]
+    results.append(report("get_wildcard", size, matched *
+                   repeat, latencies, sum(latencies)))
+
+    latencies = timed(lambda: rs.get("bench", "*", Rocketstore._ORDER), repeat)
+    results.append(report("get_ordered", size, size *
+                   repeat, latencies, sum(latencies)))
+
+    latencies = timed(lambda: rs.get("bench", "*", Rocketstore._KEYS), repeat)
+    results.append(report("keys", size, size * repeat,
+                   latencies, sum(latencies)))
+
+    latencies = timed(lambda: rs.get(
+        "bench", flags=Rocketstore._COUNT), repeat)
+    results.append(report("count", size, size * repeat,
+                   latencies, sum(latencies)))
+
+    # cold instance, nothing cached yet
+    def cold_count():
+        Rocketstore(data_storage_area=root).get(
+            "bench", flags=Rocketstore._COUNT)
+    latencies = timed(cold_count, repeat)
+    results.append(report("count_cold", size, size *
+                   repeat, latencies, sum(latencies)))
+
+    return results
+
+
+def bench_delete(root, size):
+    rs = fresh_store(root)
+    for i in range(size):
+        rs.post("bench", f"k{i}", RECORD)
+    rs.get("bench", "*", Rocketstore._KEYS)
+
+    start = time.perf_counter_ns()
+    rs.delete("bench", "*")
+    total = time.perf_counter_ns() - start
+    return [report("delete_bulk", size, size, [total], total)]
+
+
+def _sequence_worker(args):
+    root, calls = args
+    rs = Rocketstore(data_storage_area=root, lock_retry_interval=1)
+    values = []
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter_ns()
+        values.append(rs.sequence("bench"))
+        latencies.append(time.perf_counter_ns() - start)
+    return values, latencies
+
+
+def bench_sequence(root, processes, calls):
+    fresh_store(root)
+    start = time.perf_counter_ns()
+    with multiprocessing.Pool(processes) as pool:
+        out = pool.map(_sequence_worker, [(root, calls)] * processes)
+    total = time.perf_counter_ns() - start
+
+    values = [v for vals, _ in out for v in vals]
+    latencies = [l for _, lats in out for l in lats]
+    result = report("sequence_contended", processes,
+                    len(values), latencies, total)
+    result["processes"] = processes
+    result["duplicates"] = len(values) - len(set(values))
+    return [result]
+
+
+def compare(results, baseline, tolerance):
+    """
+    List of regressions: cases whose throughput fell below baseline * (1 - tolerance)
+    """
+    reference = {(r["case"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        base = reference.get((r["case"], r["size"]))
+        if not base or not base["throughput"]:
+            continue
+        ratio = r["throughput"] / base["throughput"]
+        r["baseline_ratio"] = round(ratio, 3)
+        if ratio < 1 - tolerance:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rocketstore hot path benchmarks")
+    parser.add_argument("--sizes", default="1000",
+                        help="comma separated record counts, e.g. 1000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="repetitions of bulk read cases")
+    parser.add_argument("--processes", type=int, default=4,
+                        help="processes competing for one sequence")
+    parser.add_argument("--sequence-calls", type=int, default=200,
+                        help="sequence() calls per process")
+    parser.add_argument("--dir", default=None,
+                        help="scratch directory (default: a temp directory)")
+    parser.add_argument("--out", default=None,
+                        help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", default=None,
+                        help="compare against this stored results file")
+    parser.add_argument("--save-baseline", default=None,
+                        help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed throughput drop against the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"baseline file {args.baseline} does not exist, "
+                     "store one with --save-baseline first")
+
+    scratch = args.dir or tempfile.mkdtemp(prefix="rsbench-")
+    root = os.path.join(scratch, "rsdb")
+    random.seed(42)
+
+    results = []
+    try:
+        for size in [int(s) for s in args.sizes.split(",") if s]:
+            results += bench_post(root, size)
+            results += bench_reads(root, size, args.repeat)
+            results += bench_delete(root, size)
+        results += bench_sequence(root, args.processes, args.sequence_calls)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        if not args.dir:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    output = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        output["regressions"] = [(r["case"], r["size"]) for r in regressions]
+
+    text = json.dumps(output, indent=2)
+    if args.out:
+        with open(args.out, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            file.write(text)
+
+    for r in regressions:
+        print(f"REGRESSION {r['case']} size={r['size']}: "
+              f"{r['baseline_ratio']:.0%} of baseline throughput", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+Batch.py (c) 2026
+Created:  2026-10-19 13:24:09
+Desc: Rocket Store (Python) - atomic multi-record batches
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import json
+
+from .utils.files import key_name_test
+
+
+class Batch:
+    '''
+    Posts and deletes, across collections, applied all together or not at all
+
+    Operations are staged in memory. On commit the batch is appended to the
+    write-ahead log of the storage area with a single fsync and only then
+    applied to the record files, which are fsynced before it is marked applied.
+    A batch that was committed but not fully applied (crash) is replayed the
+    next time the storage area is opened.
+    Batches are atomic against crashes, not isolated: readers don't wait for
+    a batch, so while it is applied they may see some of its changes only.
+    @Sample:
+        with rs.batch() as b:
+            b.post("orders", "1001", order)
+            b.post("customers", "77", customer)
+            b.delete("carts", "77")
+    '''
+
+    def __init__(self, store) -> None:
+        self.store = store
+        self.ops = []
+        self.committed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Nothing is written when the block fails
+        if exc_type is None:
+            self.commit()
+        else:
+            self.ops = []
+        return False
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def post(self, collection=None, key=None, record=None, flags=0) -> dict:
+        '''
+        Stage a post. Keys get their sequence / GUID now, so the final key is returned
+        '''
+        store = self.store
+        if not store.data_format & store._FORMAT_JSON:
+            raise ValueError("Sorry, that data format is not supported")
+
+        handle = store._handle(collection)
+        key = store._make_key(handle.name, key, flags)
+        self.ops.append(["post", handle.name, key, json.dumps(record)])
+
+        return {"key": key, "count": 1}
+
+    def delete(self, collection=None, key=None) -> dict:
+        '''
+        Stage the delete of one record, an exact key is required
+        '''
+        handle = self.store._handle(collection)
+        key = str(key) if key is not None else ""
+        if key_name_test(key, wildcards=True):
+            raise ValueError("Batch delete requires an exact key")
+
+        self.ops.append(["delete", handle.name, key])
+
+        return {"count": 1}
+
+    def commit(self) -> dict:
+        if self.committed:
+            raise ValueError("Batch already committed")
+
+        self.committed = True
+        count = self.store._commit_batch(self.ops)
+        self.ops = []
+
+        return {"count": count}
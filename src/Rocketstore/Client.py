@@ -0,0 +1,244 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+Client.py (c) 2026
+Created:  2026-10-19 20:06:41
+Desc: Rocket Store (Python) - client of a rocketstore server, pooled and pipelining
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import socket
+import threading
+import itertools
+
+from .utils import protocol
+from .Rocketstore import VersionConflict
+
+# Pipelines up to this size fit in the socket buffers and are sent in one
+# write; larger ones are written by a thread while the responses are read
+SEND_AHEAD = 64 * 1024
+
+# Server side error types raised as such by the client
+ERRORS = {
+    "ValueError": ValueError,
+    "VersionConflict": VersionConflict,
+    "PermissionError": PermissionError,
+    "FileNotFoundError": FileNotFoundError,
+    "KeyError": KeyError,
+}
+
+
+def _error(error):
+    name, message = error
+    return ERRORS.get(name, RuntimeError)(message)
+
+
+class _Connection:
+    def __init__(self, address, timeout, token=None) -> None:
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            address = tuple(address)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self.rfile = self.sock.makefile("rb")
+
+        if token is not None:
+            try:
+                _, ok, result = self.exchange([[0, "auth", [token], {}]])[0]
+            except BaseException:
+                self.close()
+                raise
+            if not ok:
+                self.close()
+                raise _error(result)
+
+    def exchange(self, requests) -> list:
+        '''
+        Send all requests, then read the responses in order. A large pipeline
+        is sent by a thread meanwhile: the server stops reading requests once
+        nobody reads its responses, and both ends would wait on each other
+        '''
+        payload = b"".join(protocol.encode(r) for r in requests)
+        sender = None
+        errors = []
+        if len(payload) <= SEND_AHEAD:
+            self.sock.sendall(payload)
+        else:
+            def send():
+                try:
+                    self.sock.sendall(payload)
+                except OSError as e:
+                    errors.append(e)
+
+            sender = threading.Thread(target=send, daemon=True)
+            sender.start()
+
+        responses = []
+        try:
+            for request in requests:
+                response = protocol.read_frame(self.rfile)
+                if response is None:
+                    raise errors[0] if errors else ConnectionError(
+                        "Server closed the connection")
+                if response[0] != request[0]:
+                    raise ConnectionError("Response out of order")
+                responses.append(response)
+        except BaseException:
+            if sender is not None:
+                # Unblock the sender, the connection is closed after this
+                self.sock.shutdown(socket.SHUT_RDWR)
+            raise
+        finally:
+            if sender is not None:
+                sender.join()
+        return responses
+
+    def close(self) -> None:
+        self.rfile.close()
+        self.sock.close()
+
+
+class Client:
+    '''
+    Talks to a server started with `rocketstore serve`
+    @address: path of a unix domain socket, or (host, port)
+    @pool_size: idle connections kept for reuse; threads may share a client
+    @timeout: seconds to wait on the socket (default no limit)
+    @token: the token of the server, needed over TCP
+    @Sample:
+        client = Client("/tmp/rocketstore.sock")
+        client.post("person", "Adam", {"age": 30})
+        with client.pipeline() as p:
+            for name in names:
+                p.get("person", name)
+        p.results
+    '''
+
+    def __init__(self, address, pool_size=4, timeout=None, token=None) -> None:
+        self.address = address
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.token = token
+        self._idle = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _exchange(self, calls) -> list:
+        requests = [
+            [next(self._ids), method, list(args), kwargs] for method, args, kwargs in calls
+        ]
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = _Connection(self.address, self.timeout, self.token)
+
+        try:
+            responses = conn.exchange(requests)
+        except BaseException:
+            # Responses may still be in flight, the connection can't be reused
+            conn.close()
+            raise
+
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        return responses
+
+    def call(self, method, *args, **kwargs):
+        _, ok, result = self._exchange([(method, args, kwargs)])[0]
+        if not ok:
+            raise _error(result)
+        return result
+
+    def post(self, collection=None, key=None, record=None, flags=0, **kwargs):
+        return self.call("post", collection, key, record, flags, **kwargs)
+
+    def get(self, collection=None, key=None, flags=0, **kwargs):
+        return self.call("get", collection, key, flags, **kwargs)
+
+    def get_many(self, collection=None, keys=None, **kwargs):
+        return self.call("get_many", collection, keys, **kwargs)
+
+    def delete(self, collection=None, key=None):
+        return self.call("delete", collection, key)
+
+    def sequence(self, seq_name):
+        return self.call("sequence", seq_name)
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Pipeline:
+    '''
+    Calls sent together on one connection when executed (or the with block ends).
+    results holds their results in order; the first failed call is raised after
+    all responses were read
+    '''
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self.results = None
+        self._calls = []
+
+    def _add(self, method, args, kwargs) -> "Pipeline":
+        self._calls.append((method, args, kwargs))
+        return self
+
+    def post(self, collection=None, key=None, record=None, flags=0, **kwargs):
+        return self._add("post", (collection, key, record, flags), kwargs)
+
+    def get(self, collection=None, key=None, flags=0, **kwargs):
+        return self._add("get", (collection, key, flags), kwargs)
+
+    def get_many(self, collection=None, keys=None, **kwargs):
+        return self._add("get_many", (collection, keys), kwargs)
+
+    def delete(self, collection=None, key=None):
+        return self._add("delete", (collection, key), {})
+
+    def sequence(self, seq_name):
+        return self._add("sequence", (seq_name,), {})
+
+    def execute(self) -> list:
+        calls, self._calls = self._calls, []
+        if not calls:
+            self.results = []
+            return self.results
+
+        responses = self.client._exchange(calls)
+        self.results = [result if ok else _error(result) for _, ok, result in responses]
+        for result in self.results:
+            if isinstance(result, Exception):
+                raise result
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.execute()
@@ -0,0 +1,221 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+Collection.py (c) 2026
+Created:  2026-10-19 11:20:37
+Desc: Rocket Store (Python) - collection handle, validated once with a resolved path and directory fd
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import os
+import threading
+
+from .utils.dedup import objects_dir
+from .utils.blob import blob_dir
+
+# openat() style access where the platform has it (not on windows)
+HAS_DIR_FD = os.open in os.supports_dir_fd and hasattr(os, "O_DIRECTORY")
+
+# Directories a store holds open at most, further collections use paths
+MAX_OPEN_DIRS = 256
+
+
+class DirSlots:
+    '''
+    Count of the collection directories a store holds open, so a store with
+    many collections never runs out of file descriptors
+    '''
+
+    def __init__(self, limit=MAX_OPEN_DIRS) -> None:
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.used -= 1
+
+
+class Collection:
+    '''
+    Handle to one collection of a Rocketstore
+
+    The name is validated when the handle is created, the absolute path is
+    resolved once and, where supported, the directory is held open so record
+    files are opened relative to it (openat) instead of walking the path.
+    @Sample:
+        person = rs.collection("person")
+        person.post("1-Adam", {"name": "Adam"})
+        person.get("1-*")
+    '''
+
+    def __init__(self, store, name: str) -> None:
+        self.store = store
+        self.name = name
+        self.path = os.path.abspath(
+            os.path.join(store.data_storage_area, name))
+        self.dir_fd = None
+        self._exists = False
+        self.linked = None  # holds deduplicated records, None until looked at
+        self.blobs = None  # has a blob directory, None until looked at
+
+    def __repr__(self) -> str:
+        return f"<Collection '{self.name}' {self.path}>"
+
+    def __del__(self):
+        self.close()
+
+    def ensure(self) -> None:
+        '''
+        Create the collection directory (once) and open it
+        '''
+        if self._exists:
+            return
+
+        os.makedirs(self.path, mode=0o775, exist_ok=True)
+        self._open_dir()
+        self._exists = True
+
+    def open_existing(self) -> bool:
+        '''
+        Open the directory if it exists, without creating it
+        '''
+        if self._exists:
+            return True
+
+        try:
+            if not self._open_dir() and not os.path.isdir(self.path):
+                return False
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+        self._exists = True
+        return True
+
+    def _open_dir(self) -> bool:
+        '''
+        Hold the directory open, unless the store already holds as many as it may
+        '''
+        slots = self.store._dir_slots
+        if not HAS_DIR_FD or not slots.acquire():
+            return False
+        try:
+            self.dir_fd = os.open(self.path, os.O_RDONLY | os.O_DIRECTORY)
+        except BaseException:
+            slots.release()
+            raise
+        return True
+
+    def is_stale(self) -> bool:
+        '''
+        The directory held open was removed or replaced behind our back
+        '''
+        if self.dir_fd is None:
+            return not os.path.isdir(self.path)
+
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.dir_fd).st_ino
+        except OSError:
+            return True
+
+    def reopen(self) -> None:
+        self.close()
+        self.ensure()
+
+    def close(self) -> None:
+        if self.dir_fd is not None:
+            try:
+                os.close(self.dir_fd)
+            except OSError:
+                pass
+            self.dir_fd = None
+            self.store._dir_slots.release()
+        self._exists = False
+        self.linked = None
+        self.blobs = None
+
+    def opener(self, path, flags):
+        '''
+        opener for open(): resolve the record file relative to the held directory
+        '''
+        if self.dir_fd is None:
+            return os.open(os.path.join(self.path, path), flags, 0o666)
+        return os.open(path, flags, 0o666, dir_fd=self.dir_fd)
+
+    def is_linked(self) -> bool:
+        '''
+        Some records are hard links to shared payloads (dedup), so no record
+        file may be rewritten in place. Looked at once: the dedup writer sets
+        it, and a plain write finds a file another process linked since by
+        its link count
+        '''
+        if self.linked is None:
+            self.linked = os.path.isdir(objects_dir(self.path))
+        return self.linked
+
+    def has_blobs(self) -> bool:
+        '''
+        Some records are (or were) blobs with bytes in .rocketstore/blobs.
+        Looked at once, put_stream sets it
+        '''
+        if self.blobs is None:
+            self.blobs = os.path.isdir(blob_dir(self.path))
+        return self.blobs
+
+    def listdir(self) -> list:
+        if self.dir_fd is not None:
+            return os.listdir(self.dir_fd)
+        return os.listdir(self.path)
+
+    def unlink(self, key: str) -> None:
+        if self.dir_fd is None:
+            os.remove(os.path.join(self.path, key))
+        else:
+            os.unlink(key, dir_fd=self.dir_fd)
+
+    def stat(self, key: str) -> os.stat_result:
+        if self.dir_fd is None:
+            return os.stat(os.path.join(self.path, key))
+        return os.stat(key, dir_fd=self.dir_fd)
+
+    def file_name(self, key: str) -> str:
+        return os.path.join(self.path, key)
+
+    # Shortcuts to the store operations
+
+    def post(self, key=None, record=None, flags=0, **kwargs):
+        return self.store.post(self, key, record, flags, **kwargs)
+
+    def get(self, key=None, flags=0, **kwargs):
+        return self.store.get(self, key, flags, **kwargs)
+
+    def get_many(self, keys, **kwargs):
+        return self.store.get_many(self, keys, **kwargs)
+
+    def iter_records(self, key="*", flags=0, **kwargs):
+        return self.store.iter_records(self, key, flags, **kwargs)
+
+    def to_columns(self, fields=None):
+        return self.store.to_columns(self, fields)
+
+    def put_stream(self, key=None, fileobj=None, flags=0, **kwargs):
+        return self.store.put_stream(self, key, fileobj, flags, **kwargs)
+
+    def open_stream(self, key=None):
+        return self.store.open_stream(self, key)
+
+    def delete(self, key=None):
+        return self.store.delete(self, key)
+
+    def sequence(self) -> int:
+        return self.store.sequence(self.name)
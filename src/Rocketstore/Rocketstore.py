@@ -24,7 +24,46 @@ Terminology:
   +------------------+---------------+------------------------+
 """
 
-from .utils.files import file_lock, file_unlock, identifier_name_test, file_name_wash
+from .utils.files import (
+    file_lock,
+    file_unlock,
+    identifier_name_test,
+    file_name_wash,
+    key_name_test,
+    read_meta,
+    write_meta,
+    record_version,
+    record_locked,
+    META_DIR,
+)
+from .utils.index import (
+    prefix_of,
+    prefix_range,
+    index_contains,
+    index_add,
+    index_remove,
+    numeric_key,
+)
+from .utils.metrics import Metrics, timed
+from .Collection import Collection, DirSlots
+from .Batch import Batch
+from .utils import archive
+from .utils.wal import WriteAheadLog, encode_batch
+from .utils.pack import Pack, pack_stamp, write_pack
+from .utils.ttl import ExpiryIndex, REFRESH_INTERVAL as TTL_REFRESH_INTERVAL
+from .utils.locks import RWLock
+from .utils.keycache import KeyCache
+from .utils.changelog import Changelog
+from .utils.aggregate import (
+    Aggregate, OPS as AGGREGATE_OPS, generation, note_write, restart_writes,
+)
+from .utils import decode
+from .utils.decode import project, raw_array
+from .utils import replica
+from .utils.bloom import BloomFilter
+from .utils.columns import Columns, field_of, snapshot_path
+from .utils import dedup
+from .utils.blob import BLOB_FIELD, CHUNK_SIZE, blob_dir, blob_path, is_blob, copy_stream
 import os
 import json
 import re
@@ -32,6 +71,11 @@ import glob
 import errno
 import shutil
 import time
+import atexit
+import weakref
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 
 import logging
 
@@ -48,6 +92,18 @@ logging.basicConfig(
 # TODO: checker last modified file time if exist lockfile and is to much longuer (to unlock it)
 
 
+def _flush_at_exit(ref):
+    rs = ref()
+    if rs is not None:
+        rs.flush()
+
+
+class VersionConflict(ValueError):
+    """
+    A conditional post found the record changed (or gone) since the version it was given
+    """
+
+
 class Rocketstore:
     # Constants
     _ORDER = 0x01  # Sort ASC
@@ -57,6 +113,10 @@ class Rocketstore:
     _DELETE = 0x10  # Delete file / collection / database
     _KEYS = 0x20  # Return keys only
     _COUNT = 0x40  # Return count only
+    _RAW = 0x80  # Return the stored bytes of each record, not decoded
+    _VERSION = 0x100  # Return the version (etag) of each record
+    _ORDER_NUMERIC = 0x200  # Sort by the number keys start with, then by key
+    _RAW_ARRAY = 0x400  # Return the stored bytes of all records as one JSON array
     _ADD_AUTO_INC = 0x01  # Add auto incrementing sequence to key
     _ADD_GUID = 0x02  # Add Globally Unique IDentifier to key (RFC 4122)
     _FORMAT_JSON = 0x01  # Store data in JSON format
@@ -72,7 +132,51 @@ class Rocketstore:
         self.data_format = self._FORMAT_JSON
         self.lock_retry_interval = 13
         self.lock_files = True
-        self.key_cache = {}
+        self.key_cache = KeyCache(on_evict=self._cache_evicted)
+        self.key_index = {}  # collection -> sorted list of keys
+        self.numeric_index = {}  # collection -> sorted list of numeric_key(key)
+        self.bloom = False
+        self.bloom_fp_rate = 0.01
+        self._blooms = {}  # collection -> BloomFilter
+        self._bloom_dirty = set()
+        self.dedup = False
+        self.dedup_min_size = dedup.MIN_SIZE
+        self.dedup_cache_bytes = dedup.CACHE_BYTES
+        self._payloads = None  # PayloadCache of shared payloads while dedup is on
+        self.key_count = {}  # collection -> number of records
+        self._count_dirty = set()
+        self._listed_at = {}  # collection -> directory mtime the key count was verified at
+        self._cache_locks = {}  # collection -> RWLock guarding its caches
+        self._cache_locks_guard = threading.Lock()
+        self.metrics = None  # Metrics when enabled
+        self._collections = {}  # name -> Collection handle
+        self._dir_slots = DirSlots()  # collection directories held open
+        self.wal_checkpoint_bytes = 4 * 1024 * 1024
+        self._wal = None
+        self.changelog = False
+        self.changelog_config = {}
+        self._changelog = None
+        self.read_only = False
+        self._packs = {}  # collection -> Pack, or None when not frozen
+        self._expiry = {}  # collection -> ExpiryIndex
+        self.ttl_refresh_interval = TTL_REFRESH_INTERVAL
+        self._aggregates = {}  # collection -> {field: Aggregate}
+        self._aggregate_generation = {}  # collection -> write generation they hold
+        self._aggregates_dirty = set()
+        self.sequence_block = 1
+        self._sequences = {}  # name -> [next, last] of the reserved block
+        self._sequence_lock = threading.Lock()
+        self._ttl_lock = threading.RLock()
+        self._reaper = None
+        self._follower = None
+        self._follow_lock = threading.Lock()
+        self._replica = {"applied": 0, "rate": 0.0, "resyncs": 0}
+        self.io_workers = 8
+        self._io_pool = None
+        self.decode_workers = 0
+        self._decode_pool = None
+
+        atexit.register(_flush_at_exit, weakref.ref(self))
 
         if set_option:
             self.options(**set_option)
@@ -106,20 +210,32 @@ class Rocketstore:
                 raise ValueError(
                     f"Unknown data format: '{options['data_format']}'")
 
+        if "read_only" in options and isinstance(options["read_only"], bool):
+            self.read_only = options["read_only"]
+
         if "data_storage_area" in options:
             if isinstance(options.get("data_storage_area"), str):
+                if options["data_storage_area"] != self.data_storage_area:
+                    self._reset_caches()
                 self.data_storage_area = options["data_storage_area"]
-                try:
-                    os.makedirs(
-                        os.path.abspath(self.data_storage_area),
-                        mode=0o775,
-                        exist_ok=True,
-                    )
-                except OSError as e:
-                    if e.errno != errno.EEXIST:
-                        raise Exception(
-                            f"Unable to create data storage directory '{self.data_storage_area}': {e}"
+                self._wal = WriteAheadLog(self.data_storage_area)
+
+                if not self.read_only:
+                    try:
+                        os.makedirs(
+                            os.path.abspath(self.data_storage_area),
+                            mode=0o775,
+                            exist_ok=True,
                         )
+                    except OSError as e:
+                        if e.errno != errno.EEXIST:
+                            raise Exception(
+                                f"Unable to create data storage directory '{self.data_storage_area}': {e}"
+                            )
+
+                    # Finish batches interrupted by a crash
+                    if self._wal.exists():
+                        self._replay_wal()
             else:
                 raise ValueError("Data storage area must be a directory path")
 
@@ -131,7 +247,167 @@ class Rocketstore:
         if "lock_files" in options and isinstance(options["lock_files"], bool):
             self.lock_files = options.get("lock_files", True)
 
-    def post(self, collection=None, key=None, record=None, flags=0) -> any:
+        if "sequence_block" in options:
+            if not isinstance(options["sequence_block"], int) or options["sequence_block"] < 1:
+                raise ValueError("sequence_block must be a positive integer")
+            self.sequence_block = options["sequence_block"]
+            self._sequences = {}
+
+        if "changelog" in options and isinstance(options["changelog"], bool):
+            self.changelog = options["changelog"]
+
+        for name in ("segment_bytes", "retention_bytes", "retention_seconds"):
+            option = f"changelog_{name}"
+            if option in options:
+                value = options[option]
+                if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+                    raise ValueError(f"{option} must be a positive number or None")
+                self.changelog_config[name] = value
+                self._changelog = None
+
+        if "bloom" in options and isinstance(options["bloom"], bool):
+            self.bloom = options["bloom"]
+            if not self.bloom:
+                self._blooms = {}
+                self._bloom_dirty = set()
+
+        if "bloom_fp_rate" in options:
+            rate = options["bloom_fp_rate"]
+            if isinstance(rate, bool) or not isinstance(rate, float) or not 0 < rate < 1:
+                raise ValueError("bloom_fp_rate must be a number between 0 and 1")
+            self.bloom_fp_rate = rate
+
+        for option in ("dedup_min_size", "dedup_cache_bytes"):
+            if option in options:
+                size = options[option]
+                if isinstance(size, bool) or not isinstance(size, int) or size < 0:
+                    raise ValueError(f"{option} must be a number of bytes")
+                setattr(self, option, size)
+                self._payloads = None
+
+        if "dedup" in options and isinstance(options["dedup"], bool):
+            self.dedup = options["dedup"]
+            self._payloads = None
+        if self.dedup and self._payloads is None and self.dedup_cache_bytes:
+            self._payloads = dedup.PayloadCache(self.dedup_cache_bytes)
+
+        if "wal_checkpoint_bytes" in options and isinstance(
+            options["wal_checkpoint_bytes"], int
+        ):
+            self.wal_checkpoint_bytes = options["wal_checkpoint_bytes"]
+
+        if "cache_memory" in options:
+            budget = options["cache_memory"]
+            if budget is not None and (not isinstance(budget, int) or budget < 0):
+                raise ValueError("cache_memory must be a number of bytes or None")
+            self.key_cache.budget = budget or None
+            self.key_cache.evict()
+
+        if "ttl_refresh_interval" in options:
+            interval = options["ttl_refresh_interval"]
+            if isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval < 0:
+                raise ValueError("ttl_refresh_interval must be a number of seconds")
+            self.ttl_refresh_interval = interval
+            for expiry in list(self._expiry.values()):
+                expiry.refresh_interval = interval
+
+        if "max_open_dirs" in options:
+            limit = options["max_open_dirs"]
+            if isinstance(limit, bool) or not isinstance(limit, int) or limit < 0:
+                raise ValueError("max_open_dirs must be a number of directories")
+            self._dir_slots.limit = limit
+
+        if "io_workers" in options and isinstance(options["io_workers"], int):
+            self.io_workers = max(1, options["io_workers"])
+
+        if "decode_workers" in options and isinstance(options["decode_workers"], int):
+            if self._decode_pool is not None:
+                self._decode_pool.shutdown()
+                self._decode_pool = None
+            self.decode_workers = max(0, options["decode_workers"])
+
+        if "metrics" in options and isinstance(options["metrics"], bool):
+            if not options["metrics"]:
+                self.metrics = None
+            elif self.metrics is None:
+                self.metrics = Metrics()
+
+    def collection(self, name) -> Collection:
+        """
+        Handle to a collection: the name is validated and its path resolved once
+        @Sample:
+            person = rs.collection("person")
+            person.post("22756-Adam Smith", record)
+            person.get("*-Adam Smith")
+        """
+        return self._handle(name)
+
+    def close(self) -> None:
+        """
+        Persist counters and release the directories held open by collection handles
+        """
+        self.stop_reaper()
+        self.stop_follower()
+        self.flush()
+        for handle in self._collections.values():
+            handle.close()
+        self._drop_pack()
+        if self._io_pool is not None:
+            self._io_pool.shutdown()
+            self._io_pool = None
+        if self._decode_pool is not None:
+            self._decode_pool.shutdown()
+            self._decode_pool = None
+
+    def cache_info(self) -> dict:
+        """
+        Memory held by the key caches
+        @return: dict
+            {'budget': 67108864, 'bytes': 1391, 'collections': {
+                'person': {'keys': 12, 'bytes': 1391, 'packed': False}},
+             'bloom_bytes': 2454, 'dedup_bytes': 0}
+            Bloom filters and shared payloads (dedup) are not counted in the budget
+        """
+        return {
+            "budget": self.key_cache.budget,
+            "bytes": self.key_cache.total,
+            "collections": self.key_cache.memory(),
+            "bloom_bytes": sum(b.nbytes for b in list(self._blooms.values())),
+            "dedup_bytes": self._payloads.total if self._payloads is not None else 0,
+        }
+
+    def stats(self, reset=False) -> dict:
+        """
+        Snapshot of the metrics: per operation timers (count, total_ns, max_ns) and
+        counters for files opened, bytes read/written, cache hits/misses,
+        directory listings and time spent waiting for locks.
+        Empty when metrics are disabled (option metrics=True)
+        """
+        if self.metrics is None:
+            return {}
+
+        snapshot = self.metrics.snapshot()
+        if reset:
+            self.metrics.reset()
+        return snapshot
+
+    def add_hook(self, hook) -> None:
+        """
+        Call hook(op, collection, duration_ns) after every post, get, delete and sequence.
+        Enables metrics.
+        """
+        if self.metrics is None:
+            self.metrics = Metrics()
+        self.metrics.hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        if self.metrics is not None and hook in self.metrics.hooks:
+            self.metrics.hooks.remove(hook)
+
+    @timed("post")
+    def post(
+        self, collection=None, key=None, record=None, flags=0, ttl=None, if_version=None
+    ) -> any:
         """
         Post a data record (Insert or overwrite)
         If keyCache exists for the given collection, entries are added.
@@ -139,21 +415,46 @@ class Rocketstore:
         @key: key name
         @record: data to store
         @flags: flags
+        @ttl: seconds until the record expires (default never)
+        @if_version: only replace the record if its version (from get with
+            _VERSION) is still this one, else raise VersionConflict
         @return: dict
             _ADD_AUTO_INC: add auto incrementing sequence to key
                 {'key': '6-test-1', 'count': 1}
             _ADD_GUID: add Globally Unique IDentifier to key
                 {'key': '5e675199-7680-4000-856b--test-1', 'count': 1}
+            if_version: the new version is returned too
+                {'key': 'test-1', 'count': 1, 'version': '2f1c-17f0a3b2c4d5e6f7-1a'}
         """
-        collection = str(collection or "") if collection else ""
+        self._check_writable()
+        if ttl is not None and (not isinstance(ttl, (int, float)) or ttl <= 0):
+            raise ValueError("ttl must be a positive number of seconds")
+        if if_version is not None and (
+            not key or flags & (self._ADD_AUTO_INC | self._ADD_GUID)
+        ):
+            raise ValueError("if_version needs the exact key of an existing record")
 
-        if len(collection) < 1 or not collection or collection == "":
-            raise ValueError("No valid collection name given")
+        handle = self._handle(collection)
+        key = self._make_key(handle.name, key, flags)
 
-        # True = is have illegal characters
-        if identifier_name_test(collection) == True:
-            raise ValueError("Collection name contains illegal characters")
+        # Write to file
+        if self.data_format & self._FORMAT_JSON:
+            version = self._store(handle, key, json.dumps(record), if_version)
+        else:
+            raise ValueError("Sorry, that data format is not supported")
+
+        if ttl is not None:
+            with self._ttl_lock:
+                self._expiry_index(handle).set(key, time.time() + ttl)
+
+        if version is not None:
+            return {"key": key, "count": 1, "version": version}
+        return {"key": key, "count": 1}
 
+    def _make_key(self, collection, key, flags) -> str:
+        """
+        Final key of a posted record: washed, with sequence and/or GUID added
+        """
         # Remove wildcards (unix only)
         if isinstance(key, int):
             key = file_name_wash(
@@ -175,30 +476,107 @@ class Rocketstore:
             guid = f"{uid[:8]}-{uid[8:12]}-4000-8{uid[12:15]}-{uid[15:]}"
             key = f"{guid}-{key}" if len(key) > 0 else guid
 
-        # Write to file
-        dir_to_write = os.path.abspath(
-            os.path.join(self.data_storage_area, collection))
-        file_name = os.path.join(dir_to_write, key)
+        if key_name_test(key):
+            raise ValueError(f"Key '{key}' contains illegal characters")
+        return key
 
-        if self.data_format & self._FORMAT_JSON:
-            os.makedirs(dir_to_write, mode=0o775, exist_ok=True)
+    def _store(self, handle, key, data, if_version=None, blob=False):
+        """
+        Write the serialized record and keep the caches up to date
+        Returns the new version when written conditionally (if_version)
+        @blob: the record is a blob whose bytes are in place already
+        """
+        collection = handle.name
 
-            with open(file_name, "w") as file:
-                json.dump(record, file)
+        aggregates = self._aggregates_of(handle)
+        if aggregates:
+            old = self._read_record(handle, key)
+
+        before = self._stamp_before(handle)
+        if if_version is None:
+            # Only look at the disk when a counter needs to know if the key is new
+            exists = None
+            if (
+                collection in self.key_count
+                and collection not in self.key_index
+                and collection not in self.key_cache
+            ):
+                exists = os.path.lexists(handle.file_name(key))
+
+            self._write_file(handle, key, data)
+            version = None
         else:
-            raise ValueError("Sorry, that data format is not supported")
+            version = self._replace_if_version(handle, key, data, if_version)
+            exists = True
 
         # Store key in cash
-        if (
-            isinstance(self.key_cache.get(collection), list)
-            and key not in self.key_cache[collection]
-        ):
-            self.key_cache[collection].append(key)
+        self._cache_add(collection, key, exists)
+        self._stamp_after(handle, before)
+        self._log_changes([("post", collection, key)])
+        if aggregates:
+            self._update_aggregates(handle, old, json.loads(data))
+
+        # A new version of the record forgets the expiry of the old one
+        expiry = self._expiry_index(handle)
+        if expiry and expiry.expires(key) is not None:
+            with self._ttl_lock:
+                expiry.clear([key])
+
+        # The bytes of a blob this record replaced
+        if not blob and handle.has_blobs():
+            try:
+                os.remove(blob_path(handle.path, key))
+            except FileNotFoundError:
+                pass
 
-        return {"key": key, "count": 1}
+        return version
 
-    def get(
-        self, collection=None, key=None, flags=0, min_time=None, max_time=None
+    def _replace_if_version(self, handle, key, data, if_version) -> str:
+        """
+        Check and replace under a lock on the record alone. The new record is
+        written to a temp file and renamed over the old one, so readers see
+        either version whole and the version of the record always changes.
+        """
+        handle.ensure()
+        try:
+            with record_locked(handle, key, self.lock_retry_interval) as st:
+                if record_version(st) != if_version:
+                    raise VersionConflict(
+                        f"Record '{handle.name}/{key}' has changed")
+
+                meta_dir = os.path.join(handle.path, META_DIR)
+                os.makedirs(meta_dir, mode=0o775, exist_ok=True)
+                tmp_name = os.path.join(
+                    meta_dir, f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+                if self.dedup and len(data) >= self.dedup_min_size:
+                    dedup.link_payload(handle.path, data.encode(), tmp_name)
+                    handle.linked = True
+                    version = record_version(os.stat(tmp_name))
+                else:
+                    with open(tmp_name, "w") as file:
+                        file.write(data)
+                        file.flush()
+                        version = record_version(os.fstat(file.fileno()))
+
+                old = self._open_shared(handle, key) if handle.is_linked() else None
+                os.replace(tmp_name, handle.file_name(key))
+                if old is not None:
+                    with old:
+                        dedup.release(handle.path, old)
+        except FileNotFoundError:
+            raise VersionConflict(
+                f"Record '{handle.name}/{key}' does not exist") from None
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.files_opened += 1
+            metrics.bytes_written += len(data)
+
+        return version
+
+    def _get(
+        self, collection=None, key=None, flags=0, min_time=None, max_time=None,
+        fields=None, latest=None, earliest=None
     ) -> any:
         """
         * Get one or more records or list all collections (or delete it)
@@ -214,92 +592,156 @@ class Rocketstore:
            One exception are searches in the root (list of collections etc.), which must be read each time.
 
            NB: Files may have been removed manually and should be removed from the cache
+
+           fields: list of top level field names to return of each record
+           _VERSION flag: also return the version of each record, for post(if_version=)
+           _ORDER_NUMERIC flag: order by the number keys start with (auto increment keys)
+           _RAW flag: result holds the stored bytes of each record, never decoded
+           _RAW_ARRAY flag: result is the stored bytes of the records joined in one
+               JSON array, b'[...]', ready to send as it is
+           latest / earliest: only the n records with the highest / lowest numbers,
+               newest / oldest first. Answered from an index kept in order, so only
+               those n files are opened
         """
 
         # TODO: add regexpt search in key
 
+        if latest is not None and earliest is not None:
+            raise ValueError("Use either latest or earliest")
+        first = latest if latest is not None else earliest
+        if first is not None:
+            if isinstance(first, bool) or not isinstance(first, int) or first < 1:
+                raise ValueError("latest / earliest must be a positive integer")
+            if not collection or flags & self._DELETE:
+                raise ValueError("latest / earliest need a collection and can't delete")
+        raw = flags & (self._RAW | self._RAW_ARRAY)
+        if raw and fields is not None:
+            raise ValueError("fields can't be picked from raw records")
+
         keys = []
         uncache = []
+        before = None  # directory mtime before deleting
         records = []
+        versions = None
         count = 0
 
-        collection = str(collection or "") if collection else ""
-
-        # identifier_name_test - True = is have illegal characters
-        if (
-            collection
-            and len(collection) > 0
-            and identifier_name_test(collection) == True
-        ):
-            raise ValueError("Collection name contains illegal characters")
+        handle = None
+        if collection:
+            handle = self._handle(collection)
+            collection = handle.name
+        else:
+            collection = ""
 
         # Check key validity
         if key == None:
             key = ""
         else:
             key = file_name_wash(str(key)).replace(r"[*]{2,}", "*")
+            if key == META_DIR:
+                raise ValueError(f"Key '{META_DIR}' is reserved")
+
+        if self.read_only:
+            if flags & self._DELETE:
+                self._check_writable()
 
-        scan_dir = os.path.abspath(os.path.join(
-            self.data_storage_area, collection))
+            # Frozen collections are served from their pack
+            pack = self._pack(handle) if handle else None
+            if pack is not None:
+                return self._get_packed(pack, key, flags, fields, first, latest is not None)
+
+        hide_expired = None
+        if handle and not flags & self._DELETE:
+            hide_expired = self._expire(handle)
+
+        scan_dir = handle.path if handle else os.path.abspath(
+            self.data_storage_area)
+
+        # Counts are answered from the maintained counters / sorted key index
+        if (
+            collection
+            and flags & self._COUNT
+            and not flags & self._DELETE
+            and hide_expired is None
+            and first is None
+        ):
+            count = self._count(handle, key)
+            if count is not None:
+                return {"count": count}
 
         wildcard = not "*" in key or not "?" in key or key == "" or not key
 
-        if wildcard and not (flags & self._DELETE and (not key or key == "")):
+        metrics = self.metrics
+
+        # A miss on a collection not listed yet, answered by its Bloom filter
+        if (
+            self.bloom
+            and collection
+            and key
+            and first is None
+            and not flags & self._DELETE
+            and not any(c in key for c in "*?[")
+            and collection not in self.key_cache
+            and self._bloom_absent(handle, key)
+        ):
+            return {"count": 0}
+
+        if first is not None:
+            keys = self._numeric_range(handle, key, first, latest is not None, hide_expired)
+            hide_expired = None
+
+        elif wildcard and not (flags & self._DELETE and (not key or key == "")):
             _list = []
 
+            if metrics is not None and collection:
+                if collection in self.key_cache:
+                    metrics.cache_hits += 1
+                else:
+                    metrics.cache_misses += 1
+
             # Read directory into cache
             if collection and not collection in self.key_cache:
                 # Scan directory
                 try:
-                    _list = os.listdir(scan_dir)
-
-                    # Remove .DS_Store files
-                    _list = [
-                        e for e in _list if not e.lower().endswith(".ds_store")]
-
-                    # Update cache
-                    if collection and len(_list) > 0:
-                        self.key_cache[collection] = _list
+                    _list = self._scan_keys(handle)
                 except FileNotFoundError as f:
                     # raise f
                     return {"count": 0}
                 except Exception as e:
                     raise e
 
-            if collection and collection in self.key_cache:
-                _list = self.key_cache[collection]
-
-            # Wildcard search
-            if key and key != "*":
-                haystack = (
-                    self.key_cache[collection]
-                    if collection in self.key_cache
-                    else _list
-                )
-                keys = [k for k in haystack if glob.fnmatch.fnmatch(k, key)]
-            else:
-                keys = _list
+            # Work on a copy, the cache may change as soon as the lock is released
+            with self._cache_lock(collection).read():
+                if collection and collection in self.key_cache:
+                    _list = self.key_cache[collection]
+
+                # Wildcard search (an exact key is a lookup, fnmatch is case insensitive on windows)
+                if key and os.name != "nt" and not any(c in key for c in "*?["):
+                    keys = [key] if key in _list else []
+                elif key and key != "*":
+                    keys = [k for k in _list if glob.fnmatch.fnmatch(k, key)]
+                else:
+                    keys = list(_list)
 
             # Order by key value
             if (
-                flags & (self._ORDER | self._ORDER_DESC)
+                flags & (self._ORDER | self._ORDER_DESC | self._ORDER_NUMERIC)
                 and keys
                 and len(keys) > 1
                 and not (flags & (self._DELETE | (flags & self._COUNT)))
             ):
-                keys.sort()
+                keys.sort(key=numeric_key if flags & self._ORDER_NUMERIC else None)
                 if flags & self._ORDER_DESC:
                     keys.reverse()
         else:
-            if (
-                collection
-                and isinstance(self.key_cache.get(collection), list)
-                and key not in self.key_cache[collection]
-            ):
+            if collection and key and self._key_known(collection, key) is False:
                 keys = []
             elif key:
                 keys = [key]
 
+        if hide_expired is not None:
+            now = time.time()
+            keys = [k for k in keys if not hide_expired.is_expired(k, now)]
+
         count = len(keys)
 
         if (
@@ -308,31 +750,50 @@ class Rocketstore:
             and not (flags & (self._KEYS | self._COUNT | self._DELETE))
         ):
             records = [None] * len(keys)
-
-            for i in range(len(keys)):
-                file_name = os.path.join(scan_dir, keys[i])
-
-                # Read JSON record file
-                if self.data_format & self._FORMAT_JSON:
-                    try:
-                        with open(file_name, "r") as file:
-                            logging.info(f">[269] File open {file_name}")
-                            records[i] = json.load(file)
-                    except FileNotFoundError:
-                        uncache.append(keys[i])
-                        records[i] = "*deleted*"
-                        count -= 1
-                        logging.warning(f">[269] File not found{file_name}")
-                    except json.JSONDecodeError:
-                        records[i] = "*format*"
-                        logging.warning(f">[272] Not JSON format {file_name}")
-                else:
-                    raise ValueError(
-                        "Sorry, that data format is not supported")
+            versions = [None] * len(keys) if flags & self._VERSION else None
+            log_open = logging.getLogger().isEnabledFor(logging.INFO)
+            handle.open_existing()
+
+            if versions is None and not raw and self._decode_in_workers(len(keys)):
+                for i in self._decode_records(handle, keys, fields, records):
+                    uncache.append(keys[i])
+                    records[i] = "*deleted*"
+                    count -= 1
+            else:
+                for i in range(len(keys)):
+                    file_name = os.path.join(scan_dir, keys[i])
+
+                    # Read JSON record file
+                    if self.data_format & self._FORMAT_JSON:
+                        try:
+                            if versions is None:
+                                data = self._read_file(handle, keys[i])
+                            else:
+                                data, versions[i] = self._read_file(
+                                    handle, keys[i], version=True)
+
+                            if log_open:
+                                logging.info(">[269] File open %s", file_name)
+                            if metrics is not None:
+                                metrics.files_opened += 1
+                                metrics.bytes_read += len(data)
+
+                            records[i] = data if raw else project(json.loads(data), fields)
+                        except FileNotFoundError:
+                            uncache.append(keys[i])
+                            records[i] = "*deleted*"
+                            count -= 1
+                            logging.warning(">[269] File not found %s", file_name)
+                        except json.JSONDecodeError:
+                            records[i] = "*format*"
+                            logging.warning(">[272] Not JSON format %s", file_name)
+                    else:
+                        raise ValueError(
+                            "Sorry, that data format is not supported")
 
         elif flags & self._DELETE:
             # DELETE RECORDS
-            logging.info(f"276 DELETE: c({collection}) k({key})")
+            logging.info("276 DELETE: c(%s) k(%s)", collection, key)
 
             if (
                 not collection
@@ -346,11 +807,16 @@ class Rocketstore:
                     "# Delete database (all collections) return count 1")
                 try:
                     if os.path.exists(self.data_storage_area):
+                        # Offsets carry on in the new log
+                        next_offset = self._changes_log().next_offset() if self.changelog else None
                         shutil.rmtree(self.data_storage_area)
-                        self.key_cache = {}
+                        self._reset_caches(flush=False)
                         count = 1
+                        if next_offset is not None:
+                            self._changes_log().restart(next_offset)
+                            self._log_changes([("drop", None, None)])
                 except Exception as e:
-                    logging.info(f"Error deleting directory: {e}")
+                    logging.info("Error deleting directory: %s", e)
                     raise e
 
             elif (
@@ -382,12 +848,14 @@ class Rocketstore:
                     os.remove(fileNameSeq)
                     count += 1
 
-                if collection in self.key_cache:
-                    del self.key_cache[collection]
+                self._cache_drop(collection)
+                if count:
+                    self._log_changes([("drop", collection, None)])
 
             # Delete records and  ( collection and sequences found with wildcards )
             elif keys:
                 logging.info("delete wildcat")
+                before = self._stamp_before(handle) if handle else None
                 for key in keys:
                     # Remove files with regexp
                     if "*" in key or "?" in key:
@@ -396,31 +864,42 @@ class Rocketstore:
                             if os.path.exists(file):
                                 shutil.rmtree(file)
                                 count += len(loc) - count
-                    else:
+                    elif handle:
                         # Delete single file
+                        self._unlink_record(handle, key)
+                    else:
                         os.remove(os.path.join(scan_dir, key))
 
-                    if collection:
-                        uncache = [key]
-                    else:
-                        uncache.extend([key])
+                    uncache.append(key)
 
             elif re.search(r"[\*\?]", key):
                 logging.info("WILD con caracteres especiales")
                 fileNamesWild = glob.glob(os.path.join(scan_dir, key))
                 for file in fileNamesWild:
                     os.remove(file)
+                    uncache.append(os.path.basename(file))
                     count += 1
 
+            if not collection:
+                # Collections may have gone with the wildcards
+                for h in self._collections.values():
+                    h.close()
+
         # Clean up cache and keys
         if uncache:
-            if collection in self.key_cache:
-                self.key_cache[collection] = [
-                    e for e in self.key_cache[collection] if e not in uncache
-                ]
+            if collection:
+                self._cache_remove(collection, uncache,
+                                   deleted=bool(flags & self._DELETE))
+                if flags & self._DELETE:
+                    self._stamp_after(handle, before)
+
+            if flags & self._DELETE:
+                self._log_changes(
+                    [("delete", collection, k) for k in uncache] if collection
+                    else [("drop", c, None) for c in uncache])
 
-            if keys != self.key_cache.get(collection):
-                keys = [e for e in keys if e not in uncache]
+            uncached = set(uncache)
+            keys = [e for e in keys if e not in uncached]
 
             if records:
                 records = [e for e in records if e !=
@@ -431,40 +910,373 @@ class Rocketstore:
             result["key"] = keys
         if records:
             result["result"] = records
+            if versions is not None:
+                result["version"] = versions
+
+        if (
+            flags & self._RAW_ARRAY
+            and collection
+            and not flags & (self._KEYS | self._COUNT | self._DELETE)
+        ):
+            result["result"] = raw_array(records)
 
         return result
 
+    get = timed("get")(_get)
+
+    @timed("get_many")
+    def get_many(self, collection=None, keys=None, fields=None) -> dict:
+        """
+        Get records by a list of exact keys, returned in the order asked for
+        Keys known (by the key cache) not to exist are not opened, the rest are
+        read concurrently.
+        @collection: collection name
+        @keys: list of keys, no wildcards or path separators (ValueError)
+        @fields: list of top level field names to return of each record
+        @return: dict
+            {'count': 2, 'key': ['a', 'x', 'b'], 'result': [1, None, 2], 'missing': ['x']}
+            count is the number of records found, result holds None for missing keys
+        """
+        handle = self._handle(collection)
+        keys = [file_name_wash(str(k)) for k in (keys or [])]
+        for key in keys:
+            if key_name_test(key, wildcards=True):
+                raise ValueError(f"Key '{key}' contains illegal characters")
+
+        records = [None] * len(keys)
+        found = [False] * len(keys)
+
+        pack = self._pack(handle) if self.read_only else None
+        if pack is not None:
+            for i, key in enumerate(keys):
+                pos = pack.find(key)
+                if pos >= 0:
+                    found[i] = True
+                    records[i] = pack.data_at(pos)
+        else:
+            hide_expired = self._expire(handle)
+            now = time.time()
+
+            # Skip opening keys the cache (or Bloom filter) knows are not there
+            index = self._sorted_keys(handle.name)
+            with self._cache_lock(handle.name).read():
+                todo = [
+                    i for i, key in enumerate(keys)
+                    if (index is None or index_contains(index, key))
+                    and not (hide_expired and hide_expired.is_expired(key, now))
+                ]
+            if index is None and self.bloom:
+                todo = [i for i in todo if not self._bloom_absent(handle, keys[i])]
+
+            def read(i):
+                try:
+                    return i, self._read_file(handle, keys[i])
+                except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                    return i, None
+
+            if todo:
+                handle.open_existing()
+            if len(todo) > 8:
+                results = self._io_executor().map(read, todo)
+            else:
+                results = map(read, todo)
+
+            uncache = []
+            for i, data in results:
+                if data is None:
+                    if index is not None:
+                        uncache.append(keys[i])
+                    continue
+                found[i] = True
+                records[i] = data
+
+            if uncache:
+                self._cache_remove(handle.name, uncache, deleted=False)
+
+        metrics = self.metrics if pack is None else None
+        for i in range(len(keys)):
+            if found[i]:
+                if metrics is not None:
+                    metrics.files_opened += 1
+                    metrics.bytes_read += len(records[i])
+                try:
+                    records[i] = project(json.loads(records[i]), fields)
+                except json.JSONDecodeError:
+                    records[i] = "*format*"
+
+        missing = [k for k, f in zip(keys, found) if not f]
+        result = {"count": len(keys) - len(missing), "key": keys, "result": records}
+        if missing:
+            result["missing"] = missing
+
+        return result
+
+    def iter_records(self, collection=None, key="*", flags=0, fields=None):
+        """
+        Iterate over the records of a collection one at a time, so memory use
+        doesn't grow with the number of records matched
+        @collection: collection name
+        @key: key or wildcard, all records by default
+        @flags: _ORDER, _ORDER_DESC and / or _ORDER_NUMERIC
+        @fields: list of top level field names to return of each record
+        @yield: (key, record)
+        """
+        handle = self._handle(collection)
+        listing = self._get(
+            handle, key,
+            (flags & (self._ORDER | self._ORDER_DESC | self._ORDER_NUMERIC)) | self._KEYS)
+        keys = list(listing.get("key", []))
+
+        pack = self._pack(handle) if self.read_only else None
+        metrics = self.metrics if pack is None else None
+        if pack is None:
+            handle.open_existing()
+
+        if pack is None and self._decode_in_workers(len(keys)):
+            for chunk_keys, (records, missing, bytes_read) in self._decode_chunks(
+                    handle, keys, fields):
+                if metrics is not None:
+                    metrics.files_opened += len(chunk_keys) - len(missing)
+                    metrics.bytes_read += bytes_read
+                missing = set(missing)
+                for i, k in enumerate(chunk_keys):
+                    if i not in missing:
+                        yield k, records[i]
+            return
+
+        for k in keys:
+            if pack is not None:
+                data = pack.data_at(pack.find(k))
+            else:
+                try:
+                    data = self._read_file(handle, k)
+                except FileNotFoundError:
+                    continue  # deleted since listed
+
+                if metrics is not None:
+                    metrics.files_opened += 1
+                    metrics.bytes_read += len(data)
+
+            try:
+                record = project(json.loads(data), fields)
+            except json.JSONDecodeError:
+                record = "*format*"
+
+            yield k, record
+
+    @timed("to_columns")
+    def to_columns(self, collection=None, fields=None) -> Columns:
+        """
+        Columnar snapshot of some fields of all records of a collection: typed
+        arrays to filter and aggregate instead of a dict per record (see Columns)
+        The snapshot is saved in <collection>/.rocketstore/columns; the next call
+        only reads the records that are new or whose version changed since
+        @collection: collection name
+        @fields: list of (dotted) field names
+        @return: Columns, rows in key order
+        """
+        if (
+            isinstance(fields, str)
+            or not fields
+            or not all(isinstance(f, str) and f for f in fields)
+        ):
+            raise ValueError("fields must be a list of field names")
+        fields = list(dict.fromkeys(fields))
+
+        handle = self._handle(collection)
+        keys = sorted(self._get(handle, "*", self._KEYS).get("key", []))
+        path = snapshot_path(handle.path, fields)
+
+        old = Columns.load(path)
+        if old is not None and set(old.fields) == set(fields):
+            old = Columns(fields, old.keys, old.versions, old.columns)
+            known = dict(zip(old.keys, range(len(old.keys))))
+        else:
+            old, known = None, {}
+        handle.open_existing()
+
+        def read_chunk(chunk_keys):
+            items = []
+            size = 0
+            for key in chunk_keys:
+                try:
+                    version = record_version(handle.stat(key))
+                    i = known.get(key)
+                    if i is not None and old.versions[i] == version:
+                        items.append((key, version, i))
+                        continue
+                    data, version = self._read_file(handle, key, version=True)
+                except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                    continue  # deleted since listed
+
+                size += len(data)
+                try:
+                    record = json.loads(data)
+                except json.JSONDecodeError:
+                    record = None
+                items.append((key, version, tuple(field_of(record, f) for f in fields)))
+            return items, size
+
+        new_keys, versions, rows = [], [], []
+        old_rows = None
+        fresh = 0
+        metrics = self.metrics
+        for items, size in archive.ordered_map(
+                read_chunk, list(archive.chunks(keys)), self.io_workers, self._io_executor()):
+            opened = fresh
+            for key, version, row in items:
+                if isinstance(row, int):
+                    if old_rows is None:
+                        old_rows = old.rows()
+                    row = old_rows[row]
+                else:
+                    fresh += 1
+                new_keys.append(key)
+                versions.append(version)
+                rows.append(row)
+            if metrics is not None:
+                metrics.files_opened += fresh - opened
+                metrics.bytes_read += size
+
+        if old is not None and not fresh and new_keys == old.keys:
+            return old
+
+        snapshot = Columns.build(fields, new_keys, versions, rows)
+        if not self.read_only:
+            snapshot.save(path)
+        return snapshot
+
+    @timed("put_stream")
+    def put_stream(
+        self, collection=None, key=None, fileobj=None, flags=0, content_type=None,
+        chunk_size=CHUNK_SIZE
+    ) -> dict:
+        """
+        Store the bytes of a binary file object as a blob record, copied in
+        chunks so memory use doesn't depend on its size. The collection gets a
+        record {"_blob": {"size": ..., "content_type": ...}} under key, the
+        bytes are read back with open_stream()
+        @collection: collection name
+        @key: key name
+        @fileobj: binary file object to read to its end
+        @flags: _ADD_AUTO_INC / _ADD_GUID as with post
+        @content_type: kept in the record, e.g. "application/pdf"
+        @return: {'key': 'report.pdf', 'count': 1, 'size': 524288000}
+        """
+        self._check_writable()
+        if fileobj is None:
+            raise ValueError("No file object given")
+
+        handle = self._handle(collection)
+        key = self._make_key(handle.name, key, flags)
+
+        # Written aside and renamed, readers of the old bytes keep them
+        os.makedirs(blob_dir(handle.path), mode=0o775, exist_ok=True)
+        handle.blobs = True
+        tmp_name = os.path.join(
+            blob_dir(handle.path), f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_name, "wb", buffering=0) as file:
+                size = copy_stream(fileobj, file, chunk_size)
+            os.replace(tmp_name, blob_path(handle.path, key))
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+
+        if self.metrics is not None:
+            self.metrics.files_opened += 1
+            self.metrics.bytes_written += size
+
+        record = {BLOB_FIELD: {"size": size, "content_type": content_type}}
+        self._store(handle, key, json.dumps(record), blob=True)
+        return {"key": key, "count": 1, "size": size}
+
+    @timed("open_stream")
+    def open_stream(self, collection=None, key=None):
+        """
+        Open the bytes of a blob record for reading, a binary file object to
+        read in chunks (or hand to socket.sendfile / shutil.copyfileobj)
+        raises FileNotFoundError when there is no such record, ValueError when
+        the record is not a blob
+        """
+        handle = self._handle(collection)
+        key = file_name_wash(str(key or ""))
+        if key_name_test(key, wildcards=True):
+            raise ValueError("open_stream needs the exact key of a blob")
+
+        record = self._read_record(handle, key)
+        if record is None and not os.path.exists(handle.file_name(key)):
+            raise FileNotFoundError(f"No record '{handle.name}/{key}'")
+        if not is_blob(record):
+            raise ValueError(f"Record '{handle.name}/{key}' is not a blob")
+
+        if self.metrics is not None:
+            self.metrics.files_opened += 1
+        return open(blob_path(handle.path, key), "rb")
+
+    @timed("delete")
     def delete(self, collection=None, key=None):
         """
         Delete one or more records or collections
         """
-        return self.get(collection=collection, key=key, flags=self._DELETE)
+        self._check_writable()
+        return self._get(collection=collection, key=key, flags=self._DELETE)
 
+    @timed("sequence")
     def sequence(self, seq_name: str) -> int:
         """
         Get and auto incremented sequence or create it
         """
+        self._check_writable()
+
         if not seq_name:
             raise ValueError("Sequence name is invalid")
 
-        sequence = -1
-
         name = file_name_wash(seq_name)
         name = seq_name.replace("*", "").replace("?", "")
 
         if len(name) < 1 or not isinstance(name, str):
             raise ValueError("Sequence name is invalid")
 
+        # Hand out numbers of a block reserved earlier
+        if self.sequence_block > 1:
+            with self._sequence_lock:
+                block = self._sequences.get(name)
+                if block and block[0] <= block[1]:
+                    block[0] += 1
+                    return block[0] - 1
+
+                last = self._reserve_sequence(name, self.sequence_block)
+                self._sequences[name] = [last - self.sequence_block + 2, last]
+                return last - self.sequence_block + 1
+
+        return self._reserve_sequence(name, 1)
+
+    def _reserve_sequence(self, name, count) -> int:
+        """
+        Advance the sequence file by count, under the file lock
+        returns the last number reserved
+        """
+        sequence = -1
+        seq_name = name
         name += "_seq"
         file_name = os.path.join(self.data_storage_area, name)
 
         if self.lock_files:
-            file_lock(os.path.realpath(self.data_storage_area), name)
+            metrics = self.metrics
+            start = time.perf_counter_ns() if metrics is not None else 0
+
+            file_lock(os.path.realpath(self.data_storage_area),
+                      name, self.lock_retry_interval)
+
+            if metrics is not None:
+                metrics.lock_wait_ns += time.perf_counter_ns() - start
 
         try:
             with open(file_name, "r") as file:
                 data = file.read()
-            sequence = int(data) + 1
+            sequence = int(data) + count
 
             with open(file_name, "w") as file:
                 file.write(str(sequence))
@@ -472,16 +1284,1457 @@ class Rocketstore:
             try:
                 os.makedirs(os.path.dirname(file_name), exist_ok=True)
                 with open(file_name, "w") as file:
-                    file.write("1")
-                sequence = 1
+                    file.write(str(count))
+                sequence = count
             except Exception as e:
-                logging.warning(f"Error creating file: {e}")
+                logging.warning("Error creating file: %s", e)
                 raise e
         except Exception as e:
-            logging.warning(f"Error reading/writing file: {e}")
+            logging.warning("Error reading/writing file: %s", e)
             raise e
 
         if self.lock_files:
             file_unlock(os.path.realpath(self.data_storage_area), name)
 
+        self._log_changes([("sequence", None, seq_name)])
         return sequence
+
+    def export(self, path, collections=None, workers=4) -> dict:
+        """
+        Stream collections (default all) and their sequences into one archive file,
+        records in key order. Gzip compressed when path ends with .gz
+        @path: archive file name
+        @collections: list of collection names
+        @workers: parallel record readers
+        @return: {'collections': 2, 'records': 1000, 'blobs': 0, 'sequences': 1, 'bytes': 81234}
+        """
+        return archive.write_archive(self, path, collections, workers)
+
+    def import_(self, path, workers=4) -> dict:
+        """
+        Restore an archive written by export(). Existing records with the same
+        keys are overwritten, sequences never go backwards.
+        @return: {'collections': 2, 'records': 1000, 'blobs': 0, 'sequences': 1, 'bytes': 81234}
+        """
+        self._check_writable()
+        return archive.read_archive(self, path, workers)
+
+    def freeze(self, collection) -> dict:
+        """
+        Compile a collection into one immutable, indexed pack file
+        (<collection>/.rocketstore/pack). A Rocketstore opened with
+        read_only=True serves get() of the collection from the pack, without
+        listing the directory or opening record files.
+        Freeze again after changing the collection.
+        @return: {'count': number of records packed}
+        """
+        self._check_writable()
+        handle = self._handle(collection)
+        keys = sorted(self.get(handle, "*", self._KEYS).get("key", []))
+
+        def read_chunk(chunk_keys):
+            items = []
+            for key in chunk_keys:
+                try:
+                    items.append((key, self._read_file(handle, key)))
+                except (FileNotFoundError, IsADirectoryError):
+                    pass
+            return items
+
+        items = (
+            item
+            for chunk in archive.ordered_map(read_chunk, list(archive.chunks(keys)), 4)
+            for item in chunk
+        )
+
+        os.makedirs(os.path.join(handle.path, META_DIR), exist_ok=True)
+        count = write_pack(os.path.join(handle.path, META_DIR, "pack"), items)
+        self._drop_pack(handle.name)
+
+        return {"count": count}
+
+    def reap(self, batch_size=None) -> int:
+        """
+        Delete expired records of every collection, at most batch_size per collection.
+        Cost is proportional to the number of expiring records.
+        @return: number of records deleted
+        """
+        self._check_writable()
+
+        # Expiry indexes of collections not touched yet by this instance,
+        # other processes may have posted records with a ttl there since
+        collections, _ = archive.list_collections(self.data_storage_area)
+        for collection in collections:
+            if collection not in self._expiry and os.path.exists(os.path.join(
+                    self.data_storage_area, collection, META_DIR, "ttl")):
+                self._expiry_index(self._handle(collection))
+
+        count = 0
+        for collection in list(self._expiry):
+            with self._ttl_lock:
+                expiry = self._expiry.get(collection)
+                if expiry is not None:
+                    expiry.refresh(force=True)
+            count += self._reap(self._handle(collection), limit=batch_size)
+        return count
+
+    def start_reaper(self, interval=1.0, batch_size=1000) -> None:
+        """
+        Reap expired records every interval seconds in a background thread
+        """
+        if self._reaper is not None:
+            return
+
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.reap(batch_size)
+                except Exception as e:
+                    logging.warning("Expiry reaper: %s", e)
+
+        thread = threading.Thread(
+            target=run, name="rocketstore-reaper", daemon=True)
+        self._reaper = (thread, stop)
+        thread.start()
+
+    def stop_reaper(self) -> None:
+        if self._reaper is not None:
+            thread, stop = self._reaper
+            stop.set()
+            thread.join()
+            self._reaper = None
+
+    def _expiry_index(self, handle) -> ExpiryIndex:
+        expiry = self._expiry.get(handle.name)
+        if expiry is None:
+            with self._ttl_lock:
+                expiry = self._expiry.get(handle.name)
+                if expiry is None:
+                    expiry = self._expiry[handle.name] = ExpiryIndex(
+                        handle.path, self.ttl_refresh_interval)
+                    return expiry
+
+        # Expiries other processes logged since, looked for once per interval
+        with self._ttl_lock:
+            expiry.refresh()
+        return expiry
+
+    def _expire(self, handle):
+        """
+        Expired records are absent: reap them, or when read only return the
+        ExpiryIndex the caller must hide them with
+        """
+        expiry = self._expiry_index(handle)
+        if expiry and expiry.has_due(time.time()):
+            if self.read_only:
+                return expiry
+            self._reap(handle)
+        return None
+
+    def _reap(self, handle, limit=None) -> int:
+        with self._ttl_lock:
+            expiry = self._expiry_index(handle)
+            due = expiry.pop_due(time.time(), limit)
+            if not due:
+                return 0
+
+            removed = []
+            missing = []
+            before = self._stamp_before(handle)
+            for key in due:
+                try:
+                    self._unlink_record(handle, key)
+                    removed.append(key)
+                except FileNotFoundError:
+                    missing.append(key)
+
+            self._cache_remove(handle.name, removed)
+            if missing:
+                self._cache_remove(handle.name, missing, deleted=False)
+            self._stamp_after(handle, before)
+            expiry.clear(due)
+            self._log_changes([("delete", handle.name, k) for k in removed])
+
+            return len(removed)
+
+    def _sorted_keys(self, collection):
+        """
+        Sorted key index of a cached collection (built from the key cache), else None
+        """
+        index = self.key_index.get(collection)
+        if index is None and collection in self.key_cache:
+            with self._cache_lock(collection).write():
+                index = self.key_index.get(collection)
+                keys = self.key_cache.get(collection)
+                if index is None and keys is not None:
+                    index = self.key_index[collection] = sorted(keys)
+                    self.key_cache.charge_index(collection, index)
+        return index
+
+    def _numeric_range(self, handle, key, n, newest, hide_expired=None) -> list:
+        """
+        First n keys matching key in numeric order, from the end when newest
+        """
+        collection = handle.name
+        index = self.numeric_index.get(collection)
+        if index is None:
+            if collection not in self.key_cache:
+                try:
+                    self._scan_keys(handle)
+                except FileNotFoundError:
+                    return []
+
+            with self._cache_lock(collection).write():
+                index = self.numeric_index.get(collection)
+                keys = self.key_cache.get(collection)
+                if index is None and keys is not None:
+                    index = self.numeric_index[collection] = sorted(map(numeric_key, keys))
+                    self.key_cache.charge_index(collection, index)
+            if index is None:
+                return []
+
+        match = key and key != "*"
+        now = time.time()
+        keys = []
+        with self._cache_lock(collection).read():
+            for _, k in reversed(index) if newest else index:
+                if match and not glob.fnmatch.fnmatch(k, key):
+                    continue
+                if hide_expired is not None and hide_expired.is_expired(k, now):
+                    continue
+                keys.append(k)
+                if len(keys) >= n:
+                    break
+        return keys
+
+    def _cache_lock(self, collection) -> RWLock:
+        """
+        Reader / writer lock of the in-memory caches of a collection.
+        Held only while the caches are looked at or changed, never across file I/O
+        """
+        lock = self._cache_locks.get(collection)
+        if lock is None:
+            with self._cache_locks_guard:
+                lock = self._cache_locks.setdefault(collection, RWLock())
+        return lock
+
+    def _io_executor(self) -> ThreadPoolExecutor:
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(
+                max_workers=self.io_workers, thread_name_prefix="rocketstore-io")
+        return self._io_pool
+
+    def _decode_in_workers(self, count) -> bool:
+        return self.decode_workers > 1 and count >= decode.MIN_KEYS
+
+    def _decode_executor(self):
+        if self._decode_pool is None:
+            self._decode_pool = decode.process_pool(self.decode_workers)
+        return self._decode_pool
+
+    def _decode_chunks(self, handle, keys, fields=None):
+        """
+        Read and decode keys in the worker processes, in order
+        yields (chunk keys, (records, missing positions, bytes read))
+        """
+        size = decode.chunk_size(len(keys), self.decode_workers)
+        key_chunks = list(archive.chunks(keys, size))
+        results = archive.ordered_map(
+            decode.decode_chunk,
+            [(handle.path, c, fields) for c in key_chunks],
+            self.decode_workers,
+            self._decode_executor(),
+        )
+        return zip(key_chunks, results)
+
+    def _decode_records(self, handle, keys, fields, records) -> list:
+        """
+        Fill records (aligned with keys) from the worker processes
+        returns the positions of the keys that have no file
+        """
+        missing = []
+        offset = 0
+        metrics = self.metrics
+        for chunk_keys, (chunk, chunk_missing, bytes_read) in self._decode_chunks(
+                handle, keys, fields):
+            records[offset:offset + len(chunk)] = chunk
+            missing.extend(offset + i for i in chunk_missing)
+            if metrics is not None:
+                metrics.files_opened += len(chunk_keys) - len(chunk_missing)
+                metrics.bytes_read += bytes_read
+            offset += len(chunk_keys)
+        return missing
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise PermissionError("Rocketstore is opened read only")
+
+    def _pack(self, handle):
+        """
+        Mapped pack of a collection, None when it isn't frozen. The mapping is
+        reused while the pack file is the same: freezing again replaces it
+        """
+        path = os.path.join(handle.path, META_DIR, "pack")
+        stamp = pack_stamp(path)
+        cached = self._packs.get(handle.name, False)
+        if cached is not False and (cached.stamp if cached else None) == stamp:
+            return cached
+
+        try:
+            pack = Pack(path) if stamp is not None else None
+        except (FileNotFoundError, ValueError):
+            pack = None
+
+        # Readers may still be using the one replaced: unmapped once they are done
+        self._packs[handle.name] = pack
+        return pack
+
+    def _drop_pack(self, collection=None) -> None:
+        names = [collection] if collection else list(self._packs)
+        for name in names:
+            pack = self._packs.pop(name, None)
+            if pack is not None:
+                pack.close()
+
+    def _get_packed(self, pack, key, flags, fields=None, first=None, newest=False) -> dict:
+        if not key or key == "*":
+            start, end = 0, len(pack)
+            positions = range(start, end)
+        elif "*" not in key and "?" not in key and "[" not in key:
+            i = pack.find(key)
+            positions = [i] if i >= 0 else []
+        else:
+            prefix = prefix_of(key) if os.name != "nt" else None
+            if prefix is not None:
+                positions = range(*pack.prefix_range(prefix))
+            else:
+                positions = [
+                    i for i, k in enumerate(pack.keys())
+                    if glob.fnmatch.fnmatch(k, key)
+                ]
+
+        if first is not None:
+            positions = sorted(positions, key=lambda i: numeric_key(pack.key_at(i)),
+                               reverse=newest)[:first]
+        elif flags & self._ORDER_NUMERIC:
+            positions = sorted(positions, key=lambda i: numeric_key(pack.key_at(i)))
+
+        if flags & self._ORDER_DESC:
+            positions = positions[::-1]
+
+        result = {"count": len(positions)}
+        if not positions or flags & self._COUNT:
+            return result
+
+        result["key"] = [pack.key_at(i) for i in positions]
+        if flags & (self._RAW | self._RAW_ARRAY) and not flags & self._KEYS:
+            records = [bytes(pack.data_at(i)) for i in positions]
+            result["result"] = raw_array(records) if flags & self._RAW_ARRAY else records
+        elif not flags & self._KEYS:
+            records = []
+            for i in positions:
+                try:
+                    records.append(project(json.loads(pack.data_at(i)), fields))
+                except json.JSONDecodeError:
+                    records.append("*format*")
+            result["result"] = records
+
+        return result
+
+    def batch(self) -> Batch:
+        """
+        Atomic batch of posts and deletes across collections: all of it survives
+        a crash or none. It is not isolated, readers may see it half applied
+        @Sample:
+            with rs.batch() as b:
+                b.post("orders", "1001", order)
+                b.delete("carts", "77")
+        """
+        return Batch(self)
+
+    def checkpoint(self) -> None:
+        """
+        Flush applied batches to disk and empty the write-ahead log
+        """
+        wal = self._wal_log()
+        if not wal.exists():
+            return
+
+        with wal.lock():
+            # Batches are on disk before they are marked applied
+            self._replay_wal(locked=True)
+            wal.truncate()
+
+    def changes(self, since=None, follow=False, poll_interval=0.5):
+        """
+        Changes made to the storage area after offset since, oldest first
+        (needs the changelog option on the writers)
+        @since: offset of the last change seen, None for all changes retained
+        @follow: keep waiting for new changes instead of stopping at the end
+        @poll_interval: seconds between looks for new changes when following
+        @yield: dict
+            {'offset': 7, 'time': 1760890443.12, 'op': 'post', 'collection': 'person', 'key': '1-Adam'}
+            op is post, delete, drop (collection, or all when collection is None)
+            or sequence (key is the name of the sequence)
+        raises ValueError when changes after since were already removed by retention
+        """
+        log = self._changes_log()
+        while True:
+            for change in log.read(since):
+                since = change["offset"]
+                yield change
+            if not follow:
+                return
+            time.sleep(poll_interval)
+            if since is None:
+                since = 0
+
+    @timed("follow")
+    def follow(self, leader, batch_size=1000) -> int:
+        """
+        Apply the changes made to the leader storage area since the last call,
+        keeping this one a copy of it (log shipping). The leader must log its
+        changes (option changelog=True). May be called on a read_only instance,
+        which keeps serving get() with up to date caches.
+        A new follower, or one that fell behind the changelog retention of the
+        leader, is first synced file by file.
+        @leader: data_storage_area of the leader
+        @batch_size: changes applied (and the position saved) at a time
+        @return: number of changes applied
+        """
+        leader = os.path.abspath(leader)
+        if leader == os.path.abspath(self.data_storage_area):
+            raise ValueError("A storage area can't follow itself")
+
+        with self._follow_lock:
+            log = Changelog(leader)
+            position = read_meta(self.data_storage_area, "replica")
+            if position and position.get("leader") == leader:
+                offset = position["offset"]
+            else:
+                offset = self._resync(leader, log)
+
+            applied = 0
+            start = time.perf_counter()
+            while True:
+                try:
+                    changes = log.read(offset)
+                    while True:
+                        batch = list(itertools.islice(changes, batch_size))
+                        if not batch:
+                            break
+                        self._apply_changes(leader, batch)
+                        offset = batch[-1]["offset"]
+                        write_meta(self.data_storage_area, "replica",
+                                   {"leader": leader, "offset": offset})
+                        applied += len(batch)
+                    break
+                except ValueError:
+                    # Changes were removed before they were applied
+                    offset = self._resync(leader, log)
+
+            elapsed = time.perf_counter() - start
+            self._replica["applied"] += applied
+            if applied:
+                self._replica["rate"] = applied / elapsed if elapsed else 0.0
+            return applied
+
+    def start_follower(self, leader, interval=1.0, batch_size=1000) -> None:
+        """
+        Follow the leader every interval seconds in a background thread
+        """
+        if self._follower is not None:
+            return
+
+        stop = threading.Event()
+
+        def run():
+            while True:
+                try:
+                    self.follow(leader, batch_size)
+                except Exception as e:
+                    logging.warning("Follower: %s", e)
+                if stop.wait(interval):
+                    return
+
+        thread = threading.Thread(
+            target=run, name="rocketstore-follower", daemon=True)
+        self._follower = (thread, stop)
+        thread.start()
+
+    def stop_follower(self) -> None:
+        if self._follower is not None:
+            thread, stop = self._follower
+            stop.set()
+            thread.join()
+            self._follower = None
+
+    def replication_info(self) -> dict:
+        """
+        Position of this follower, empty if it never followed a leader
+        @return: dict
+            {'leader': '/mnt/b/rsdb', 'offset': 1200, 'leader_offset': 1250, 'lag': 50,
+             'lag_seconds': 0.8, 'applied': 10230, 'rate': 5120.3, 'resyncs': 1}
+            lag_seconds: age of the oldest change not applied yet
+            rate: changes applied per second by the last follow() that applied any
+        """
+        position = read_meta(self.data_storage_area, "replica")
+        if not position:
+            return {}
+
+        log = Changelog(position["leader"])
+        leader_offset = log.next_offset() - 1
+        lag_seconds = 0.0
+        if leader_offset > position["offset"]:
+            try:
+                oldest = next(log.read(position["offset"]), None)
+            except ValueError:
+                oldest = None
+            if oldest is not None:
+                lag_seconds = max(0.0, round(time.time() - oldest["time"], 3))
+
+        return {
+            "leader": position["leader"],
+            "offset": position["offset"],
+            "leader_offset": leader_offset,
+            "lag": max(0, leader_offset - position["offset"]),
+            "lag_seconds": lag_seconds,
+            **self._replica,
+        }
+
+    def define_aggregate(
+        self, collection=None, field=None, ops=("count", "sum", "min", "max")
+    ) -> dict:
+        """
+        Keep a running aggregate of a numeric field of the records of a collection
+        It is computed now, in one pass over the records, then kept up to date by
+        post and delete and persisted with the collection.
+        @collection: collection name
+        @field: field name, dotted for nested objects ("total.net")
+        @ops: any of count, sum, min and max
+        @return: dict with the current values {'count': 3, 'sum': 60.5, 'min': 5, 'max': 40}
+            records where the field is missing or not a number are not counted
+        """
+        self._check_writable()
+        ops = list(ops)
+        if not field or not isinstance(field, str):
+            raise ValueError("No field name given")
+        if not ops or any(op not in AGGREGATE_OPS for op in ops):
+            raise ValueError(
+                f"Aggregate operations must be some of {', '.join(AGGREGATE_OPS)}")
+
+        handle = self._handle(collection)
+        aggregates = self._aggregates_of(handle)
+        aggregates[field] = Aggregate(field, ops)
+        self._recompute_aggregates(handle)
+        self._persist_aggregates(handle.name)
+
+        return aggregates[field].result()
+
+    def aggregate(self, collection=None, field=None) -> dict:
+        """
+        Current values of an aggregate defined with define_aggregate
+        """
+        handle = self._handle(collection)
+        aggregates = self._aggregates_of(handle)
+        if field not in aggregates:
+            raise ValueError(f"No aggregate defined on '{handle.name}' {field}")
+
+        # Records written by other processes since: one stat
+        self._check_aggregates(handle)
+        if aggregates[field].stale:
+            self._recompute_aggregates(handle)
+        return aggregates[field].result()
+
+    def drop_aggregate(self, collection=None, field=None) -> None:
+        self._check_writable()
+        handle = self._handle(collection)
+        if self._aggregates_of(handle).pop(field, None) is not None:
+            self._persist_aggregates(handle.name)
+
+    def recompute_aggregates(self, collection=None) -> None:
+        """
+        Compute the aggregates of a collection again, in one pass over its records
+        """
+        self._recompute_aggregates(self._handle(collection))
+
+    def _aggregates_of(self, handle) -> dict:
+        """
+        {field: Aggregate} of a collection, loaded from its bookkeeping on first use,
+        with the write generation they hold (see utils/aggregate.py)
+        """
+        aggregates = self._aggregates.get(handle.name)
+        if aggregates is not None:
+            return aggregates
+
+        aggregates = {}
+        held = None
+        snapshot = read_meta(handle.path, "aggregates")
+        if snapshot:
+            held = snapshot.get("generation")
+            for field, state in snapshot.get("fields", {}).items():
+                aggregates[field] = Aggregate(field, state["ops"], state)
+                if held is None:
+                    aggregates[field].stale = True
+
+        with self._cache_lock(handle.name).write():
+            self._aggregate_generation.setdefault(handle.name, held)
+            return self._aggregates.setdefault(handle.name, aggregates)
+
+    def _check_aggregates(self, handle) -> None:
+        """
+        Mark the aggregates stale when records were written since the
+        generation they hold, by another process
+        """
+        current = generation(handle.path)
+        with self._cache_lock(handle.name).write():
+            if current != self._aggregate_generation.get(handle.name):
+                for aggregate in self._aggregates_of(handle).values():
+                    aggregate.stale = True
+
+    def _read_record(self, handle, key):
+        """
+        Decoded record, None when there is none
+        """
+        try:
+            return json.loads(self._read_file(handle, key))
+        except (FileNotFoundError, IsADirectoryError, json.JSONDecodeError):
+            return None
+
+    def _update_aggregates(self, handle, old, new) -> None:
+        """
+        A record was written from old to new (None when absent): update the
+        aggregates, and tell other processes about the write
+        """
+        with self._cache_lock(handle.name).write():
+            for aggregate in self._aggregates_of(handle).values():
+                aggregate.update(old, new)
+            note_write(handle.path)
+            held = self._aggregate_generation.get(handle.name)
+            if held is not None:
+                self._aggregate_generation[handle.name] = [held[0], held[1] + 1]
+            self._aggregates_dirty.add(handle.name)
+
+    def _unlink_record(self, handle, key) -> None:
+        """
+        Delete a record file (and the bytes of a blob), taking its value out of
+        the aggregates of the collection
+        """
+        aggregates = self._aggregates_of(handle)
+        old = self._read_record(handle, key) if aggregates else None
+        shared = self._open_shared(handle, key) if handle.is_linked() else None
+        try:
+            handle.unlink(key)
+        finally:
+            if shared is not None:
+                with shared:
+                    dedup.release(handle.path, shared)
+        if aggregates:
+            self._update_aggregates(handle, old, None)
+
+        # The bytes of a blob record
+        try:
+            os.remove(blob_path(handle.path, key))
+        except FileNotFoundError:
+            pass
+
+    def _recompute_aggregates(self, handle) -> None:
+        aggregates = self._aggregates_of(handle)
+        if not aggregates:
+            return
+
+        # Generation first: records written meanwhile move it on, and are
+        # recomputed next time
+        if not self.read_only:
+            restart_writes(handle.path)
+        held = generation(handle.path)
+        fields = list({field.split(".")[0] for field in aggregates})
+        fresh = {f: Aggregate(f, a.ops) for f, a in aggregates.items()}
+        for aggregate in fresh.values():
+            aggregate.reset()
+        for _, record in self.iter_records(handle, "*", fields=fields):
+            for aggregate in fresh.values():
+                aggregate.update(None, record)
+
+        with self._cache_lock(handle.name).write():
+            for field, aggregate in fresh.items():
+                if field in aggregates:
+                    aggregates[field] = aggregate
+            self._aggregate_generation[handle.name] = held
+            self._aggregates_dirty.add(handle.name)
+
+    def _persist_aggregates(self, collection) -> None:
+        self._aggregates_dirty.discard(collection)
+        if self.read_only:
+            return
+
+        handle = self._handle(collection)
+        aggregates = self._aggregates.get(collection)
+        if aggregates is None or not os.path.isdir(handle.path):
+            return
+
+        with self._cache_lock(collection).read():
+            snapshot = {
+                "fields": {f: a.to_meta() for f, a in aggregates.items()},
+                "generation": self._aggregate_generation.get(collection),
+            }
+        write_meta(handle.path, "aggregates", snapshot)
+
+    def _resync(self, leader, log) -> int:
+        """
+        Copy the leader file by file. Returns the offset to follow the log from
+        """
+        # Taken first: changes made while copying are applied again, harmlessly
+        offset = log.next_offset() - 1
+        copied = replica.sync_tree(leader, os.path.abspath(self.data_storage_area))
+        if self.metrics is not None:
+            self.metrics.files_opened += copied
+
+        self._reset_caches(flush=False)
+        write_meta(self.data_storage_area, "replica", {"leader": leader, "offset": offset})
+        self._replica["resyncs"] += 1
+        return offset
+
+    def _apply_changes(self, leader, changes) -> None:
+        """
+        Apply changelog entries of the leader to this storage area and its caches
+        """
+        storage = os.path.abspath(self.data_storage_area)
+        logged = []
+
+        for step, arg in replica.plan(changes):
+            if step == "drop" and arg is None:
+                for name in os.listdir(storage):
+                    if name not in replica.SKIP:
+                        replica.remove_tree(os.path.join(storage, name))
+                self._reset_caches(flush=False)
+                logged.append(("drop", None, None))
+
+            elif step == "drop":
+                replica.remove_tree(os.path.join(storage, arg))
+                replica.remove_file(os.path.join(storage, f"{arg}_seq"))
+                self._cache_drop(arg)
+                logged.append(("drop", arg, None))
+
+            elif step == "sequence":
+                replica.copy_file(
+                    os.path.join(leader, f"{arg}_seq"), os.path.join(storage, f"{arg}_seq"),
+                    os.path.join(storage, META_DIR))
+                with self._sequence_lock:
+                    self._sequences.pop(arg, None)
+                logged.append(("sequence", None, arg))
+
+            else:
+                items = list(arg.items())
+                if len(items) > 8:
+                    logged += self._io_executor().map(
+                        lambda item: self._apply_record(leader, *item), items)
+                else:
+                    logged += [self._apply_record(leader, *item) for item in items]
+
+        self._log_changes(logged)
+
+    def _apply_record(self, leader, target, op):
+        """
+        Make a record the same as on the leader. Returns the change made
+        """
+        collection, key = target
+        handle = self._handle(collection)
+        file_name = handle.file_name(key)
+        aggregates = self._aggregates_of(handle)
+        old = self._read_record(handle, key) if aggregates else None
+
+        copied = -1
+        before = self._stamp_before(handle)
+        if op == "post":
+            exists = os.path.lexists(file_name)
+            handle.ensure()
+            copied = replica.copy_file(
+                os.path.join(leader, collection, key), file_name,
+                os.path.join(handle.path, META_DIR))
+            if copied >= 0 and (
+                os.path.exists(blob_path(os.path.join(leader, collection), key))
+                or os.path.exists(blob_path(handle.path, key))
+            ):
+                replica.copy_file(
+                    blob_path(os.path.join(leader, collection), key),
+                    blob_path(handle.path, key), blob_dir(handle.path))
+                handle.blobs = True
+
+        if copied >= 0:
+            self._cache_add(collection, key, exists)
+            if self.metrics is not None:
+                self.metrics.bytes_written += copied
+            change = ("post", collection, key)
+        else:
+            # Deleted, or gone from the leader since it was posted
+            if replica.remove_file(file_name):
+                self._cache_remove(collection, [key])
+            replica.remove_file(blob_path(handle.path, key))
+            change = ("delete", collection, key)
+        self._stamp_after(handle, before)
+
+        if aggregates:
+            self._update_aggregates(
+                handle, old, self._read_record(handle, key) if copied >= 0 else None)
+        return change
+
+    def _changes_log(self) -> Changelog:
+        if self._changelog is None:
+            self._changelog = Changelog(
+                self.data_storage_area, **self.changelog_config)
+        return self._changelog
+
+    def _log_changes(self, entries) -> None:
+        """
+        entries: list of (op, collection, key), logged when the changelog is on
+        """
+        if self.changelog and entries:
+            self._changes_log().append(entries)
+
+    def _wal_log(self) -> WriteAheadLog:
+        if self._wal is None:
+            self._wal = WriteAheadLog(self.data_storage_area)
+        return self._wal
+
+    def _commit_batch(self, ops) -> int:
+        """
+        Log the batch durably, then apply it and flush what it wrote to disk
+        before marking it applied, so recovery replays any batch a crash may
+        have cut short. Only writers of batches take the log lock: get()
+        doesn't, so a reader may see part of a batch being applied
+        """
+        self._check_writable()
+        if not ops:
+            return 0
+
+        wal = self._wal_log()
+        batch_id = os.urandom(8).hex()
+
+        with wal.lock():
+            # Durable from here on: one fsync for the whole batch
+            wal.append(encode_batch(batch_id, ops))
+            self._apply_ops(ops)
+            self._sync_ops(ops)
+            wal.append(json.dumps({"applied": batch_id}).encode())
+
+            # Every batch in it is applied and on disk
+            if wal.size() > self.wal_checkpoint_bytes:
+                wal.truncate()
+
+        return len(ops)
+
+    def _apply_ops(self, ops) -> None:
+        for op in ops:
+            handle = self._handle(op[1])
+            if op[0] == "post":
+                data = op[3]
+                if not isinstance(data, str):
+                    data = json.dumps(data)  # replayed from the log
+                self._store(handle, op[2], data)
+            elif op[0] == "delete":
+                before = self._stamp_before(handle)
+                try:
+                    self._unlink_record(handle, op[2])
+                    self._cache_remove(handle.name, [op[2]])
+                except FileNotFoundError:
+                    self._cache_remove(handle.name, [op[2]], deleted=False)
+                self._stamp_after(handle, before)
+                self._log_changes([("delete", handle.name, op[2])])
+
+    def _sync_ops(self, ops) -> None:
+        """
+        fsync the record files and collection directories written by ops
+        """
+        touched = {}
+        for op in ops:
+            touched.setdefault(op[1], set())
+            if op[0] == "post":
+                touched[op[1]].add(op[2])
+
+        for collection, keys in touched.items():
+            handle = self._handle(collection)
+            for key in keys:
+                try:
+                    fd = handle.opener(key, os.O_RDONLY)
+                except FileNotFoundError:
+                    continue  # deleted again by a later op
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+            # New and removed names; directories can't be opened on Windows
+            if os.name != "nt":
+                fd = os.open(handle.path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+    def _replay_wal(self, locked=False) -> None:
+        wal = self._wal_log()
+        if not locked:
+            with wal.lock():
+                return self._replay_wal(locked=True)
+
+        for batch_id, ops in wal.pending():
+            logging.warning("Replaying interrupted batch %s", batch_id)
+            self._apply_ops(ops)
+            self._sync_ops(ops)
+            wal.append(json.dumps({"applied": batch_id}).encode())
+
+    def _restore_sequence(self, seq_name, value) -> None:
+        self._sequences.pop(seq_name.replace("*", "").replace("?", ""), None)
+        name = seq_name.replace("*", "").replace("?", "") + "_seq"
+        file_name = os.path.join(self.data_storage_area, name)
+        os.makedirs(self.data_storage_area, exist_ok=True)
+
+        if self.lock_files:
+            file_lock(os.path.realpath(self.data_storage_area),
+                      name, self.lock_retry_interval)
+        try:
+            current = archive.read_sequence(self.data_storage_area, seq_name)
+            if current is None or current < value:
+                with open(file_name, "w") as file:
+                    file.write(str(value))
+        finally:
+            if self.lock_files:
+                file_unlock(os.path.realpath(self.data_storage_area), name)
+
+    def flush(self) -> None:
+        """
+        Persist the record counters, aggregates and Bloom filters of collections changed since they were loaded.
+        Called automatically at interpreter exit.
+        """
+        for collection in list(self._count_dirty):
+            self._persist_count(collection)
+        for collection in list(self._aggregates_dirty):
+            self._persist_aggregates(collection)
+        for collection in list(self._bloom_dirty):
+            self._persist_bloom(collection)
+
+    def _persist_count(self, collection) -> None:
+        self._count_dirty.discard(collection)
+        if self.read_only:
+            return
+
+        handle = self._handle(collection)
+        scan_dir = handle.path
+        if collection not in self.key_count or not os.path.isdir(scan_dir):
+            return
+
+        # Create the bookkeeping directory first, it changes the collection mtime
+        os.makedirs(os.path.join(scan_dir, META_DIR), exist_ok=True)
+
+        # Changed since the count was verified, by us or by others: count again
+        mtime = self._listed_at.get(collection)
+        if mtime is None or os.stat(scan_dir).st_mtime_ns != mtime:
+            try:
+                mtime = self._relist(handle)
+            except FileNotFoundError:
+                return
+
+        write_meta(scan_dir, "count", {
+            "count": self.key_count[collection],
+            "mtime": mtime,
+        })
+
+    def _persist_bloom(self, collection) -> None:
+        self._bloom_dirty.discard(collection)
+        bloom = self._blooms.get(collection)
+        if self.read_only or bloom is None:
+            return
+
+        handle = self._handle(collection)
+        path = handle.path
+        if not os.path.isdir(path):
+            return
+
+        # Create the bookkeeping directory first, it changes the collection mtime
+        os.makedirs(os.path.join(path, META_DIR), exist_ok=True)
+
+        # Changed since it was built, by us or by others: keys of other
+        # processes may be missing, build it again
+        if bloom.mtime is None or os.stat(path).st_mtime_ns != bloom.mtime:
+            try:
+                self._relist(handle)
+            except FileNotFoundError:
+                return
+            bloom = self._blooms.get(collection)
+            if bloom is None:
+                return
+        bloom.save(path)
+
+    def _relist(self, handle):
+        """
+        List a collection again for the bookkeeping saved with it: the key
+        count and Bloom filter then hold every key as of the mtime returned
+        """
+        mtime, keys = self._listing(handle)
+        collection = handle.name
+        with self._cache_lock(collection).write():
+            if collection in self.key_count:
+                self.key_count[collection] = len(keys)
+            self._listed_at[collection] = mtime
+            if collection in self._blooms:
+                self._blooms[collection] = BloomFilter.of(keys, self.bloom_fp_rate, mtime)
+        return mtime
+
+    def _stamp_before(self, handle):
+        """
+        Directory mtime before a write of ours, when the key count or Bloom
+        filter was verified at it. None when there is nothing to keep current
+        """
+        collection = handle.name
+        bloom = self._blooms.get(collection)
+        stamps = (self._listed_at.get(collection), bloom.mtime if bloom else None)
+        if stamps == (None, None):
+            return None
+        try:
+            mtime = self._dir_mtime(handle)
+        except FileNotFoundError:
+            return None
+        return mtime if mtime in stamps else None
+
+    def _stamp_after(self, handle, before) -> None:
+        """
+        Our own write changed the directory mtime, and the key count and Bloom
+        filter were updated with it: move their stamp along, so the next flush
+        doesn't list the collection again. Left behind when others changed it
+        """
+        if before is None:
+            return
+        collection = handle.name
+        try:
+            mtime = self._dir_mtime(handle)
+        except FileNotFoundError:
+            return
+        with self._cache_lock(collection).write():
+            if self._listed_at.get(collection) == before:
+                self._listed_at[collection] = mtime
+            bloom = self._blooms.get(collection)
+            if bloom is not None and bloom.mtime == before:
+                bloom.mtime = mtime
+
+    def _dir_mtime(self, handle) -> int:
+        if handle.dir_fd is not None:
+            return os.fstat(handle.dir_fd).st_mtime_ns
+        return os.stat(handle.path).st_mtime_ns
+
+    def _bloom_absent(self, handle, key) -> bool:
+        """
+        True when the Bloom filter of the collection is sure key doesn't exist.
+        A filter saved by an earlier process is used while the directory is unchanged
+        """
+        bloom = self._blooms.get(handle.name)
+        if bloom is None:
+            try:
+                mtime = os.stat(handle.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            bloom = BloomFilter.load(handle.path, mtime)
+            if bloom is None:
+                return False
+            bloom = self._blooms.setdefault(handle.name, bloom)
+
+        if key in bloom:
+            return False
+        if self.metrics is not None:
+            self.metrics.bloom_negatives += 1
+        return True
+
+    def _handle(self, collection) -> Collection:
+        """
+        Validated collection handle, created on first use of the name
+        """
+        if isinstance(collection, Collection):
+            if self._collections.get(collection.name) is collection:
+                return collection
+            collection = collection.name
+
+        handle = self._collections.get(collection)
+        if handle is not None:
+            return handle
+
+        name = str(collection or "") if collection else ""
+
+        if len(name) < 1 or not name or name == "":
+            raise ValueError("No valid collection name given")
+
+        # True = is have illegal characters
+        if identifier_name_test(name) == True:
+            raise ValueError("Collection name contains illegal characters")
+
+        handle = self._collections.get(name)
+        if handle is None:
+            handle = self._collections.setdefault(name, Collection(self, name))
+        return handle
+
+    def _write_file(self, handle, key, data) -> None:
+        if self.dedup or handle.is_linked():
+            self._write_linked(handle, key, data)
+            return
+
+        if isinstance(data, str):
+            data = data.encode()
+        handle.ensure()
+        # Not truncated on open: the file may be a payload another process
+        # shared since is_linked() was answered, found by its link count
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        try:
+            fd = handle.opener(key, flags)
+        except FileNotFoundError:
+            # Directory removed behind our back
+            if not handle.is_stale():
+                raise
+            handle.reopen()
+            fd = handle.opener(key, flags)
+        with open(fd, "wb") as file:
+            st = os.fstat(fd)
+            if st.st_nlink > 1:
+                handle.linked = True
+            else:
+                file.write(data)
+                if st.st_size > len(data):
+                    file.truncate()
+        if st.st_nlink > 1:
+            self._write_linked(handle, key, data)
+            return
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.files_opened += 1
+            metrics.bytes_written += len(data)
+
+    def _write_linked(self, handle, key, data) -> None:
+        """
+        Replace a record of a collection with shared payloads: linked to the
+        payload when dedup is on and the record is large enough, else a file of
+        its own. Never in place, another key may link the old file
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        handle.ensure()
+
+        tmp_name = os.path.join(
+            handle.path, META_DIR, f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        os.makedirs(os.path.dirname(tmp_name), mode=0o775, exist_ok=True)
+        if self.dedup and len(data) >= self.dedup_min_size:
+            written = dedup.link_payload(handle.path, data, tmp_name)
+            handle.linked = True
+        else:
+            with open(tmp_name, "wb") as file:
+                file.write(data)
+            written = True
+
+        old = self._open_shared(handle, key)
+        os.replace(tmp_name, handle.file_name(key))
+        if old is not None:
+            with old:
+                dedup.release(handle.path, old)
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.files_opened += 1
+            if written:
+                metrics.bytes_written += len(data)
+
+    def _open_shared(self, handle, key):
+        """
+        Open record file that is the last link to a shared payload, else None
+        """
+        try:
+            if handle.stat(key).st_nlink != 2:
+                return None
+            return open(key, "rb", opener=handle.opener)
+        except FileNotFoundError:
+            return None
+
+    def _read_file(self, handle, key, version=False):
+        """
+        Stored bytes of a record, with its version (data, version) if asked for
+        """
+        if self._payloads is not None and handle.is_linked():
+            found = self._read_shared(handle, key)
+            if found is not None:
+                return found if version else found[0]
+
+        try:
+            return self._read_open(handle, key, version)
+        except FileNotFoundError:
+            if handle.dir_fd is None or not handle.is_stale():
+                raise
+
+        # Directory replaced behind our back
+        handle.close()
+        if not handle.open_existing():
+            raise FileNotFoundError(handle.file_name(key))
+        return self._read_open(handle, key, version)
+
+    def _read_shared(self, handle, key):
+        """
+        (data, version) of a record linking a shared payload, through the
+        cache of payloads. None when the record has a file of its own
+        """
+        try:
+            st = handle.stat(key)
+        except FileNotFoundError:
+            return None
+        if st.st_nlink < 2:
+            return None
+
+        version = record_version(st)
+        data = self._payloads.get(version)
+        if data is not None:
+            if self.metrics is not None:
+                self.metrics.dedup_hits += 1
+            return data, version
+
+        data, version = self._read_open(handle, key, True)
+        self._payloads.put(version, data)
+        return data, version
+
+    @staticmethod
+    def _read_open(handle, key, version):
+        with open(key, "rb", opener=handle.opener) as file:
+            data = file.read()
+            if version:
+                return data, record_version(os.fstat(file.fileno()))
+            return data
+
+    def _reset_caches(self, flush=True) -> None:
+        if flush:
+            self.flush()
+        self._wal = None
+        self._changelog = None
+        self._drop_pack()
+        self._expiry = {}
+        self._aggregates = {}
+        self._aggregate_generation = {}
+        self._aggregates_dirty = set()
+        self._sequences = {}
+        for handle in self._collections.values():
+            handle.close()
+        self._collections = {}
+        self.key_cache.clear()
+        self.key_index = {}
+        self.numeric_index = {}
+        self._blooms = {}
+        self._bloom_dirty = set()
+        self.key_count = {}
+        self._count_dirty = set()
+        self._listed_at = {}
+        if self._payloads is not None:
+            self._payloads.clear()
+
+    def _scan_keys(self, handle) -> list:
+        """
+        Read a collection directory into the key cache
+        raises FileNotFoundError if the collection does not exist
+        """
+        if not handle.open_existing():
+            raise FileNotFoundError(handle.path)
+
+        collection = handle.name
+        mtime, _list = self._listing(handle)
+
+        bloom = (
+            BloomFilter.of(_list, self.bloom_fp_rate, mtime)
+            if self.bloom and collection else None
+        )
+
+        # Update cache
+        if bloom is not None:
+            with self._cache_lock(collection).write():
+                self._blooms[collection] = bloom
+                self._bloom_dirty.add(collection)
+
+        if collection and len(_list) > 0:
+            with self._cache_lock(collection).write():
+                self.key_cache[collection] = _list
+                self.key_index.pop(collection, None)
+                self.numeric_index.pop(collection, None)
+                if self.key_count.get(collection) != len(_list):
+                    self.key_count[collection] = len(_list)
+                    self._count_dirty.add(collection)
+                self._listed_at[collection] = mtime
+
+        return _list
+
+    def _listing(self, handle):
+        """
+        Keys in a collection directory, with the directory mtime taken before
+        listing it: (mtime, keys). Keys added meanwhile change the mtime
+        """
+        mtime = self._dir_mtime(handle)
+        _list = handle.listdir()
+        if self.metrics is not None:
+            self.metrics.dir_listings += 1
+
+        # Remove .DS_Store files and our own bookkeeping
+        return mtime, [
+            e for e in _list
+            if not e.lower().endswith(".ds_store") and e != META_DIR
+        ]
+
+    def _count(self, handle, key):
+        """
+        Count records without reading them. None when the key pattern needs a full match.
+        """
+        collection = handle.name
+        if not key or key == "*":
+            return self._record_count(handle)
+
+        # fnmatch is case insensitive on windows, the key index is not
+        prefix = prefix_of(key) if os.name != "nt" else None
+        if prefix is None:
+            return None
+
+        if collection not in self.key_index and collection not in self.key_cache:
+            try:
+                keys = self._scan_keys(handle)
+            except FileNotFoundError:
+                return 0
+            if not keys:
+                return 0
+
+        with self._cache_lock(collection).write():
+            index = self.key_index.get(collection)
+            if index is None:
+                index = self.key_index[collection] = sorted(
+                    self.key_cache.get(collection, []))
+                self.key_cache.charge_index(collection, index)
+
+            start, end = prefix_range(index, prefix)
+        return end - start
+
+    def _record_count(self, handle) -> int:
+        collection, scan_dir = handle.name, handle.path
+        if collection in self.key_count:
+            return self.key_count[collection]
+
+        keys = self.key_cache.get(collection)
+        if keys is not None:
+            self.key_count[collection] = len(keys)
+            return self.key_count[collection]
+
+        # Counter persisted alongside the collection, valid while the directory is untouched
+        try:
+            mtime = os.stat(scan_dir).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+        snapshot = read_meta(scan_dir, "count")
+        if snapshot and snapshot.get("mtime") == mtime:
+            self.key_count[collection] = snapshot["count"]
+            self._listed_at[collection] = mtime
+            return snapshot["count"]
+
+        count = len(self._scan_keys(handle))
+        self.key_count[collection] = count
+        self._persist_count(collection)
+
+        return count
+
+    def _key_known(self, collection, key):
+        """
+        True/False if the caches know whether key exists, None if they can't tell
+        """
+        with self._cache_lock(collection).read():
+            if collection in self.key_index:
+                return index_contains(self.key_index[collection], key)
+            keys = self.key_cache.get(collection)
+            if keys is not None:
+                return key in keys
+        return None
+
+    def _cache_add(self, collection, key, exists=None) -> None:
+        """
+        Add a written key to the caches, unless they know it already
+        exists: whether the file was there before, for when the caches can't tell
+        """
+        with self._cache_lock(collection).write():
+            known = self._key_known(collection, key)
+
+            bloom = self._blooms.get(collection)
+            if bloom is not None and not known:
+                bloom.add(key)
+                self._bloom_dirty.add(collection)
+                if bloom.full:
+                    # Rebuilt bigger at the next listing
+                    del self._blooms[collection]
+                    self._bloom_dirty.discard(collection)
+
+            if known or known is None and exists:
+                return
+
+            self.key_cache.add(collection, key)
+            if collection in self.key_index:
+                index_add(self.key_index[collection], key)
+            if collection in self.numeric_index:
+                index_add(self.numeric_index[collection], numeric_key(key))
+            if collection in self.key_count:
+                self.key_count[collection] += 1
+                self._count_dirty.add(collection)
+
+    def _cache_remove(self, collection, keys, deleted=True) -> None:
+        """
+        Remove keys from the caches of a collection.
+        deleted: the files are known to have been removed by us
+        """
+        removed = None
+        keys = set(keys)
+
+        with self._cache_lock(collection).write():
+            if collection in self.key_cache:
+                removed = self.key_cache.remove(collection, keys)
+
+            if collection in self.key_index:
+                index = self.key_index[collection]
+                n = sum(index_remove(index, k) for k in keys)
+                removed = n if removed is None else removed
+
+            if collection in self.numeric_index:
+                index = self.numeric_index[collection]
+                n = sum(index_remove(index, numeric_key(k)) for k in keys)
+                removed = n if removed is None else removed
+
+            if collection in self.key_count:
+                if removed is None and not deleted:
+                    # Can't tell how many of them were counted
+                    del self.key_count[collection]
+                else:
+                    self.key_count[collection] = max(
+                        0, self.key_count[collection] - (len(keys) if removed is None else removed))
+                self._count_dirty.add(collection)
+
+    def _cache_evicted(self, collection) -> None:
+        """
+        The key cache of a collection was dropped to stay within the memory budget
+        """
+        self.key_index.pop(collection, None)
+        self.numeric_index.pop(collection, None)
+        if self.metrics is not None:
+            self.metrics.cache_evictions += 1
+
+    def _cache_drop(self, collection) -> None:
+        if collection in self._collections:
+            self._collections[collection].close()
+        with self._cache_lock(collection).write():
+            self.key_cache.pop(collection, None)
+            self.key_index.pop(collection, None)
+            self.numeric_index.pop(collection, None)
+            self._blooms.pop(collection, None)
+            self._bloom_dirty.discard(collection)
+            self._expiry.pop(collection, None)
+            self._aggregates.pop(collection, None)
+            self._aggregate_generation.pop(collection, None)
+            self._aggregates_dirty.discard(collection)
+            self.key_count.pop(collection, None)
+            self._count_dirty.discard(collection)
+            self._listed_at.pop(collection, None)
+        with self._sequence_lock:
+            self._sequences.pop(collection, None)
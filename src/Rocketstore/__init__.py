@@ -9,7 +9,7 @@ Desc: Inilization of RocketStore
 Docs: documentation
 """
 
-__all__ = ["Rocketstore"]
+__all__ = ["Rocketstore", "Collection", "VersionConflict", "Client"]
 
 from .__version__ import (
     __author__,
@@ -22,4 +22,6 @@ from .__version__ import (
     __version__,
 )
 
-from .Rocketstore import Rocketstore
+from .Rocketstore import Rocketstore, VersionConflict
+from .Collection import Collection
+from .Client import Client
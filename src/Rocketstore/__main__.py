@@ -0,0 +1,15 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+__main__.py (c) 2026
+Created:  2026-10-19 12:33:40
+Desc: python -m Rocketstore
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
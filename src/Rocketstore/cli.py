@@ -0,0 +1,178 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+cli.py (c) 2026
+Created:  2026-10-19 12:31:14
+Desc: Rocket Store (Python) - command line entry point
+Docs: rocketstore --help
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import sys
+import time
+import argparse
+
+from .Rocketstore import Rocketstore
+from .utils import bulk
+
+
+class Progress:
+    '''
+    Records done and rate on stderr, at most once a second
+    '''
+
+    def __init__(self, command, quiet=False) -> None:
+        self.command = command
+        self.quiet = quiet
+        self.start = time.perf_counter()
+        self.shown = self.start
+        self.tty = sys.stderr.isatty()
+
+    def __call__(self, records) -> None:
+        now = time.perf_counter()
+        if self.quiet or now - self.shown < 1:
+            return
+        self.shown = now
+        rate = records / (now - self.start)
+        print(f"{self.command}: {records} records ({rate:.0f} records/s)",
+              end="\r" if self.tty else "\n", file=sys.stderr, flush=True)
+
+
+def cmd_export(rs, args):
+    collections = args.collections.split(",") if args.collections else None
+    return rs.export(args.file, collections=collections, workers=args.workers)
+
+
+def cmd_import(rs, args):
+    return rs.import_(args.file, workers=args.workers)
+
+
+def cmd_load(rs, args):
+    flags = (Rocketstore._ADD_AUTO_INC if args.auto_inc or not (args.key or args.guid) else 0) \
+        | (Rocketstore._ADD_GUID if args.guid else 0)
+    if args.sequence_block > 1:
+        rs.options(sequence_block=args.sequence_block)
+    rows = bulk.read_rows(args.file, args.format)
+    return bulk.load(rs, args.collection, rows, workers=args.workers, key=args.key,
+                     flags=flags, progress=Progress("load", args.quiet))
+
+
+def cmd_dump(rs, args):
+    return bulk.dump(rs, args.collection, args.file, workers=args.workers, key=args.key,
+                     progress=Progress("dump", args.quiet or args.file == "-"))
+
+
+def cmd_serve(rs, args):
+    from .server import serve
+
+    token = None
+    if args.token_file:
+        with open(args.token_file, "r") as file:
+            token = file.read().strip()
+
+    rs.options(sequence_block=args.sequence_block)
+    address = args.socket if args.socket else (args.host, args.port)
+    print(f"serving {rs.data_storage_area} on {args.socket or f'{args.host}:{args.port}'}",
+          file=sys.stderr)
+    try:
+        serve(rs, address, token)
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="rocketstore", description="Rocket Store command line tools")
+    parser.add_argument("-d", "--storage", default=Rocketstore.data_storage_area,
+                        help="data storage area (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="write collections to one archive file")
+    p.add_argument("file", help="archive file, gzip compressed if it ends with .gz")
+    p.add_argument("-c", "--collections", default=None,
+                   help="comma separated collection names (default: all)")
+    p.add_argument("-w", "--workers", type=int, default=4,
+                   help="parallel readers")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="restore an archive file")
+    p.add_argument("file", help="archive written by export")
+    p.add_argument("-w", "--workers", type=int, default=4,
+                   help="parallel writers")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("load", help="post the records of a JSON Lines or CSV file")
+    p.add_argument("collection", help="collection to post to")
+    p.add_argument("file", help="input file, - for stdin, gzip compressed if it ends with .gz")
+    p.add_argument("-f", "--format", choices=bulk.FORMATS, default=None,
+                   help="input format (default: csv for .csv files, else jsonl)")
+    p.add_argument("-k", "--key", default=None,
+                   help="field holding the key of each record (default: auto increment)")
+    p.add_argument("--auto-inc", action="store_true",
+                   help="add an auto incremented sequence to the key")
+    p.add_argument("--guid", action="store_true",
+                   help="add a GUID to the key")
+    p.add_argument("-b", "--sequence-block", type=int, default=1,
+                   help="sequence numbers reserved on disk at a time")
+    p.add_argument("-w", "--workers", type=int, default=4,
+                   help="parallel writers")
+    p.add_argument("-q", "--quiet", action="store_true", help="no progress")
+    p.set_defaults(func=cmd_load)
+
+    p = sub.add_parser("dump", help="write a collection as JSON Lines, in key order")
+    p.add_argument("collection", help="collection to dump")
+    p.add_argument("file", nargs="?", default="-",
+                   help="output file (default: stdout), gzip compressed if it ends with .gz")
+    p.add_argument("-k", "--key", default=None,
+                   help="add the key of each record as this field")
+    p.add_argument("-w", "--workers", type=int, default=4,
+                   help="parallel readers")
+    p.add_argument("-q", "--quiet", action="store_true", help="no progress")
+    p.set_defaults(func=cmd_dump)
+
+    p = sub.add_parser("serve", help="serve the storage area to clients over a socket")
+    where = p.add_mutually_exclusive_group(required=True)
+    where.add_argument("-s", "--socket", default=None,
+                       help="path of a unix domain socket to listen on")
+    where.add_argument("-p", "--port", type=int, default=None,
+                       help="TCP port to listen on, needs --token-file")
+    p.add_argument("--host", default="127.0.0.1",
+                   help="TCP address to listen on (default: %(default)s)")
+    p.add_argument("-t", "--token-file", default=None,
+                   help="file holding the token clients must send first")
+    p.add_argument("-b", "--sequence-block", type=int, default=100,
+                   help="sequence numbers reserved on disk at a time")
+    p.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "serve" and args.port is not None and not args.token_file:
+        parser.error("serving over TCP needs --token-file")
+    rs = Rocketstore(data_storage_area=args.storage)
+
+    start = time.perf_counter()
+    result = args.func(rs, args)
+    elapsed = time.perf_counter() - start
+    rs.close()
+
+    if isinstance(result, dict) and "collections" not in result and "records" in result:
+        rate = result["records"] / elapsed if elapsed else 0
+        print(f"{args.command}: {result['records']} records in {elapsed:.2f}s "
+              f"({rate:.0f} records/s)", file=sys.stderr)
+    elif isinstance(result, dict) and "records" in result:
+        rate = result["records"] / elapsed if elapsed else 0
+        print(f"{args.command}: {result['records']} records in "
+              f"{result['collections']} collections, {result['sequences']} sequences, "
+              f"{elapsed:.2f}s ({rate:.0f} records/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+server.py (c) 2026
+Created:  2026-10-19 19:52:30
+Desc: Rocket Store (Python) - serve one Rocketstore to other processes over a socket
+Docs: rocketstore serve --help
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+One process owns the storage area: caches are shared by all clients and
+sequences are handed out from memory. Each connection gets a thread that
+answers its requests in order. See utils/protocol.py for the framing.
+
+Any client may post and delete (also whole collections), so a unix domain
+socket is only open to its owner (mode 0600), and a TCP server only
+answers clients that know its token.
+"""
+
+import os
+import hmac
+import socket
+import socketserver
+
+from .utils import protocol
+
+# Calls a client may make
+METHODS = frozenset(("post", "get", "get_many", "delete", "sequence"))
+MAX_AUTH = 4096  # size of the first request of a connection to a server with a token
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self) -> None:
+        super().setup()
+        if self.server.address_family != socket.AF_UNIX:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def authenticate(self) -> bool:
+        '''
+        The first request must be auth with the token of the server
+        '''
+        try:
+            request = protocol.read_frame(self.rfile, MAX_AUTH)
+        except (ConnectionError, ValueError):
+            return False
+        if request is None:
+            return False
+
+        token = self.server.token
+        try:
+            request_id, method, args, _ = request
+            ok = method == "auth" and hmac.compare_digest(str(args[0]).encode(), token.encode())
+        except (TypeError, ValueError, IndexError):
+            request_id, ok = None, False
+        response = [request_id, True, None] if ok else [
+            request_id, False, ["PermissionError", "Wrong token"]]
+        try:
+            self.wfile.write(protocol.encode(response))
+        except OSError:
+            return False
+        return ok
+
+    def handle(self) -> None:
+        store = self.server.store
+        if self.server.token is not None and not self.authenticate():
+            return
+
+        while True:
+            try:
+                request = protocol.read_frame(self.rfile, self.server.max_request)
+            except (ConnectionError, ValueError):
+                return
+            if request is None:
+                return
+
+            request_id, method, args, kwargs = request
+            try:
+                if method not in METHODS:
+                    raise ValueError(f"Unknown method '{method}'")
+                response = [request_id, True, getattr(store, method)(*args, **kwargs)]
+            except Exception as e:
+                response = [request_id, False, [type(e).__name__, str(e)]]
+
+            try:
+                frame = protocol.encode(response)
+            except TypeError:
+                # Raw records are bytes, which the JSON protocol can't carry
+                frame = protocol.encode(
+                    [request_id, False, ["ValueError", "Result can't be sent as JSON"]])
+            try:
+                self.wfile.write(frame)
+            except OSError:
+                return
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(store, address, token=None, max_request=protocol.MAX_REQUEST):
+    '''
+    Server of store on address: a path for a unix domain socket, or (host, port)
+    Call serve_forever() on it, and shutdown() / server_close() to stop
+    @token: secret clients must send first, required for TCP
+    @max_request: bytes of the largest request read, larger ones close the connection
+    '''
+    if isinstance(address, str):
+        # Left over by a server that did not stop cleanly
+        if os.path.exists(address):
+            os.remove(address)
+        server = _UnixServer(address, _Handler, bind_and_activate=False)
+        try:
+            server.server_bind()
+            # Only its owner may connect, before anyone can
+            os.chmod(address, 0o600)
+            server.server_activate()
+        except BaseException:
+            server.server_close()
+            raise
+    else:
+        if not token:
+            raise ValueError("A TCP server needs a token, any local user could connect")
+        server = _TCPServer(tuple(address), _Handler)
+
+    server.store = store
+    server.token = token or None
+    server.max_request = max_request
+    return server
+
+
+def serve(store, address, token=None) -> None:
+    server = make_server(store, address, token)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)
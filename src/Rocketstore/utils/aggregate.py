@@ -0,0 +1,156 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+aggregate.py (c) 2026
+Created:  2026-10-19 18:57:26
+Desc: Rocket Store (Python) - running count / sum / min / max of a numeric field of a collection
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Updated from the old and new value of every record written or deleted.
+Count and sum follow removals exactly; removing the current min or max leaves
+the aggregate stale, to be recomputed in one pass over the collection.
+
+Every process writing a collection with aggregates appends one byte to
+<collection>/.rocketstore/aggregate_writes after each write. The (inode, size)
+of that file is the write generation: aggregates are current while it is the
+generation they were computed at, plus the writes of their own process.
+"""
+
+import os
+
+from .files import META_DIR
+
+OPS = ("count", "sum", "min", "max")
+WRITES_FILE = "aggregate_writes"
+MAX_WRITES = 1024 * 1024  # bytes of the writes file before it is started again
+
+
+def writes_path(collection_path) -> str:
+    return os.path.join(collection_path, META_DIR, WRITES_FILE)
+
+
+def generation(collection_path) -> list:
+    '''
+    Write generation of a collection: [inode, size] of its writes file
+    '''
+    try:
+        st = os.stat(writes_path(collection_path))
+    except FileNotFoundError:
+        return [0, 0]
+    return [st.st_ino, st.st_size]
+
+
+def note_write(collection_path) -> None:
+    '''
+    Move the write generation of a collection on by one
+    '''
+    path = writes_path(collection_path)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), mode=0o775, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+    try:
+        os.write(fd, b".")
+    finally:
+        os.close(fd)
+
+
+def restart_writes(collection_path) -> None:
+    '''
+    Replace a long writes file with an empty one. Only before reading every
+    record: writes noted in the old file are in the records read
+    '''
+    path = writes_path(collection_path)
+    try:
+        if os.stat(path).st_size < MAX_WRITES:
+            return
+    except FileNotFoundError:
+        return
+    tmp_name = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_name, "wb"):
+        pass
+    os.replace(tmp_name, path)
+
+
+def field_value(record, field):
+    '''
+    Numeric value of a (dotted) field of a record, None when missing or not a number
+    '''
+    value = record
+    for name in field.split("."):
+        if not isinstance(value, dict) or name not in value:
+            return None
+        value = value[name]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+class Aggregate:
+    def __init__(self, field: str, ops, state=None) -> None:
+        self.field = field
+        self.ops = list(ops)
+        self.reset()
+        self.stale = True
+        if state:
+            self.count = state["count"]
+            self.sum = state["sum"]
+            self.min = state["min"]
+            self.max = state["max"]
+            self.stale = state.get("stale", False)
+
+    def reset(self) -> None:
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.stale = False
+
+    def add(self, value) -> None:
+        if value is None:
+            return
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def remove(self, value) -> None:
+        if value is None:
+            return
+        self.count -= 1
+        self.sum -= value
+        if self.count <= 0:
+            self.reset()
+        elif value == self.min or value == self.max:
+            self.stale = True
+
+    def update(self, old_record, new_record) -> None:
+        '''
+        A record changed from old_record to new_record (None when absent)
+        '''
+        old = field_value(old_record, self.field) if old_record is not None else None
+        new = field_value(new_record, self.field) if new_record is not None else None
+        if old == new:
+            return
+        self.remove(old)
+        self.add(new)
+
+    def result(self) -> dict:
+        return {op: getattr(self, op) for op in self.ops}
+
+    def to_meta(self) -> dict:
+        return {
+            "ops": self.ops,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "stale": self.stale,
+        }
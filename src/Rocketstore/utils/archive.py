@@ -0,0 +1,329 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+archive.py (c) 2026
+Created:  2026-10-19 12:05:51
+Desc: Rocket Store (Python) - single file archive of a storage area (export / import)
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Archive layout, one entry per line (gzip compressed when the name ends with .gz):
+
+    {"rocketstore": 1}                      header
+    {"collection": "person"}                following records belong to person
+    "22756-Adam Smith"<TAB>{"id": 22756}    JSON encoded key, tab, stored record bytes
+    {"blob": "22756-cv", "offset": 0, "data": "JVBER..."}   bytes of a blob record
+    {"sequence": "person", "value": 7}      sequence counter
+
+Record bytes are copied verbatim, nothing is decoded on export or import.
+The bytes of a blob record follow it, base64 encoded in lines of BLOB_CHUNK
+bytes so a blob of any size streams through.
+"""
+
+import os
+import gzip
+import json
+import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .files import META_DIR
+from .blob import BLOB_FIELD, blob_dir, blob_path, is_blob
+from . import decode
+
+ARCHIVE_VERSION = 2
+READ_VERSIONS = (1, 2)
+CHUNK_SIZE = 256
+BLOB_CHUNK = 3 * 256 * 1024  # a multiple of 3, lines of whole base64 quanta
+
+
+def open_archive(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "b", compresslevel=6)
+    return open(path, mode + "b")
+
+
+def ordered_map(fn, items, workers, executor=None):
+    '''
+    Parallel map yielding results in input order, with a bounded number of
+    chunks in flight so memory stays flat on huge collections.
+    Runs on its own threads unless an executor (e.g. a process pool) is given
+    '''
+    if executor is None and workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from ordered_map(fn, items, workers, executor)
+        return
+
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= workers * 2:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def list_collections(storage_area):
+    '''
+    Collection directories and sequence names of a storage area
+    '''
+    collections = []
+    sequences = []
+    try:
+        entries = list(os.scandir(storage_area))
+    except FileNotFoundError:
+        return [], []
+
+    for entry in entries:
+        if entry.name in (META_DIR, "lockfile"):
+            continue
+        if entry.is_dir():
+            collections.append(entry.name)
+        elif entry.name.endswith("_seq"):
+            sequences.append(entry.name[:-4])
+
+    return sorted(collections), sorted(sequences)
+
+
+def read_sequence(storage_area, name):
+    try:
+        with open(os.path.join(storage_area, f"{name}_seq"), "r") as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def compact(data: bytes) -> bytes:
+    '''
+    Records must fit on one archive line
+    '''
+    if b"\n" in data or b"\r" in data:
+        return json.dumps(json.loads(data)).encode()
+    return data
+
+
+def blob_record(data: bytes) -> bool:
+    '''
+    Stored bytes of a blob record, without decoding the others
+    '''
+    if BLOB_FIELD.encode() not in data:
+        return False
+    try:
+        return is_blob(json.loads(data))
+    except ValueError:
+        return False
+
+
+def read_block(args):
+    '''
+    Archive lines of (collection_path, keys), in a worker process,
+    with the keys of the blob records among them
+    '''
+    collection_path, keys = args
+    lines = []
+    blobs = []
+    for key in keys:
+        try:
+            with open(os.path.join(collection_path, key), "rb") as file:
+                data = file.read()
+        except (FileNotFoundError, IsADirectoryError):
+            continue
+        lines.append(json.dumps(key).encode() + b"\t" + compact(data) + b"\n")
+        if blob_record(data):
+            blobs.append(key)
+    return b"".join(lines), len(lines), blobs
+
+
+def write_blob(out, collection_path, key) -> int:
+    '''
+    Archive lines of the bytes of a blob, read a chunk at a time
+    returns the number of bytes written to out
+    '''
+    try:
+        file = open(blob_path(collection_path, key), "rb")
+    except FileNotFoundError:
+        return 0
+
+    written = 0
+    offset = 0
+    with file:
+        while True:
+            chunk = file.read(BLOB_CHUNK)
+            line = json.dumps({
+                "blob": key, "offset": offset, "data": base64.b64encode(chunk).decode(),
+            }).encode() + b"\n"
+            out.write(line)
+            written += len(line)
+            offset += len(chunk)
+            if len(chunk) < BLOB_CHUNK:
+                return written
+
+
+def read_blob(collection_path, entry) -> int:
+    '''
+    Write a chunk of blob bytes from an archive line, returns its size
+    '''
+    data = base64.b64decode(entry["data"])
+    os.makedirs(blob_dir(collection_path), mode=0o775, exist_ok=True)
+    with open(blob_path(collection_path, entry["blob"]), "r+b" if entry["offset"] else "wb") as file:
+        file.seek(entry["offset"])
+        file.write(data)
+    return len(data)
+
+
+def write_archive(rs, path, collections=None, workers=4) -> dict:
+    storage_area = os.path.abspath(rs.data_storage_area)
+    all_collections, all_sequences = list_collections(storage_area)
+
+    if collections is None:
+        collections = all_collections
+        sequences = all_sequences
+    else:
+        collections = sorted(collections)
+        sequences = [s for s in all_sequences if s in collections]
+
+    stats = {"collections": 0, "records": 0, "blobs": 0, "sequences": 0, "bytes": 0}
+
+    with open_archive(path, "w") as out:
+        out.write(json.dumps({"rocketstore": ARCHIVE_VERSION}).encode() + b"\n")
+
+        for collection in collections:
+            handle = rs.collection(collection)
+            keys = sorted(rs.get(handle, "*", rs._KEYS).get("key", []))
+
+            def read_chunk(chunk_keys):
+                lines = []
+                blobs = []
+                for key in chunk_keys:
+                    try:
+                        data = rs._read_file(handle, key)
+                    except (FileNotFoundError, IsADirectoryError):
+                        continue
+                    lines.append(json.dumps(key).encode() +
+                                 b"\t" + compact(data) + b"\n")
+                    if blob_record(data):
+                        blobs.append(key)
+                return b"".join(lines), len(lines), blobs
+
+            # Records that need re-encoding cost CPU: spread them over processes
+            if rs._decode_in_workers(len(keys)):
+                blocks = ordered_map(
+                    read_block,
+                    [(handle.path, c) for c in chunks(
+                        keys, decode.chunk_size(len(keys), rs.decode_workers))],
+                    rs.decode_workers,
+                    rs._decode_executor(),
+                )
+            else:
+                blocks = ordered_map(read_chunk, list(chunks(keys)), workers)
+
+            out.write(json.dumps({"collection": collection}).encode() + b"\n")
+            for block, n, blobs in blocks:
+                out.write(block)
+                stats["records"] += n
+                stats["bytes"] += len(block)
+                for key in blobs:
+                    stats["bytes"] += write_blob(out, handle.path, key)
+                    stats["blobs"] += 1
+            stats["collections"] += 1
+
+        for name in sequences:
+            value = read_sequence(storage_area, name)
+            if value is not None:
+                out.write(json.dumps(
+                    {"sequence": name, "value": value}).encode() + b"\n")
+                stats["sequences"] += 1
+
+    return stats
+
+
+def read_archive(rs, path, workers=4) -> dict:
+    stats = {"collections": 0, "records": 0, "blobs": 0, "sequences": 0, "bytes": 0}
+    handle = None
+    batch = []
+    touched = set()
+
+    def write_chunk(args):
+        h, items = args
+        blobs = h.has_blobs()
+        for key, data in items:
+            rs._write_file(h, key, data)
+            # The bytes of a blob replaced by a plain record
+            if blobs and not blob_record(data):
+                try:
+                    os.remove(blob_path(h.path, key))
+                except FileNotFoundError:
+                    pass
+        rs._log_changes([("post", h.name, key) for key, _ in items])
+        return len(items)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()
+
+        def flush_batch():
+            nonlocal batch
+            if batch:
+                pending.append(executor.submit(write_chunk, (handle, batch)))
+                batch = []
+            while len(pending) > workers * 2:
+                stats["records"] += pending.popleft().result()
+
+        with open_archive(path, "r") as src:
+            header = json.loads(src.readline() or b"{}")
+            if header.get("rocketstore") not in READ_VERSIONS:
+                raise ValueError(f"Not a rocketstore archive: '{path}'")
+
+            for line in src:
+                line = line.rstrip(b"\r\n")
+                if not line:
+                    continue
+
+                if line[:1] == b'"':
+                    if handle is None:
+                        raise ValueError("Archive record outside a collection")
+                    key, data = line.split(b"\t", 1)
+                    batch.append((json.loads(key), data))
+                    stats["bytes"] += len(data)
+                    if len(batch) >= CHUNK_SIZE:
+                        flush_batch()
+                    continue
+
+                entry = json.loads(line)
+                if "collection" in entry:
+                    flush_batch()
+                    handle = rs.collection(entry["collection"])
+                    touched.add(handle.name)
+                    stats["collections"] += 1
+                elif "blob" in entry:
+                    if handle is None:
+                        raise ValueError("Archive blob outside a collection")
+                    stats["bytes"] += read_blob(handle.path, entry)
+                    handle.blobs = True
+                    if entry["offset"] == 0:
+                        stats["blobs"] += 1
+                elif "sequence" in entry:
+                    rs._restore_sequence(entry["sequence"], int(entry["value"]))
+                    stats["sequences"] += 1
+
+        flush_batch()
+        while pending:
+            stats["records"] += pending.popleft().result()
+
+    # Keys changed wholesale, let the caches be rebuilt on demand
+    for collection in touched:
+        rs._cache_drop(collection)
+
+    return stats
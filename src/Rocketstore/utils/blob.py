@@ -0,0 +1,104 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+blob.py (c) 2026
+Created:  2026-10-19 21:52:08
+Desc: Rocket Store (Python) - raw byte records streamed in chunks
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+A blob is a small JSON record like any other, {"_blob": {"size": 1234, ...}},
+whose bytes are kept in <collection>/.rocketstore/blobs/<key>. The record
+lists, counts and deletes with the collection; the bytes are never decoded.
+Copies run in the kernel (copy_file_range / sendfile) when both ends are
+files, else through a buffer of fixed size.
+"""
+
+import os
+import io
+import stat
+import errno
+
+from .files import META_DIR
+
+BLOB_DIR = "blobs"
+BLOB_FIELD = "_blob"
+CHUNK_SIZE = 1024 * 1024
+
+# The kernel can't copy between these: fall back to a buffer
+_NO_FAST_COPY = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                 errno.EBADF, errno.ENOTSUP)
+
+
+def blob_dir(collection_path) -> str:
+    return os.path.join(collection_path, META_DIR, BLOB_DIR)
+
+
+def blob_path(collection_path, key) -> str:
+    return os.path.join(collection_path, META_DIR, BLOB_DIR, key)
+
+
+def is_blob(record) -> bool:
+    return isinstance(record, dict) and isinstance(record.get(BLOB_FIELD), dict)
+
+
+def _fileno(fileobj):
+    try:
+        return fileobj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def _fast_copy(in_fd, out_fd, offset, chunk_size) -> int:
+    '''
+    Copy from in_fd at offset to the position of out_fd until the end, in the kernel
+    '''
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while True:
+                n = os.copy_file_range(in_fd, out_fd, chunk_size, offset + copied)
+                if n == 0:
+                    return copied
+                copied += n
+        except OSError as e:
+            if e.errno not in _NO_FAST_COPY or copied:
+                raise
+
+    while True:
+        n = os.sendfile(out_fd, in_fd, offset + copied, chunk_size)
+        if n == 0:
+            return copied
+        copied += n
+
+
+def copy_stream(source, target, chunk_size=CHUNK_SIZE) -> int:
+    '''
+    Copy the rest of file object source into target, returns bytes copied.
+    target must be unbuffered (or flushed) when it is a file
+    '''
+    in_fd, out_fd = _fileno(source), _fileno(target)
+    if (
+        in_fd is not None and out_fd is not None and hasattr(os, "sendfile")
+        and stat.S_ISREG(os.fstat(in_fd).st_mode)
+    ):
+        offset = source.tell()
+        try:
+            copied = _fast_copy(in_fd, out_fd, offset, chunk_size)
+        except OSError as e:
+            if e.errno not in _NO_FAST_COPY:
+                raise
+        else:
+            source.seek(offset + copied)
+            return copied
+
+    copied = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return copied
+        target.write(chunk)
+        copied += len(chunk)
@@ -0,0 +1,116 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+bloom.py (c) 2026
+Created:  2026-10-19 22:20:45
+Desc: Rocket Store (Python) - Bloom filter of the keys of a collection
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Answers "certainly not there" without listing the collection. Kept in
+<collection>/.rocketstore/bloom: one JSON header line, then the bit array.
+Like the counter snapshot it holds the mtime of the collection directory
+taken when its keys were listed, and is ignored once the directory has
+changed since.
+"""
+
+import os
+import json
+import math
+import hashlib
+import threading
+
+from .files import META_DIR
+
+FILE_NAME = "bloom"
+MIN_CAPACITY = 1024
+
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate, bits=None, k=None, count=0, mtime=None) -> None:
+        self.capacity = max(int(capacity), MIN_CAPACITY)
+        self.fp_rate = fp_rate
+        if bits is None:
+            m = math.ceil(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2))
+            bits = bytearray((m + 7) // 8)
+            k = max(1, round(m / self.capacity * math.log(2)))
+        self.bits = bits
+        self.m = len(bits) * 8
+        self.k = k
+        self.count = count
+        self.mtime = mtime  # of the directory when the keys were listed
+
+    @classmethod
+    def of(cls, keys, fp_rate, mtime=None) -> "BloomFilter":
+        '''
+        Filter of keys with room for as many again
+        @mtime: of the collection directory, taken before listing keys
+        '''
+        bloom = cls(len(keys) * 2, fp_rate, mtime=mtime)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(
+            key.encode("utf-8", "surrogateescape"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, key) -> None:
+        bits = self.bits
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    @property
+    def full(self) -> bool:
+        '''
+        Holding more keys than it was sized for, false positives grow
+        '''
+        return self.count > self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+    def save(self, collection_path) -> None:
+        '''
+        Save with the mtime of the listing it holds all keys of
+        '''
+        meta_dir = os.path.join(collection_path, META_DIR)
+        header = json.dumps({
+            "capacity": self.capacity, "fp_rate": self.fp_rate, "k": self.k,
+            "count": self.count, "mtime": self.mtime,
+        })
+        tmp_name = os.path.join(
+            meta_dir, f".{FILE_NAME}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_name, "wb") as file:
+            file.write(header.encode() + b"\n")
+            file.write(self.bits)
+        os.replace(tmp_name, os.path.join(meta_dir, FILE_NAME))
+
+    @classmethod
+    def load(cls, collection_path, mtime):
+        '''
+        Saved filter, None when there is none or the directory changed since (mtime)
+        '''
+        try:
+            with open(os.path.join(collection_path, META_DIR, FILE_NAME), "rb") as file:
+                header = json.loads(file.readline())
+                if header.get("mtime") != mtime:
+                    return None
+                bits = bytearray(file.read())
+        except (OSError, ValueError):
+            return None
+
+        return cls(
+            header["capacity"], header["fp_rate"], bits, header["k"], header["count"], mtime)
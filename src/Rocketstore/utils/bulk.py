@@ -0,0 +1,154 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+bulk.py (c) 2026
+Created:  2026-10-19 21:14:37
+Desc: Rocket Store (Python) - bulk load of JSON Lines / CSV rows and dump of a collection
+Docs: rocketstore load --help
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import io
+import sys
+import csv
+import json
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .archive import open_archive, ordered_map, chunks, compact, blob_record
+
+CHUNK_SIZE = 500
+FORMATS = ("jsonl", "csv")
+
+
+def detect_format(path) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "jsonl"
+
+
+def _open_text(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    return io.TextIOWrapper(open_archive(path, "r"), encoding="utf-8", newline="")
+
+
+def read_rows(path, format=None):
+    '''
+    Records of a JSON Lines or CSV file ("-" for stdin, gzip when it ends with .gz)
+    CSV values are strings, the header line names the fields
+    '''
+    format = format or detect_format(path)
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}', use one of {', '.join(FORMATS)}")
+
+    with _open_text(path) as file:
+        if format == "csv":
+            yield from csv.DictReader(file)
+            return
+
+        for n, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {n} of {path} is not valid JSON") from None
+
+
+def record_key(record, field):
+    '''
+    Key taken from a (dotted) field of a record
+    '''
+    value = record
+    for name in field.split("."):
+        if not isinstance(value, dict) or name not in value:
+            raise ValueError(f"Record has no field '{field}': {json.dumps(record)[:80]}")
+        value = value[name]
+    return str(value)
+
+
+def load(rs, collection, rows, workers=4, key=None, flags=0, progress=None) -> dict:
+    '''
+    Post rows to collection with parallel writers
+    @key: field holding the key of each record, else the keys come from flags alone
+    @flags: _ADD_AUTO_INC and / or _ADD_GUID, added to the key as with post
+    @progress: called with the number of records written so far, after every chunk
+    @return: {'records': 100000}
+    '''
+    handle = rs.collection(collection)
+
+    def write_chunk(chunk):
+        for record in chunk:
+            rs.post(handle, record_key(record, key) if key else None, record, flags)
+        return len(chunk)
+
+    records = 0
+    rows = iter(rows)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = set()
+        while True:
+            # A bounded number of chunks in flight keeps memory flat
+            while len(pending) < workers * 2:
+                chunk = list(islice(rows, CHUNK_SIZE))
+                if not chunk:
+                    break
+                pending.add(executor.submit(write_chunk, chunk))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                records += future.result()
+            if progress is not None:
+                progress(records)
+
+    return {"records": records}
+
+
+def dump(rs, collection, path, workers=4, key=None, progress=None) -> dict:
+    '''
+    Write the records of a collection in key order as JSON Lines ("-" for stdout)
+    Stored bytes are copied as they are, unless key names a field to add the key to.
+    Blob records are refused (ValueError): their bytes don't fit a JSON line, export them
+    @return: {'records': 100000, 'bytes': 5123456}
+    '''
+    handle = rs.collection(collection)
+    keys = sorted(rs.get(handle, "*", rs._KEYS).get("key", []))
+
+    def read_chunk(chunk_keys):
+        lines = []
+        for k in chunk_keys:
+            try:
+                data = rs._read_file(handle, k)
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+            if blob_record(data):
+                raise ValueError(
+                    f"Record '{handle.name}/{k}' is a blob, dump can't hold its bytes: use export")
+            if key:
+                record = json.loads(data)
+                if isinstance(record, dict):
+                    record = {key: k, **record}
+                data = json.dumps(record).encode()
+            lines.append(compact(data) + b"\n")
+        return b"".join(lines), len(lines)
+
+    stats = {"records": 0, "bytes": 0}
+    out = sys.stdout.buffer if path == "-" else open_archive(path, "w")
+    try:
+        for block, n in ordered_map(read_chunk, list(chunks(keys, CHUNK_SIZE)), workers):
+            out.write(block)
+            stats["records"] += n
+            stats["bytes"] += len(block)
+            if progress is not None:
+                progress(stats["records"])
+    finally:
+        if path == "-":
+            out.flush()
+        else:
+            out.close()
+
+    return stats
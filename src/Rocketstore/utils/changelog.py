@@ -0,0 +1,210 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+changelog.py (c) 2026
+Created:  2026-10-19 18:14:03
+Desc: Rocket Store (Python) - append only log of the changes made to a storage area
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Kept in <storage>/.rocketstore/changelog/ as segment files named after the
+offset of their first entry. One JSON array per line:
+
+    [offset, time, op, collection, key]
+
+op is "post", "delete" or "drop" (a whole collection, or the whole storage
+area when collection is null). Offsets grow by one per entry, across
+processes: appends hold an flock on the log directory. Records themselves are
+not logged, consumers read the current version by key.
+Old segments are removed whole, by size and / or age of the log.
+"""
+
+import os
+import json
+import time
+
+from .files import META_DIR, locked
+
+SEGMENT_BYTES = 8 * 1024 * 1024
+SUFFIX = ".log"
+
+
+class Changelog:
+    def __init__(
+        self, storage, segment_bytes=SEGMENT_BYTES, retention_bytes=None,
+        retention_seconds=None
+    ) -> None:
+        self.path = os.path.join(storage, META_DIR, "changelog")
+        self.segment_bytes = segment_bytes
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        # Tail of the active segment as last seen: (name, size, next offset)
+        self._tail = None
+
+    def segments(self) -> list:
+        '''
+        Base offsets of the segments, oldest first
+        '''
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(int(n[:-len(SUFFIX)]) for n in names if n.endswith(SUFFIX))
+
+    def _segment(self, base) -> str:
+        return os.path.join(self.path, f"{base:020d}{SUFFIX}")
+
+    def first_offset(self):
+        segments = self.segments()
+        return segments[0] if segments else None
+
+    def next_offset(self) -> int:
+        '''
+        Offset the next entry will get
+        '''
+        with self._locked():
+            return self._next_offset(self.segments())
+
+    def _locked(self):
+        os.makedirs(self.path, mode=0o775, exist_ok=True)
+        return locked(os.path.join(self.path, "lock"))
+
+    def _next_offset(self, segments) -> int:
+        # must hold the lock
+        if not segments:
+            return self._tail[2] if self._tail else 1
+
+        base = segments[-1]
+        name = self._segment(base)
+        size = os.path.getsize(name)
+        if self._tail and self._tail[0] == name and self._tail[1] == size:
+            return self._tail[2]
+
+        # Someone else appended: find the last complete entry
+        with open(name, "r+b") as file:
+            chunk = 64 * 1024
+            while True:
+                start = max(0, size - chunk)
+                file.seek(start)
+                tail = file.read()
+                end = tail.rfind(b"\n")
+                begin = tail.rfind(b"\n", 0, max(end, 0)) + 1
+                if start == 0 or begin > 0:
+                    break
+                chunk *= 2  # the last entry started before this chunk
+
+            if end < 0:
+                file.truncate(0)  # a torn first entry
+                next_offset = base
+            else:
+                if start + end + 1 < size:
+                    file.truncate(start + end + 1)  # torn tail of a crashed writer
+                next_offset = json.loads(tail[begin:end])[0] + 1
+
+        self._tail = (name, os.path.getsize(name), next_offset)
+        return next_offset
+
+    def restart(self, offset) -> None:
+        '''
+        Start an empty log at offset, so offsets keep growing after the
+        storage area (and the log with it) was deleted
+        '''
+        with self._locked():
+            if not self.segments():
+                open(self._segment(offset), "ab").close()
+                self._tail = (self._segment(offset), 0, offset)
+
+    def append(self, entries) -> int:
+        '''
+        entries: list of (op, collection, key). Returns the offset of the last one
+        '''
+        now = round(time.time(), 3)
+        with self._locked():
+            segments = self.segments()
+            offset = self._next_offset(segments)
+
+            if not segments or os.path.getsize(self._segment(segments[-1])) >= self.segment_bytes:
+                segments.append(offset)
+                self._retain(segments)
+
+            lines = []
+            for op, collection, key in entries:
+                lines.append(json.dumps([offset, now, op, collection, key]))
+                offset += 1
+
+            name = self._segment(segments[-1])
+            with open(name, "ab") as file:
+                file.write(("\n".join(lines) + "\n").encode())
+                size = file.tell()
+
+            self._tail = (name, size, offset)
+            return offset - 1
+
+    def _retain(self, segments) -> None:
+        '''
+        Remove the oldest segments beyond the retention limits, never the last one
+        '''
+        if self.retention_bytes is None and self.retention_seconds is None:
+            return
+
+        stats = []
+        for base in segments[:-1]:
+            try:
+                stats.append((base, os.stat(self._segment(base))))
+            except FileNotFoundError:
+                pass
+
+        total = sum(st.st_size for _, st in stats)
+        oldest = time.time() - self.retention_seconds if self.retention_seconds else None
+
+        for base, st in stats:
+            if not (
+                self.retention_bytes is not None and total > self.retention_bytes
+                or oldest is not None and st.st_mtime < oldest
+            ):
+                break
+            os.remove(self._segment(base))
+            segments.remove(base)
+            total -= st.st_size
+
+    def read(self, since=None):
+        '''
+        Entries after offset since (all retained entries if None), oldest first
+        yield: {'offset': 7, 'time': 1760890443.12, 'op': 'post', 'collection': 'person', 'key': '1-Adam'}
+        raises ValueError when entries after since were already removed by retention
+        '''
+        segments = self.segments()
+        if not segments:
+            return
+
+        if since is None:
+            since = segments[0] - 1
+        elif since < segments[0] - 1:
+            raise ValueError(
+                f"Changelog entries after offset {since} were removed, resync and restart from {segments[0] - 1}")
+
+        # Segment holding since + 1 and the ones after it
+        start = 0
+        for i, base in enumerate(segments):
+            if base <= since + 1:
+                start = i
+
+        for base in segments[start:]:
+            try:
+                file = open(self._segment(base), "rb")
+            except FileNotFoundError:
+                raise ValueError(
+                    f"Changelog entries after offset {since} were removed while reading") from None
+
+            with file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        return  # being written
+                    offset, at, op, collection, key = json.loads(line)
+                    if offset > since:
+                        since = offset
+                        yield {"offset": offset, "time": at, "op": op,
+                               "collection": collection, "key": key}
@@ -0,0 +1,357 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+columns.py (c) 2026
+Created:  2026-10-19 23:02:17
+Desc: Rocket Store (Python) - columnar snapshot of some fields of a collection
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+One typed array per field instead of a dict per record:
+
+    int     array('q')                  every value an integer
+    float   array('d'), NaN if missing  numbers, or integers with gaps
+    bool    array('b'), -1 if missing
+    str     array('i') of codes into a dictionary of the distinct strings, -1 if missing
+    object  list                        anything else, None if missing
+
+Snapshots are kept in <collection>/.rocketstore/columns/<id>: one JSON header
+line (keys, record versions, column layout) then the bytes of the arrays.
+The versions tell which records changed since, so a refresh only reads those.
+NumPy is optional: with it, masks are boolean arrays and columns are viewed
+without copying.
+"""
+
+import os
+import sys
+import json
+import math
+import hashlib
+import operator
+import threading
+from array import array
+from itertools import compress
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .files import META_DIR
+
+COLUMNS_DIR = "columns"
+TYPECODES = {"int": "q", "float": "d", "bool": "b", "str": "i"}
+OPERATORS = {
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+INT64 = (-(2 ** 63), 2 ** 63 - 1)
+
+
+def field_of(record, field):
+    '''
+    Value of a (dotted) field of a record, None when missing
+    '''
+    value = record
+    for name in field.split("."):
+        if not isinstance(value, dict) or name not in value:
+            return None
+        value = value[name]
+    return value
+
+
+def snapshot_path(collection_path, fields) -> str:
+    '''
+    File of the snapshot of these fields, the same whatever their order
+    '''
+    name = hashlib.blake2b(
+        json.dumps(sorted(fields)).encode(), digest_size=8).hexdigest()
+    return os.path.join(collection_path, META_DIR, COLUMNS_DIR, name)
+
+
+def _kind(values) -> str:
+    kinds = set()
+    missing = False
+    for v in values:
+        if v is None:
+            missing = True
+        elif isinstance(v, bool):
+            kinds.add("bool")
+        elif isinstance(v, int):
+            kinds.add("int" if INT64[0] <= v <= INT64[1] else "object")
+        elif isinstance(v, float):
+            kinds.add("float")
+        elif isinstance(v, str):
+            kinds.add("str")
+        else:
+            kinds.add("object")
+
+    if len(kinds) == 1:
+        kind = kinds.pop()
+        return "float" if kind == "int" and missing else kind
+    if kinds == {"int", "float"}:
+        return "float"
+    return "object"
+
+
+class Column:
+    '''
+    Values of one field, aligned with the keys of the snapshot
+    @kind: int, float, bool, str or object
+    @data: array of the values (codes for str), list for object
+    @dictionary: the distinct strings of a str column, codes index it
+    '''
+
+    def __init__(self, kind, data, dictionary=None) -> None:
+        self.kind = kind
+        self.data = data
+        self.dictionary = dictionary
+
+    @classmethod
+    def of(cls, values) -> "Column":
+        values = list(values)
+        kind = _kind(values)
+        if kind == "int":
+            return cls(kind, array("q", values))
+        if kind == "float":
+            return cls(kind, array("d", (math.nan if v is None else v for v in values)))
+        if kind == "bool":
+            return cls(kind, array("b", (-1 if v is None else v for v in values)))
+        if kind == "str":
+            codes = {}
+            data = array("i", (
+                -1 if v is None else codes.setdefault(v, len(codes)) for v in values))
+            return cls(kind, data, list(codes))
+        return cls(kind, values)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def values(self) -> list:
+        '''
+        Python values, None where missing
+        '''
+        if self.kind == "int" or self.kind == "object":
+            return list(self.data)
+        if self.kind == "float":
+            return [None if v != v else v for v in self.data]
+        if self.kind == "bool":
+            return [None if v < 0 else bool(v) for v in self.data]
+        dictionary = self.dictionary
+        return [None if c < 0 else dictionary[c] for c in self.data]
+
+    def numpy(self):
+        '''
+        The data as a NumPy array, without copying (codes for str columns)
+        '''
+        if numpy is None:
+            raise ImportError("NumPy is not installed")
+        if self.kind == "object":
+            return numpy.array(self.data, dtype=object)
+        return numpy.frombuffer(self.data, dtype=self.data.typecode)
+
+    def code(self, value) -> int:
+        '''
+        Code of a string in a str column, -1 when it never occurs
+        '''
+        try:
+            return self.dictionary.index(value)
+        except ValueError:
+            return -1
+
+    def present(self):
+        '''
+        Mask of the rows that have a value
+        '''
+        if numpy is not None and self.kind != "object":
+            data = self.numpy()
+            if self.kind == "float":
+                return ~numpy.isnan(data)
+            if self.kind == "int":
+                return numpy.ones(len(data), dtype=bool)
+            return data >= 0
+        if self.kind == "float":
+            return bytearray(v == v for v in self.data)
+        if self.kind in ("bool", "str"):
+            return bytearray(v >= 0 for v in self.data)
+        if self.kind == "object":
+            return bytearray(v is not None for v in self.data)
+        return bytearray(b"\x01") * len(self.data)
+
+
+class Columns:
+    '''
+    Columnar snapshot of some fields of a collection, made by Rocketstore.to_columns
+    @keys: keys of the records, in key order
+    @Sample:
+        snap = rs.to_columns("orders", ["price", "country"])
+        cheap = snap.mask("price", "<", 10, within=snap.mask("country", "==", "DK"))
+        snap.select(cheap)
+        snap.aggregate("price", cheap)  # {'count': .., 'sum': .., 'min': .., 'max': ..}
+    '''
+
+    def __init__(self, fields, keys, versions, columns) -> None:
+        self.fields = list(fields)
+        self.keys = keys
+        self.versions = versions
+        self.columns = columns
+
+    @classmethod
+    def build(cls, fields, keys, versions, rows) -> "Columns":
+        '''
+        Snapshot of rows, one tuple of field values per key
+        '''
+        by_field = list(zip(*rows)) if rows else [()] * len(fields)
+        return cls(fields, keys, versions, {
+            field: Column.of(values) for field, values in zip(fields, by_field)})
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __getitem__(self, field) -> Column:
+        return self.columns[field]
+
+    def rows(self) -> list:
+        '''
+        Tuple of the field values of each record, None where missing
+        '''
+        return list(zip(*(self.columns[f].values() for f in self.fields)))
+
+    def mask(self, field, op, value, within=None):
+        '''
+        Rows where field <op> value holds, op one of == != < <= > >=
+        Missing values never match. A NumPy boolean array when NumPy is
+        installed, else a bytearray of 0 / 1
+        @within: only rows also in this mask
+        '''
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator '{op}', use one of {' '.join(OPERATORS)}")
+        compare = OPERATORS[op]
+        column = self.columns[field]
+
+        if column.kind == "str":
+            # Compare the dictionary once, then the codes
+            if op in ("==", "!="):
+                wanted = {column.code(value)} - {-1}
+            else:
+                wanted = {c for c, s in enumerate(column.dictionary) if compare(s, value)}
+            if op == "!=":
+                wanted = set(range(len(column.dictionary))) - wanted
+            if numpy is not None:
+                result = numpy.isin(column.numpy(), list(wanted))
+            else:
+                result = bytearray(c in wanted for c in column.data)
+
+        elif numpy is not None and column.kind != "object":
+            result = compare(column.numpy(), value)
+            if column.kind == "bool":  # missing (-1) would compare as a number
+                result &= column.present()
+
+        else:
+            data = column.data
+            result = bytearray(len(data))
+            for i in compress(range(len(data)), column.present()):
+                try:
+                    result[i] = compare(data[i], value)
+                except TypeError:  # values of another type than value
+                    pass
+
+        if within is not None:
+            if numpy is not None:
+                result = result & numpy.asarray(within, dtype=bool)
+            else:
+                result = bytearray(a and b for a, b in zip(result, within))
+        return result
+
+    def select(self, mask) -> list:
+        '''
+        Keys of the rows in mask
+        '''
+        return list(compress(self.keys, mask))
+
+    def aggregate(self, field, mask=None) -> dict:
+        '''
+        count, sum, min and max of the values of a numeric field, of the
+        rows in mask if given. Missing values are left out
+        '''
+        column = self.columns[field]
+        if column.kind not in ("int", "float"):
+            raise ValueError(f"Field '{field}' is not numeric")
+
+        if numpy is not None:
+            data = column.numpy()
+            if mask is not None:
+                data = data[numpy.asarray(mask, dtype=bool)]
+            if column.kind == "float":
+                data = data[~numpy.isnan(data)]
+            if not len(data):
+                return {"count": 0, "sum": 0, "min": None, "max": None}
+            return {"count": int(len(data)), "sum": data.sum().item(),
+                    "min": data.min().item(), "max": data.max().item()}
+
+        values = column.data
+        if mask is not None:
+            values = array(values.typecode, compress(values, mask))
+        if column.kind == "float":
+            values = [v for v in values if v == v]
+        if not len(values):
+            return {"count": 0, "sum": 0, "min": None, "max": None}
+        return {"count": len(values), "sum": sum(values),
+                "min": min(values), "max": max(values)}
+
+    def save(self, path) -> None:
+        blocks = []
+        layout = []
+        for field in self.fields:
+            column = self.columns[field]
+            entry = {"field": field, "kind": column.kind}
+            if column.kind == "object":
+                entry["values"] = column.data
+            else:
+                block = column.data.tobytes()
+                entry["size"] = len(block)
+                blocks.append(block)
+                if column.kind == "str":
+                    entry["dictionary"] = column.dictionary
+            layout.append(entry)
+
+        header = json.dumps({
+            "fields": self.fields, "byteorder": sys.byteorder,
+            "keys": self.keys, "versions": self.versions, "columns": layout,
+        })
+        os.makedirs(os.path.dirname(path), mode=0o775, exist_ok=True)
+        tmp_name = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_name, "wb") as file:
+            file.write(header.encode() + b"\n")
+            for block in blocks:
+                file.write(block)
+        os.replace(tmp_name, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Saved snapshot, None when there is none or it can't be read here
+        '''
+        try:
+            with open(path, "rb") as file:
+                header = json.loads(file.readline())
+                if header["byteorder"] != sys.byteorder:
+                    return None
+                columns = {}
+                for entry in header["columns"]:
+                    kind = entry["kind"]
+                    if kind == "object":
+                        columns[entry["field"]] = Column(kind, entry["values"])
+                        continue
+                    data = array(TYPECODES[kind])
+                    data.frombytes(file.read(entry["size"]))
+                    columns[entry["field"]] = Column(kind, data, entry.get("dictionary"))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        if any(len(c) != len(header["keys"]) for c in columns.values()):
+            return None
+        return cls(header["fields"], header["keys"], header["versions"], columns)
@@ -0,0 +1,92 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+decode.py (c) 2026
+Created:  2026-10-19 16:52:09
+Desc: Rocket Store (Python) - record decoding, in worker processes for large reads
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+JSON decoding is CPU bound and holds the GIL, so large reads are split into
+chunks of keys read and decoded by a process pool. Workers only get the
+collection path and the keys, and send back the decoded batch.
+"""
+
+import os
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many records the round trip to the workers costs more than it saves
+MIN_KEYS = 1024
+MIN_CHUNK = 64
+MAX_CHUNK = 4096
+CHUNKS_PER_WORKER = 4
+
+
+def project(record, fields):
+    '''
+    Keep only the named top level fields of a record (records that are not
+    objects are returned as they are)
+    '''
+    if fields is None or not isinstance(record, dict):
+        return record
+    return {f: record[f] for f in fields if f in record}
+
+
+def raw_array(records) -> bytes:
+    '''
+    Stored bytes of records joined in one JSON array, without decoding them.
+    Entries that are not bytes (records gone meanwhile) are left out
+    '''
+    return b"[" + b",".join(r for r in records if isinstance(r, bytes)) + b"]"
+
+
+def chunk_size(count, workers) -> int:
+    '''
+    Enough chunks to keep every worker busy to the end, big enough to amortize
+    the round trip
+    '''
+    size = -(-count // (workers * CHUNKS_PER_WORKER))
+    return max(MIN_CHUNK, min(MAX_CHUNK, size))
+
+
+def decode_chunk(args):
+    '''
+    Read and decode (collection_path, keys, fields) in a worker
+    returns (records, missing positions, bytes read)
+    '''
+    collection_path, keys, fields = args
+    records = []
+    missing = []
+    bytes_read = 0
+
+    for i, key in enumerate(keys):
+        try:
+            with open(os.path.join(collection_path, key), "rb") as file:
+                data = file.read()
+        except (FileNotFoundError, IsADirectoryError):
+            missing.append(i)
+            records.append(None)
+            continue
+
+        bytes_read += len(data)
+        try:
+            records.append(project(json.loads(data), fields))
+        except json.JSONDecodeError:
+            records.append("*format*")
+
+    return records, missing, bytes_read
+
+
+def process_pool(workers) -> ProcessPoolExecutor:
+    '''
+    The store runs threads of its own (reaper, I/O pool), so workers are not forked
+    '''
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
@@ -0,0 +1,140 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+dedup.py (c) 2026
+Created:  2026-10-19 23:41:52
+Desc: Rocket Store (Python) - records with the same payload stored once, by content hash
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+A payload is stored once as <collection>/.rocketstore/objects/<hash>, and the
+record file of every key holding it is a hard link to that file. Readers open
+record files as always; the link count of the file is the reference count,
+kept by the file system. When the last key of a payload is deleted or
+rewritten, the payload is removed too.
+Payload files are never written in place, so their bytes can be cached by
+version (inode, mtime, size) and shared by all the keys linking them.
+"""
+
+import os
+import errno
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .files import META_DIR
+
+OBJECTS_DIR = "objects"
+MIN_SIZE = 1024
+CACHE_BYTES = 32 * 1024 * 1024
+
+# Hard links not possible here (or too many of them): store a copy instead
+_NO_LINK = (errno.EMLINK, errno.EPERM, errno.EXDEV, errno.ENOTSUP, errno.EOPNOTSUPP)
+
+
+def objects_dir(collection_path) -> str:
+    return os.path.join(collection_path, META_DIR, OBJECTS_DIR)
+
+
+def payload_path(collection_path, data: bytes) -> str:
+    name = hashlib.blake2b(data, digest_size=20).hexdigest()
+    return os.path.join(collection_path, META_DIR, OBJECTS_DIR, name)
+
+
+def _write(path, data) -> None:
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def link_payload(collection_path, data: bytes, target) -> bool:
+    '''
+    Make target a hard link to the stored payload of data, storing it when new
+    returns True when bytes were written (new payload, or links not possible)
+    '''
+    path = payload_path(collection_path, data)
+    written = False
+    for _ in range(3):
+        try:
+            os.link(path, target)
+            return written
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            if e.errno not in _NO_LINK:
+                raise
+            _write(target, data)
+            return True
+
+        # New payload: written aside, then linked into place so readers never see it half written
+        os.makedirs(os.path.dirname(path), mode=0o775, exist_ok=True)
+        tmp_name = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        _write(tmp_name, data)
+        try:
+            os.link(tmp_name, path)
+            written = True
+        except FileExistsError:
+            pass  # stored by another writer meanwhile
+        finally:
+            os.remove(tmp_name)
+
+    # Removed as fast as it is stored, give up sharing it
+    _write(target, data)
+    return True
+
+
+def release(collection_path, file) -> bool:
+    '''
+    Remove the payload of an open record file no key links any more
+    returns True when it was removed
+    '''
+    st = os.fstat(file.fileno())
+    if st.st_nlink != 1:
+        return False
+
+    path = payload_path(collection_path, file.read())
+    try:
+        if os.stat(path).st_ino != st.st_ino:
+            return False
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class PayloadCache:
+    '''
+    Bytes of shared payloads by version, least recently used dropped first
+    '''
+
+    def __init__(self, budget=CACHE_BYTES) -> None:
+        self.budget = budget
+        self.total = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        with self._lock:
+            data = self._entries.get(version)
+            if data is not None:
+                self._entries.move_to_end(version)
+            return data
+
+    def put(self, version, data) -> None:
+        if len(data) > self.budget:
+            return
+        with self._lock:
+            if version in self._entries:
+                return
+            self._entries[version] = data
+            self.total += len(data)
+            while self.total > self.budget:
+                _, old = self._entries.popitem(last=False)
+                self.total -= len(old)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total = 0
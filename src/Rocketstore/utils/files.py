@@ -13,7 +13,19 @@ License:
 
 import os
 import re
+import json
 import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+# Reserved entry inside a collection directory holding rocketstore's own
+# bookkeeping (counters, indexes ...). It is never reported as a key.
+META_DIR = ".rocketstore"
 
 # TODO: rebuild / thing about locking files, no use folder lockfile
 # https://stackoverflow.com/questions/489861/locking-a-file-in-python
@@ -22,6 +34,10 @@ import time
 
 
 def file_lock(path_folder, file, lock_retry_interval=13):
+    '''
+    Lock file by symlinking it into path_folder/lockfile
+    lock_retry_interval: milliseconds to wait before retrying a taken lock
+    '''
     # print("fileLock", path_folder, file)
     while True:
         try:
@@ -29,13 +45,13 @@ def file_lock(path_folder, file, lock_retry_interval=13):
             target_path = os.path.join(path_folder, "lockfile", file)
 
             if not os.path.exists(os.path.join(path_folder, "lockfile")):
-                os.makedirs(os.path.join(path_folder, "lockfile"))
+                os.makedirs(os.path.join(path_folder, "lockfile"), exist_ok=True)
 
-            if not os.path.exists(target_path):
-                os.symlink(source_path, target_path)
-                break
-            else:
-                time.sleep(lock_retry_interval)
+            # symlink creation is atomic, losing the race means the lock is taken
+            os.symlink(source_path, target_path)
+            break
+        except FileExistsError:
+            time.sleep(lock_retry_interval / 1000)
         except Exception as err:
             print("[390] -> filelock -> ", err)
             break
@@ -53,17 +69,97 @@ def file_unlock(path_folder, file):
         print("[410] file unlock ->", err)
 
 
+# Compiled once, it is checked on every collection name
+_IDENTIFIER_PATTERN = re.compile(
+    r"^(?!(?:do|if|in|for|let|new|try|var|case|else|enum|eval|null|this|true|void|with|await|break|catch|class|const|false|super|throw|while|yield|delete|export|import|public|return|static|switch|typeof|default|extends|finally|package|private|continue|debugger|function|arguments|interface|protected|implements|instanceof)\b)[^\x20-\x7E]|[^[:ascii:]]",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+@contextmanager
+def locked(lock_path, lock_retry_interval=13):
+    '''
+    Exclusive lock held for the with block, between processes.
+    flock() on lock_path where available, else the symlink lock of file_lock
+    '''
+    if fcntl is None:
+        folder, name = os.path.split(lock_path)
+        file_lock(folder, name, lock_retry_interval)
+        try:
+            yield
+        finally:
+            file_unlock(folder, name)
+        return
+
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def record_version(st) -> str:
+    '''
+    Version (etag) of a record file from its stat: inode, mtime and size
+    '''
+    return f"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+@contextmanager
+def record_locked(handle, key, lock_retry_interval=13):
+    '''
+    Exclusive lock on one record of a collection handle, yields the current
+    os.stat_result of the record file. Locking the record file itself (flock)
+    means writers of other keys never wait on each other.
+    Raises FileNotFoundError when the record does not exist
+    '''
+    if fcntl is None:
+        meta_dir = os.path.join(handle.path, META_DIR)
+        os.makedirs(meta_dir, mode=0o775, exist_ok=True)
+        with locked(os.path.join(meta_dir, f"{key}.lock"), lock_retry_interval):
+            yield os.stat(handle.file_name(key))
+        return
+
+    while True:
+        fd = handle.opener(key, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            st = os.stat(handle.file_name(key))
+            # Replaced while we waited for the lock: lock the new file
+            if st.st_ino != os.fstat(fd).st_ino:
+                continue
+            yield st
+            return
+        finally:
+            os.close(fd)
+
+
 def identifier_name_test(name: any) -> bool:
     '''
     check match name with regex
     its search for any non-ascii symbols and reserved words in javascript or combinations of them
     '''
 
-    pattern = r"^(?!(?:do|if|in|for|let|new|try|var|case|else|enum|eval|null|this|true|void|with|await|break|catch|class|const|false|super|throw|while|yield|delete|export|import|public|return|static|switch|typeof|default|extends|finally|package|private|continue|debugger|function|arguments|interface|protected|implements|instanceof)\b)[^\x20-\x7E]|[^[:ascii:]]"
+    return bool(_IDENTIFIER_PATTERN.search(name))
 
-    check = re.search(pattern, name, re.MULTILINE | re.IGNORECASE)
 
-    return bool(check)
+def key_name_test(key: str, wildcards=False) -> bool:
+    '''
+    True when a key can't name a record file of its collection: path separators,
+    ".." or NUL could reach files outside it, and META_DIR holds the
+    bookkeeping
+    @wildcards: also True for keys with wildcards, which match several
+    '''
+    return (
+        not key
+        or key == META_DIR
+        or os.sep in key
+        or (os.altsep is not None and os.altsep in key)
+        or ".." in key
+        or "\x00" in key
+        or wildcards and ("*" in key or "?" in key)
+    )
 
 
 def file_name_wash(name, preserve_wildcards=False) -> str:
@@ -84,3 +180,29 @@ def file_name_wash(name, preserve_wildcards=False) -> str:
     else:
         # remove / \ ~ zero and double
         return name.replace(r'[\/\\\x00~]', '').replace(r'[.]{2,}', '')
+
+
+def read_meta(path_folder, name):
+    '''
+    Read a JSON bookkeeping file from the META_DIR of a collection or storage area
+    returns None if it does not exist or is unreadable
+    '''
+    try:
+        with open(os.path.join(path_folder, META_DIR, name), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(path_folder, name, data):
+    '''
+    Atomically (re)write a JSON bookkeeping file in the META_DIR of a collection or storage area
+    '''
+    meta_dir = os.path.join(path_folder, META_DIR)
+    os.makedirs(meta_dir, mode=0o775, exist_ok=True)
+
+    tmp_name = os.path.join(
+        meta_dir, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_name, "w") as file:
+        json.dump(data, file)
+    os.replace(tmp_name, os.path.join(meta_dir, name))
@@ -0,0 +1,80 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz) 
+index.py (c) 2026 
+Created:  2026-10-19 09:12:40 
+Desc: Rocket Store (Python) - sorted key index helpers
+Docs: documentation
+License: 
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import re
+from bisect import bisect_left, insort
+
+WILDCARDS = "*?["
+
+_NUMBER = re.compile(r"\d+")
+
+
+def prefix_of(pattern: str):
+    '''
+    Return the literal prefix of a "prefix*" pattern or None when the pattern
+    can not be answered as a key range (wildcards anywhere else)
+    '''
+    if not pattern.endswith("*"):
+        return None
+
+    prefix = pattern.rstrip("*")
+    if any(c in prefix for c in WILDCARDS):
+        return None
+
+    return prefix
+
+
+def prefix_range(index: list, prefix: str) -> tuple:
+    '''
+    (start, end) slice of a sorted key list where all keys begin with prefix
+    '''
+    start = bisect_left(index, prefix)
+    if not prefix:
+        return start, len(index)
+
+    # First string sorting after every string that starts with prefix
+    end = bisect_left(index, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+    return start, end
+
+
+def numeric_key(key: str) -> tuple:
+    '''
+    Sort key putting keys in the order of the number they start with (the
+    sequence of _ADD_AUTO_INC keys), then as strings. Keys without a number
+    come first
+    '''
+    match = _NUMBER.match(key)
+    return (int(match.group()) if match else -1, key)
+
+
+def index_contains(index: list, key: str) -> bool:
+    pos = bisect_left(index, key)
+    return pos < len(index) and index[pos] == key
+
+
+def index_add(index: list, key: str) -> bool:
+    '''
+    Insert key keeping the list sorted. Returns False if it was already there
+    '''
+    if index_contains(index, key):
+        return False
+    insort(index, key)
+    return True
+
+
+def index_remove(index: list, key: str) -> bool:
+    pos = bisect_left(index, key)
+    if pos < len(index) and index[pos] == key:
+        del index[pos]
+        return True
+    return False
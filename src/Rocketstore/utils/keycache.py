@@ -0,0 +1,266 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+keycache.py (c) 2026
+Created:  2026-10-19 17:31:44
+Desc: Rocket Store (Python) - memory bounded cache of the keys of each collection
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Small key sets are plain lists. Large ones are packed into one bytearray,
+NUL separated (file names can't hold a NUL), instead of a str object per key.
+With a memory budget the least recently used collections are dropped whole.
+"""
+
+import sys
+import itertools
+import threading
+
+# Key sets of this size and up are packed
+PACK_THRESHOLD = 4096
+
+POINTER_SIZE = 8
+
+
+def _encode(key: str) -> bytes:
+    return key.encode("utf-8", "surrogateescape")
+
+
+class PackedKeys:
+    '''
+    List-like set of keys in one buffer: b"\\0key1\\0key2\\0"
+    '''
+    __slots__ = ("_buf", "_len")
+
+    def __init__(self, keys=()) -> None:
+        encoded = [_encode(k) for k in keys]
+        self._buf = bytearray(b"\0" + b"".join(k + b"\0" for k in encoded))
+        self._len = len(encoded)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        if not self._len:
+            return iter(())
+        return (k.decode("utf-8", "surrogateescape")
+                for k in self._buf[1:-1].split(b"\0"))
+
+    def __contains__(self, key) -> bool:
+        return b"\0" + _encode(key) + b"\0" in self._buf
+
+    def append(self, key: str) -> None:
+        self._buf += _encode(key) + b"\0"
+        self._len += 1
+
+    def remove_keys(self, keys: set) -> int:
+        kept = [k for k in self if k not in keys]
+        removed = self._len - len(kept)
+        if removed:
+            self.__init__(kept)
+        return removed
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self._buf)
+
+
+def keys_size(keys) -> int:
+    '''
+    Estimated memory held by a key set (list or PackedKeys)
+    '''
+    if isinstance(keys, PackedKeys):
+        return keys.nbytes
+    return sys.getsizeof(keys) + sum(map(sys.getsizeof, keys))
+
+
+class KeyCache:
+    '''
+    collection -> keys, the keys are a list or PackedKeys.
+    budget: bytes the cache may hold (None for no limit). When it is exceeded the
+    least recently used collections are dropped and on_evict(collection) is called.
+    Charges (memory of indexes built on the keys) count until the collection goes.
+    '''
+
+    def __init__(self, budget=None, on_evict=None) -> None:
+        self.budget = budget
+        self.on_evict = on_evict
+        self.evictions = 0
+        self._keys = {}
+        self._size = {}  # collection -> estimated bytes of keys + charges
+        self._charged = {}
+        self._used = {}  # collection -> tick of last use
+        self._tick = itertools.count()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, collection) -> bool:
+        return collection in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, collection, default=None):
+        keys = self._keys.get(collection)
+        if keys is None:
+            return default
+        self._used[collection] = next(self._tick)
+        return keys
+
+    def __getitem__(self, collection):
+        keys = self.get(collection)
+        if keys is None:
+            raise KeyError(collection)
+        return keys
+
+    def __setitem__(self, collection, keys) -> None:
+        if len(keys) >= PACK_THRESHOLD and not isinstance(keys, PackedKeys):
+            keys = PackedKeys(keys)
+        with self._lock:
+            self._forget(collection)
+            self._keys[collection] = keys
+            self._used[collection] = next(self._tick)
+            self._resize(collection, keys_size(keys))
+        self.evict(collection)
+
+    def pop(self, collection, default=None):
+        with self._lock:
+            keys = self._keys.get(collection, default)
+            self._forget(collection)
+        return keys
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._size.clear()
+            self._charged.clear()
+            self._used.clear()
+            self._total = 0
+
+    def add(self, collection, key) -> None:
+        keys = self._keys.get(collection)
+        if keys is None:
+            return
+
+        cached = keys
+        if isinstance(keys, PackedKeys):
+            keys.append(key)
+            size = keys.nbytes
+        elif len(keys) + 1 >= PACK_THRESHOLD:
+            keys = PackedKeys(keys + [key])
+            size = keys.nbytes
+        else:
+            keys.append(key)
+            size = self._size[collection] - self._charged.get(collection, 0) \
+                + sys.getsizeof(key) + POINTER_SIZE
+
+        with self._lock:
+            if self._keys.get(collection) is cached:
+                self._keys[collection] = keys
+                self._resize(collection, size)
+        self.evict(collection)
+
+    def remove(self, collection, keys: set) -> int:
+        '''
+        Remove keys, returns the number removed
+        '''
+        cached = self._keys.get(collection)
+        if cached is None:
+            return 0
+
+        if isinstance(cached, PackedKeys):
+            removed = cached.remove_keys(keys)
+        else:
+            before = len(cached)
+            cached[:] = [e for e in cached if e not in keys]
+            removed = before - len(cached)
+
+        if removed:
+            with self._lock:
+                if self._keys.get(collection) is cached:
+                    self._resize(collection, keys_size(cached))
+        return removed
+
+    def charge(self, collection, nbytes) -> None:
+        '''
+        Count memory held on behalf of a collection (e.g. a sorted index of its keys)
+        '''
+        with self._lock:
+            if collection not in self._keys:
+                return
+            self._charged[collection] = self._charged.get(collection, 0) + nbytes
+            self._size[collection] += nbytes
+            self._total += nbytes
+        self.evict(collection)
+
+    def charge_index(self, collection, index) -> None:
+        '''
+        Charge a sorted list built from the keys. Built from packed keys it holds
+        str objects of its own, else it shares those of the cached list.
+        Entries may also be (number, key) tuples
+        '''
+        size = sys.getsizeof(index)
+        keys = index
+        if index and isinstance(index[0], tuple):
+            size += len(index) * (sys.getsizeof(index[0]) + sys.getsizeof(index[0][0]))
+            keys = (key for _, key in index)
+        if isinstance(self._keys.get(collection), PackedKeys):
+            size += sum(map(sys.getsizeof, keys))
+        self.charge(collection, size)
+
+    def memory(self) -> dict:
+        '''
+        {collection: {'keys': number of keys, 'bytes': estimate, 'packed': bool}}
+        '''
+        with self._lock:
+            return {
+                c: {
+                    "keys": len(keys),
+                    "bytes": self._size[c],
+                    "packed": isinstance(keys, PackedKeys),
+                }
+                for c, keys in self._keys.items()
+            }
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def _resize(self, collection, keys_bytes) -> None:
+        # must hold the lock
+        size = keys_bytes + self._charged.get(collection, 0)
+        self._total += size - self._size.get(collection, 0)
+        self._size[collection] = size
+
+    def _forget(self, collection) -> None:
+        # must hold the lock
+        self._keys.pop(collection, None)
+        self._used.pop(collection, None)
+        self._charged.pop(collection, None)
+        self._total -= self._size.pop(collection, 0)
+
+    def evict(self, keep=None) -> None:
+        '''
+        Drop least recently used collections until within budget.
+        keep (just used) goes last, and only if it alone is over budget
+        '''
+        if self.budget is None or self._total <= self.budget:
+            return
+
+        evicted = []
+        with self._lock:
+            order = sorted(
+                self._keys, key=lambda c: (c == keep, self._used.get(c, 0)))
+            for collection in order:
+                if self._total <= self.budget:
+                    break
+                self._forget(collection)
+                evicted.append(collection)
+            self.evictions += len(evicted)
+
+        if self.on_evict is not None:
+            for collection in evicted:
+                self.on_evict(collection)
@@ -0,0 +1,75 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+locks.py (c) 2026
+Created:  2026-10-19 16:10:22
+Desc: Rocket Store (Python) - reader / writer lock guarding the in-memory caches of a collection
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    '''
+    Any number of readers or one writer.
+    Waiting writers hold off new readers, so a steady stream of reads can't
+    starve them. Both sides are reentrant for the thread holding them, and the
+    writer may also take the read side.
+    '''
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}  # thread id -> depth
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                depth = self._readers[me] - 1
+                if depth:
+                    self._readers[me] = depth
+                else:
+                    del self._readers[me]
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                if me in self._readers:
+                    raise RuntimeError("Can't upgrade a read lock to a write lock")
+                self._writers_waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._writers_waiting -= 1
+                self._writer = me
+            self._writer_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
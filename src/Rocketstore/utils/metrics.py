@@ -0,0 +1,88 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+metrics.py (c) 2026
+Created:  2026-10-19 10:41:05
+Desc: Rocket Store (Python) - operation timers, I/O counters and tracing hooks
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+"""
+
+import functools
+from time import perf_counter_ns
+
+COUNTERS = (
+    "files_opened",
+    "bytes_read",
+    "bytes_written",
+    "cache_hits",
+    "cache_misses",
+    "cache_evictions",
+    "bloom_negatives",
+    "dedup_hits",
+    "dir_listings",
+    "lock_wait_ns",
+)
+
+
+class Metrics:
+    '''
+    Counters are plain attributes so the instrumented code only pays for an
+    attribute increment. Hooks are called as hook(op, collection, duration_ns).
+    '''
+
+    def __init__(self):
+        self.hooks = []
+        self.reset()
+
+    def reset(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.ops = {}
+
+    def timing(self, op, collection, duration_ns):
+        entry = self.ops.get(op)
+        if entry is None:
+            entry = self.ops[op] = [0, 0, 0]
+        entry[0] += 1
+        entry[1] += duration_ns
+        if duration_ns > entry[2]:
+            entry[2] = duration_ns
+
+        for hook in self.hooks:
+            hook(op, collection, duration_ns)
+
+    def snapshot(self) -> dict:
+        out = {name: getattr(self, name) for name in COUNTERS}
+        out["ops"] = {
+            op: {"count": c, "total_ns": t, "max_ns": m}
+            for op, (c, t, m) in self.ops.items()
+        }
+        return out
+
+
+def timed(op):
+    '''
+    Decorator timing a Rocketstore method when its metrics are enabled
+    '''
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None:
+                return fn(self, *args, **kwargs)
+
+            start = perf_counter_ns()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                collection = args[0] if args else kwargs.get(
+                    "collection", kwargs.get("seq_name"))
+                # Calls through a Collection handle report its name
+                collection = getattr(collection, "name", collection)
+                metrics.timing(op, collection, perf_counter_ns() - start)
+        return inner
+    return wrap
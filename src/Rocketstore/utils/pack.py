@@ -0,0 +1,158 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+pack.py (c) 2026
+Created:  2026-10-19 14:02:47
+Desc: Rocket Store (Python) - frozen read-only pack of a collection
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Layout (little endian):
+
+    header   "RSPK", version u32, count u32, keys_offset u64, index_offset u64, data_offset u64
+    data     record bytes as they were stored
+    keys     utf-8 keys, sorted, concatenated
+    index    count x (key_offset u32, key_length u32, data_offset u64, data_length u64)
+
+Sections are found through the header offsets, so their order is free: the
+data is streamed first, the keys and index are only known once it's written.
+The file is mapped, nothing is parsed up front: lookups bisect the index.
+"""
+
+import os
+import mmap
+import struct
+
+MAGIC = b"RSPK"
+VERSION = 1
+HEADER = struct.Struct("<4sIIQQQ")
+ENTRY = struct.Struct("<IIQQ")
+
+
+def write_pack(path, items) -> int:
+    '''
+    items: (key, record bytes) sorted by key. Written to a temp file and renamed.
+    Records are written as they come, only the keys and index are held
+    '''
+    keys = bytearray()
+    index = bytearray()
+    count = 0
+    data_size = 0
+    data_offset = HEADER.size
+
+    tmp_name = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_name, "wb") as file:
+            file.write(bytes(HEADER.size))
+            for key, data in items:
+                k = key.encode()
+                index += ENTRY.pack(len(keys), len(k), data_size, len(data))
+                keys += k
+                file.write(data)
+                data_size += len(data)
+                count += 1
+
+            keys_offset = data_offset + data_size
+            index_offset = keys_offset + len(keys)
+            file.write(keys)
+            file.write(index)
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, VERSION, count,
+                       keys_offset, index_offset, data_offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return count
+
+
+def pack_stamp(path):
+    '''
+    Identity of the pack file at path, None when there is none. Freezing again
+    replaces the file, which changes it
+    '''
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class Pack:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            st = os.fstat(file.fileno())
+            self.stamp = st.st_ino, st.st_mtime_ns, st.st_size
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, self.keys_offset, self.index_offset, self.data_offset = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"Not a rocketstore pack: '{path}'")
+
+        self._keys = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self.map.close()
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self.map, self.index_offset + i * ENTRY.size)
+
+    def key_at(self, i) -> str:
+        if self._keys is not None:
+            return self._keys[i]
+        key_off, key_len, _, _ = self._entry(i)
+        start = self.keys_offset + key_off
+        return self.map[start:start + key_len].decode()
+
+    def data_at(self, i) -> bytes:
+        _, _, data_off, data_len = self._entry(i)
+        start = self.data_offset + data_off
+        return self.map[start:start + data_len]
+
+    def keys(self) -> list:
+        '''
+        All keys in sorted order, decoded once on first use
+        '''
+        if self._keys is None:
+            self._keys = [self.key_at(i) for i in range(self.count)]
+        return self._keys
+
+    def bisect(self, key: str) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, key: str) -> int:
+        '''
+        Position of key or -1
+        '''
+        i = self.bisect(key)
+        if i < self.count and self.key_at(i) == key:
+            return i
+        return -1
+
+    def prefix_range(self, prefix: str) -> tuple:
+        start = self.bisect(prefix)
+        if not prefix:
+            return start, self.count
+        return start, self.bisect(prefix[:-1] + chr(ord(prefix[-1]) + 1))
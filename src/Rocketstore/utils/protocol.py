@@ -0,0 +1,56 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+protocol.py (c) 2026
+Created:  2026-10-19 19:40:12
+Desc: Rocket Store (Python) - framing of the requests to a rocketstore server
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Every message is a 4 byte big endian length followed by that many bytes of
+compact JSON:
+
+    request     [id, method, args, kwargs]
+    response    [id, true, result]  or  [id, false, [error type, message]]
+
+A connection answers its requests in order, so a client may send many of
+them before reading the answers (pipelining).
+A server with a token answers nothing before the first request of a
+connection was [id, "auth", [token], {}] with that token.
+"""
+
+import json
+import struct
+
+HEADER = struct.Struct(">I")
+MAX_FRAME = 256 * 1024 * 1024
+MAX_REQUEST = 16 * 1024 * 1024
+
+
+def encode(message) -> bytes:
+    payload = json.dumps(message, separators=(",", ":")).encode()
+    return HEADER.pack(len(payload)) + payload
+
+
+def read_frame(stream, max_size=MAX_FRAME):
+    '''
+    Next message from a binary stream, None at end of stream
+    raises ValueError, before reading it, for a message larger than max_size
+    '''
+    header = stream.read(HEADER.size)
+    if not header:
+        return None
+    if len(header) < HEADER.size:
+        raise ConnectionError("Connection closed in the middle of a message")
+
+    (size,) = HEADER.unpack(header)
+    if size > max_size:
+        raise ValueError(f"Message of {size} bytes is too large")
+
+    payload = stream.read(size)
+    if len(payload) < size:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return json.loads(payload)
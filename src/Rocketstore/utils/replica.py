@@ -0,0 +1,170 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+replica.py (c) 2026
+Created:  2026-10-19 20:41:18
+Desc: Rocket Store (Python) - keep a follower storage area in sync with the changelog of a leader
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+The changelog only names what changed, so applying an entry copies the
+current bytes of the record (or sequence) from the leader. That makes
+applying idempotent: a batch can be replayed after a crash, and of several
+changes to one key in a batch only the last needs to be applied.
+The follower remembers the last offset applied in <follower>/.rocketstore/replica.
+"""
+
+import os
+import shutil
+import threading
+
+from .files import META_DIR
+from .blob import BLOB_DIR, copy_stream
+
+SEQUENCE_SUFFIX = "_seq"
+
+# Entries of a storage area that are not data
+SKIP = (META_DIR, "lockfile")
+
+
+def copy_file(source, target, tmp_dir) -> int:
+    '''
+    Replace target with a copy of source, atomically and with the same mtime
+    returns bytes copied, -1 when source does not exist (target is removed)
+    '''
+    try:
+        file = open(source, "rb")
+    except (FileNotFoundError, IsADirectoryError):
+        remove_file(target)
+        return -1
+
+    os.makedirs(tmp_dir, mode=0o775, exist_ok=True)
+    tmp_name = os.path.join(
+        tmp_dir, f".{os.path.basename(target)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with file, open(tmp_name, "wb", buffering=0) as out:
+        size = copy_stream(file, out)
+        st = os.fstat(file.fileno())
+    os.utime(tmp_name, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp_name, target)
+    return size
+
+
+def remove_file(path) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def remove_tree(path) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        remove_file(path)
+
+
+def plan(entries) -> list:
+    '''
+    Steps applying changelog entries in order:
+        ("drop", collection or None)
+        ("sequence", name)
+        ("records", {(collection, key): op})  the last post / delete of each key
+    '''
+    steps = []
+    for change in entries:
+        op, collection, key = change["op"], change["collection"], change["key"]
+        if op == "drop":
+            steps.append(("drop", collection))
+        elif op == "sequence":
+            steps.append(("sequence", key))
+        else:
+            if not steps or steps[-1][0] != "records":
+                steps.append(("records", {}))
+            records = steps[-1][1]
+            records.pop((collection, key), None)  # keep the order of the last change
+            records[(collection, key)] = op
+    return steps
+
+
+def _same(a, b) -> bool:
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+def _entries(path, skip=(META_DIR,)) -> dict:
+    try:
+        with os.scandir(path) as it:
+            return {
+                e.name: e for e in it
+                if e.name not in skip and not e.name.lower().endswith(".ds_store")
+                and not (e.name.startswith(".") and e.name.endswith(".tmp"))
+            }
+    except FileNotFoundError:
+        return {}
+
+
+def sync_tree(leader, follower) -> int:
+    '''
+    Make the collections and sequences of follower those of leader, copying
+    only files that differ in size or mtime. Bookkeeping (META_DIR) is not
+    copied, the bytes of blob records are
+    returns the number of files copied
+    '''
+    copied = 0
+    tmp_dir = os.path.join(follower, META_DIR)
+    os.makedirs(tmp_dir, mode=0o775, exist_ok=True)
+
+    theirs = _entries(leader, SKIP)
+    ours = _entries(follower, SKIP)
+
+    for name in set(ours) - set(theirs):
+        remove_tree(ours[name].path)
+
+    for name, entry in theirs.items():
+        target = os.path.join(follower, name)
+        if entry.is_dir():
+            if name in ours and not ours[name].is_dir():
+                remove_file(target)
+            os.makedirs(target, mode=0o775, exist_ok=True)
+            copied += _sync_collection(entry.path, target)
+        elif entry.is_file() and name.endswith(SEQUENCE_SUFFIX):
+            if name in ours and ours[name].is_dir():
+                shutil.rmtree(target)
+            elif name in ours and _same(entry.stat(), ours[name].stat()):
+                continue
+            if copy_file(entry.path, target, tmp_dir) >= 0:
+                copied += 1
+    return copied
+
+
+def _sync_collection(leader, follower) -> int:
+    copied = _sync_files(leader, follower, os.path.join(follower, META_DIR))
+
+    # Bytes of the blob records
+    blobs = os.path.join(leader, META_DIR, BLOB_DIR)
+    if os.path.isdir(blobs) or os.path.isdir(os.path.join(follower, META_DIR, BLOB_DIR)):
+        target = os.path.join(follower, META_DIR, BLOB_DIR)
+        os.makedirs(target, mode=0o775, exist_ok=True)
+        copied += _sync_files(blobs, target, target)
+    return copied
+
+
+def _sync_files(leader, follower, tmp_dir) -> int:
+    copied = 0
+    theirs = _entries(leader)
+    ours = _entries(follower)
+
+    for name in set(ours) - set(theirs):
+        remove_tree(ours[name].path)
+
+    for name, entry in theirs.items():
+        if not entry.is_file():
+            continue
+        if name in ours and _same(entry.stat(), ours[name].stat()):
+            continue
+        if copy_file(entry.path, os.path.join(follower, name), tmp_dir) >= 0:
+            copied += 1
+    return copied
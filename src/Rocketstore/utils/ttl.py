@@ -0,0 +1,152 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+ttl.py (c) 2026
+Created:  2026-10-19 14:48:30
+Desc: Rocket Store (Python) - time ordered expiry index of a collection
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+Persisted as an append only log, <collection>/.rocketstore/ttl, one JSON
+array per line: [expires_at, key]. expires_at 0 clears the expiry of key.
+Several processes may append to the log; refresh() applies what they added
+since it was last read, and reads it all again once another process compacted it.
+It looks at the log at most once per refresh_interval seconds, so collections
+without a ttl cost a stat per interval, not per call.
+"""
+
+import os
+import json
+import time
+import heapq
+
+from .files import META_DIR
+
+REFRESH_INTERVAL = 1.0
+
+
+class ExpiryIndex:
+    def __init__(self, collection_dir: str, refresh_interval=REFRESH_INTERVAL) -> None:
+        self.path = os.path.join(collection_dir, META_DIR, "ttl")
+        self.refresh_interval = refresh_interval
+        self._load()
+
+    def __bool__(self) -> bool:
+        return bool(self.expiry)
+
+    def _load(self) -> None:
+        self.expiry = {}  # key -> expires_at
+        self.heap = []  # (expires_at, key), stale entries are skipped lazily
+        self.log_lines = 0
+        self.inode = None  # of the log read
+        self.refreshed_at = 0.0  # time.monotonic() the log was last looked at
+        self.offset = 0  # bytes of the log applied
+        self.refresh(force=True)
+
+    def refresh(self, force=False) -> bool:
+        '''
+        Apply the entries appended to the log since it was last read, by this
+        or other processes. True when there were any
+        @force: look at the log even if it was looked at less than refresh_interval ago
+        '''
+        now = time.monotonic()
+        if not force and now - self.refreshed_at < self.refresh_interval:
+            return False
+        self.refreshed_at = now
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self.inode is not None:
+                self._load()  # removed with its collection
+            return False
+        if st.st_ino == self.inode and st.st_size == self.offset:
+            return False
+        if self.inode is not None and (st.st_ino != self.inode or st.st_size < self.offset):
+            self._load()  # compacted by another process
+            return True
+
+        try:
+            with open(self.path, "rb") as file:
+                self.inode = os.fstat(file.fileno()).st_ino
+                file.seek(self.offset)
+                data = file.read()
+        except FileNotFoundError:
+            return False
+
+        # A line being appended right now is read next time
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        for line in data[:end].splitlines():
+            try:
+                expires_at, key = json.loads(line)
+            except ValueError:
+                continue
+            self.log_lines += 1
+            if not expires_at:
+                self.expiry.pop(key, None)
+            elif self.expiry.get(key) != expires_at:
+                self.expiry[key] = expires_at
+                heapq.heappush(self.heap, (expires_at, key))
+        return end > 0
+
+    def _log(self, entries) -> None:
+        os.makedirs(os.path.dirname(self.path), mode=0o775, exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write("".join(json.dumps(e) + "\n" for e in entries))
+
+    def set(self, key: str, expires_at: float) -> None:
+        self.expiry[key] = expires_at
+        heapq.heappush(self.heap, (expires_at, key))
+        self._log([[expires_at, key]])
+
+    def clear(self, keys) -> None:
+        cleared = [k for k in keys if self.expiry.pop(k, None) is not None]
+        if cleared:
+            self._log([[0, k] for k in cleared])
+            self.compact()
+
+    def expires(self, key: str):
+        return self.expiry.get(key)
+
+    def is_expired(self, key: str, now: float) -> bool:
+        expires_at = self.expiry.get(key)
+        return expires_at is not None and expires_at <= now
+
+    def has_due(self, now: float) -> bool:
+        return bool(self.heap) and self.heap[0][0] <= now
+
+    def pop_due(self, now: float, limit=None) -> list:
+        '''
+        Keys expired at now, earliest first. Only looks at the expiring entries.
+        '''
+        due = []
+        heap = self.heap
+        while heap and heap[0][0] <= now and (limit is None or len(due) < limit):
+            expires_at, key = heapq.heappop(heap)
+            if self.expiry.get(key) == expires_at:
+                due.append(key)
+        return due
+
+    def compact(self) -> None:
+        '''
+        Rewrite the log when it is mostly cleared entries
+        '''
+        self.refresh(force=True)
+        if self.log_lines < 1024 or self.log_lines < 4 * len(self.expiry):
+            return
+
+        tmp_name = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_name, "wb") as file:
+            file.write("".join(
+                json.dumps([t, k]) + "\n" for k, t in self.expiry.items()).encode())
+            st = os.fstat(file.fileno())
+        os.replace(tmp_name, self.path)
+        self.log_lines = len(self.expiry)
+        self.inode, self.offset = st.st_ino, st.st_size
+
+        self.heap = [(t, k) for k, t in self.expiry.items()]
+        heapq.heapify(self.heap)
@@ -0,0 +1,109 @@
+"""
+█▀ █▄█ █▀▀ █░█ █▀▀ █░█
+▄█ ░█░ █▄▄ █▀█ ██▄ ▀▄▀
+
+Author: <Anton Sychev> (anton at sychev dot xyz)
+wal.py (c) 2026
+Created:  2026-10-19 13:10:22
+Desc: Rocket Store (Python) - append only write-ahead log for atomic batches
+Docs: documentation
+License:
+    * MIT: (c) Paragi 2017, Simon Riget.
+
+One line per committed batch, followed by an applied marker once its
+operations reached the record files:
+
+    {"batch": "9f1c...", "ops": [["post", "person", "1", {...}], ["delete", "person", "2"]]}
+    {"applied": "9f1c..."}
+
+A line cut short by a crash is not a committed batch and is ignored.
+"""
+
+import os
+import json
+
+from .files import META_DIR, locked
+
+
+class WriteAheadLog:
+    def __init__(self, storage_area: str) -> None:
+        self.dir = os.path.join(os.path.abspath(storage_area), META_DIR)
+        self.path = os.path.join(self.dir, "wal")
+
+    def lock(self):
+        os.makedirs(self.dir, mode=0o775, exist_ok=True)
+        return locked(self.path + ".lock")
+
+    def exists(self) -> bool:
+        try:
+            return os.path.getsize(self.path) > 0
+        except OSError:
+            return False
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, line: bytes, sync=True) -> None:
+        with open(self.path, "ab+") as file:
+            # Never glue an entry onto a line torn by a crash
+            if file.seek(0, os.SEEK_END) > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    line = b"\n" + line
+
+            file.write(line + b"\n")
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+
+    def pending(self) -> list:
+        '''
+        Committed batches without an applied marker, in commit order.
+        Must be called holding the lock: a torn last line is cut off.
+        '''
+        batches = {}
+        end = 0
+        try:
+            with open(self.path, "rb") as file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break  # torn write, never committed
+                    end += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if "batch" in entry:
+                        batches[entry["batch"]] = entry["ops"]
+                    elif "applied" in entry:
+                        batches.pop(entry["applied"], None)
+        except FileNotFoundError:
+            return []
+
+        if end < self.size():
+            os.truncate(self.path, end)
+
+        return list(batches.items())
+
+    def truncate(self) -> None:
+        try:
+            os.truncate(self.path, 0)
+        except FileNotFoundError:
+            pass
+
+
+def encode_batch(batch_id: str, ops: list) -> bytes:
+    '''
+    Posted records are already JSON text, they are spliced in as they are
+    '''
+    parts = []
+    for op in ops:
+        if op[0] == "post":
+            parts.append('["post",%s,%s,%s]' % (
+                json.dumps(op[1]), json.dumps(op[2]), op[3]))
+        else:
+            parts.append(json.dumps(op))
+    return ('{"batch":%s,"ops":[%s]}' % (json.dumps(batch_id), ",".join(parts))).encode()
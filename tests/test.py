@@ -12,9 +12,21 @@ Docs: documentation
 import unittest
 import os
 import json
+import time
+import threading
+import gzip
+import io
+import socket
+from unittest import mock
 from pathlib import PurePath
 
-from Rocketstore import Rocketstore
+from Rocketstore import Rocketstore, VersionConflict, Client
+from Rocketstore.server import make_server
+from Rocketstore import cli
+from Rocketstore.utils import bulk, protocol
+from Rocketstore.utils.keycache import PackedKeys, PACK_THRESHOLD
+from Rocketstore.utils.pack import HEADER, Pack, write_pack
+from Rocketstore.utils.files import file_lock, file_unlock
 
 rs = Rocketstore(**{
     "data_storage_area": "./tests/ddbb",
@@ -389,5 +401,1426 @@ class TestStorage(unittest.TestCase):
         })
 
 
+class TestCount(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_count")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.delete()
+
+    def test_count_is_maintained(self):
+        for i in range(5):
+            self.rs.post("orders", f"a{i}", i)
+        self.rs.post("orders", "b1", 1)
+
+        self.assertEqual(self.rs.get("orders", flags=Rocketstore._COUNT), {
+            "count": 6})
+        self.assertEqual(self.rs.get("orders", "a*", Rocketstore._COUNT), {
+            "count": 5})
+
+        # overwrite does not count, new keys and deletes do
+        self.rs.post("orders", "a1", 11)
+        self.rs.post("orders", "b2", 2)
+        self.rs.delete("orders", "a0")
+        self.assertEqual(self.rs.get("orders", flags=Rocketstore._COUNT), {
+            "count": 6})
+        self.assertEqual(self.rs.get("orders", "a*", Rocketstore._COUNT), {
+            "count": 4})
+        self.assertEqual(self.rs.get("orders", "b?", Rocketstore._COUNT), {
+            "count": 2})
+
+        self.assertEqual(self.rs.get("nothing", flags=Rocketstore._COUNT), {
+            "count": 0})
+
+    def test_count_is_persisted(self):
+        for i in range(3):
+            self.rs.post("orders", f"a{i}", i)
+        self.rs.get("orders", flags=Rocketstore._COUNT)
+        self.rs.post("orders", "a3", 3)
+        self.rs.flush()
+
+        # A fresh instance trusts the persisted counter without listing
+        rs = Rocketstore(data_storage_area="./tests/ddbb_count")
+        self.assertEqual(rs.get("orders", flags=Rocketstore._COUNT), {
+            "count": 4})
+        self.assertNotIn("orders", rs.key_cache)
+
+        # Files added behind its back invalidate the snapshot
+        with open(os.path.join(rs.data_storage_area, "orders", "x"), "w") as f:
+            f.write("1")
+        rs = Rocketstore(data_storage_area="./tests/ddbb_count")
+        self.assertEqual(rs.get("orders", flags=Rocketstore._COUNT), {
+            "count": 5})
+        self.assertEqual(rs.get("orders", "*", Rocketstore._KEYS)["count"], 5)
+
+    def test_bookkeeping_name_is_reserved(self):
+        self.rs.post("c", "a", 1)
+        with self.assertRaises(ValueError):
+            self.rs.post("c", ".rocketstore", {})
+        with self.assertRaises(ValueError):
+            self.rs.get("c", ".rocketstore")
+        with self.assertRaises(ValueError):
+            self.rs.delete("c", ".rocketstore")
+        with self.assertRaises(ValueError):
+            self.rs.batch().post("c", ".rocketstore", {})
+        with self.assertRaises(ValueError):
+            self.rs.batch().delete("c", ".rocketstore")
+
+        # Bookkeeping still works
+        self.rs.post("c", "b", 2, ttl=10)
+        self.assertEqual(self.rs.get("c", "*", Rocketstore._COUNT), {"count": 2})
+
+    def test_count_of_other_writers(self):
+        for i in range(3):
+            self.rs.post("orders", f"a{i}", i)
+        self.rs.get("orders", flags=Rocketstore._COUNT)
+
+        # Another instance inserts before this one writes and flushes
+        Rocketstore(data_storage_area="./tests/ddbb_count").post("orders", "b1", 1)
+        self.rs.post("orders", "a9", 9)
+        self.rs.flush()
+
+        rs = Rocketstore(data_storage_area="./tests/ddbb_count")
+        self.assertEqual(rs.get("orders", flags=Rocketstore._COUNT), {"count": 5})
+
+    def test_own_writes_keep_the_count_current(self):
+        for i in range(3):
+            self.rs.post("orders", f"a{i}", i)
+        self.rs.get("orders", flags=Rocketstore._COUNT)
+        self.rs.flush()
+
+        # Inserts and deletes of this instance don't make the flush list again
+        with mock.patch.object(self.rs, "_listing", wraps=self.rs._listing) as listing:
+            for i in range(3, 6):
+                self.rs.post("orders", f"a{i}", i)
+                self.rs.delete("orders", "a0")
+                self.rs.flush()
+        listing.assert_not_called()
+
+        rs = Rocketstore(data_storage_area="./tests/ddbb_count")
+        self.assertEqual(rs.get("orders", flags=Rocketstore._COUNT), {"count": 5})
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_metrics")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.delete()
+
+    def test_disabled_by_default(self):
+        self.rs.post("person", "a", record)
+        self.assertEqual(self.rs.stats(), {})
+
+    def test_counters_and_hooks(self):
+        calls = []
+        self.rs.options(metrics=True)
+        self.rs.add_hook(lambda op, collection, ns: calls.append(
+            (op, collection)))
+
+        self.rs.post("person", "a", record)
+        self.rs.post("person", "b", record)
+        self.rs.get("person", "*")
+        self.rs.get("person", "a")
+        self.rs.delete("person", "b")
+        self.rs.sequence("person")
+
+        stats = self.rs.stats(reset=True)
+        self.assertEqual(stats["ops"]["post"]["count"], 2)
+        self.assertEqual(stats["ops"]["get"]["count"], 2)
+        self.assertEqual(stats["ops"]["delete"]["count"], 1)
+        self.assertEqual(stats["ops"]["sequence"]["count"], 1)
+        self.assertEqual(stats["files_opened"], 5)
+        self.assertEqual(stats["bytes_read"], 3 * len(json.dumps(record)))
+        self.assertEqual(stats["bytes_written"], 2 * len(json.dumps(record)))
+        self.assertEqual(stats["cache_misses"], 1)
+        self.assertEqual(stats["cache_hits"], 2)
+        self.assertEqual(calls, [
+            ("post", "person"), ("post", "person"), ("get", "person"),
+            ("get", "person"), ("delete", "person"), ("sequence", "person")])
+        self.assertEqual(self.rs.stats()["ops"], {})
+
+        # Calls through a handle are labelled with the collection name
+        self.rs.collection("person").get("a")
+        self.assertEqual(calls[-1], ("get", "person"))
+
+
+class TestCollectionHandle(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_handle")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.delete()
+        self.rs.close()
+
+    def test_handle(self):
+        person = self.rs.collection("person")
+        self.assertIs(person, self.rs.collection("person"))
+        self.assertEqual(person.path, os.path.abspath(
+            "./tests/ddbb_handle/person"))
+
+        self.assertEqual(person.post("a", 1), {"key": "a", "count": 1})
+        self.assertEqual(self.rs.post(person, "b", 2), {"key": "b", "count": 1})
+        self.assertEqual(person.get("*", Rocketstore._ORDER), {
+            "count": 2, "key": ["a", "b"], "result": [1, 2]})
+        self.assertEqual(self.rs.get("person", "b"), {
+            "count": 1, "key": ["b"], "result": [2]})
+
+        with self.assertRaises(ValueError):
+            self.rs.collection("")
+
+    def test_handle_survives_collection_delete(self):
+        person = self.rs.collection("person")
+        person.post("a", 1)
+        self.rs.delete("person")
+        self.assertEqual(person.get("a"), {"count": 0})
+
+        person.post("b", 2)
+        self.assertEqual(self.rs.get("person", "*", Rocketstore._KEYS), {
+            "count": 1, "key": ["b"]})
+
+    def test_open_directories_are_bounded(self):
+        self.rs.options(max_open_dirs=3)
+        for i in range(10):
+            self.rs.post(f"c{i}", "k", i)
+        self.assertLessEqual(self.rs._dir_slots.used, 3)
+
+        # Collections beyond the limit work through paths
+        self.assertEqual(self.rs.get("c9", "k")["result"], [9])
+        self.rs.delete("c0")
+        self.assertEqual(self.rs.get("c9", "*", Rocketstore._COUNT), {"count": 1})
+
+
+class TestFileLock(unittest.TestCase):
+    def setUp(self):
+        self.folder = "./tests/ddbb_lock"
+        os.makedirs(self.folder, exist_ok=True)
+        self.lock = os.path.join(self.folder, "lockfile", "seq")
+
+    def tearDown(self):
+        file_unlock(self.folder, "seq")
+
+    def test_taken_lock_is_waited_for(self):
+        file_lock(self.folder, "seq")
+
+        # Waits lock_retry_interval milliseconds, then takes it once released
+        with mock.patch("Rocketstore.utils.files.time.sleep",
+                        side_effect=lambda s: file_unlock(self.folder, "seq")) as sleep:
+            file_lock(self.folder, "seq", lock_retry_interval=5)
+        sleep.assert_called_once_with(0.005)
+        self.assertTrue(os.path.islink(self.lock))
+
+    def test_lost_race_is_waited_for(self):
+        # Taken by another process between looking and linking
+        real_symlink = os.symlink
+        calls = []
+
+        def symlink(source, target):
+            calls.append(target)
+            if len(calls) == 1:
+                raise FileExistsError(target)
+            real_symlink(source, target)
+
+        with mock.patch("Rocketstore.utils.files.os.symlink", side_effect=symlink), \
+                mock.patch("Rocketstore.utils.files.time.sleep") as sleep:
+            file_lock(self.folder, "seq", lock_retry_interval=5)
+        self.assertEqual(len(calls), 2)
+        sleep.assert_called_once_with(0.005)
+        self.assertTrue(os.path.islink(self.lock))
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_export")
+        self.rs.delete()
+        self.archive = "./tests/ddbb_export.jsonl.gz"
+
+    def tearDown(self):
+        self.rs.delete()
+        if os.path.exists(self.archive):
+            os.remove(self.archive)
+
+    def test_export_import(self):
+        for i in range(300):
+            self.rs.post("person", f"{i:03}", {"id": i, "text": "a\nb"})
+        self.rs.post("orders", "", {"total": 10})
+        self.rs.post("orders", "", {"total": 20})
+        self.rs.post("skipped", "x", 1)
+
+        stats = self.rs.export(self.archive, collections=["person", "orders"])
+        self.assertEqual(stats["collections"], 2)
+        self.assertEqual(stats["records"], 302)
+        self.assertEqual(stats["sequences"], 1)
+
+        self.rs.delete()
+        stats = self.rs.import_(self.archive)
+        self.assertEqual(stats["records"], 302)
+
+        res = self.rs.get("person", "*", Rocketstore._ORDER)
+        self.assertEqual(res["count"], 300)
+        self.assertEqual(res["result"][7], {"id": 7, "text": "a\nb"})
+        self.assertEqual(self.rs.get("orders", "2")["result"], [{"total": 20}])
+        self.assertEqual(self.rs.get("skipped"), {"count": 0})
+        self.assertEqual(self.rs.sequence("orders"), 3)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_batch")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.delete()
+
+    def test_batch_commit(self):
+        self.rs.post("carts", "77", {"items": 2})
+
+        with self.rs.batch() as b:
+            self.assertEqual(b.post("orders", "", {"total": 10}), {
+                             "key": "1", "count": 1})
+            b.post("customers", "77", {"orders": 1})
+            b.delete("carts", "77")
+
+        self.assertEqual(self.rs.get("orders", "1")["result"], [{"total": 10}])
+        self.assertEqual(self.rs.get("customers", "77")[
+                         "result"], [{"orders": 1}])
+        self.assertEqual(self.rs.get("carts", "77"), {"count": 0})
+
+        with self.assertRaises(ValueError):
+            self.rs.batch().delete("carts", "*")
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc")
+    def test_batch_on_disk_before_marked_applied(self):
+        from Rocketstore.utils import wal as wal_module
+
+        synced = []
+        fsync, append = os.fsync, wal_module.WriteAheadLog.append
+
+        def record_fsync(fd):
+            synced.append(os.readlink(f"/proc/self/fd/{fd}"))
+            fsync(fd)
+
+        def record_append(log, data, sync=True):
+            synced.append(("applied" if b"applied" in data else "batch", sync))
+            append(log, data, sync)
+
+        with mock.patch("os.fsync", record_fsync), \
+                mock.patch.object(wal_module.WriteAheadLog, "append", record_append):
+            with self.rs.batch() as b:
+                b.post("orders", "1", {"total": 10})
+                b.post("orders", "2", {"total": 20})
+
+        # Records and their directory, then the synced applied marker
+        orders = os.path.abspath("./tests/ddbb_batch/orders")
+        marker = synced.index(("applied", True))
+        before = synced[synced.index(("batch", True)):marker]
+        for path in (orders, os.path.join(orders, "1"), os.path.join(orders, "2")):
+            self.assertIn(path, before)
+
+    def test_batch_discarded_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.rs.batch() as b:
+                b.post("orders", "1", {"total": 10})
+                raise RuntimeError("abort")
+
+        self.assertEqual(self.rs.get("orders", "1"), {"count": 0})
+
+    def test_interrupted_batch_is_replayed(self):
+        from Rocketstore.utils.wal import WriteAheadLog, encode_batch
+
+        # Committed to the log, but the process died before applying it
+        wal = WriteAheadLog(self.rs.data_storage_area)
+        os.makedirs(wal.dir, exist_ok=True)
+        wal.append(encode_batch("a1", [
+            ["post", "orders", "1", json.dumps({"total": 10})],
+            ["post", "orders", "2", json.dumps({"total": 20})],
+        ]))
+        # Torn write of a later batch
+        with open(wal.path, "ab") as f:
+            f.write(b'{"batch": "a2", "ops": [["post", "orders", "3"')
+
+        rs = Rocketstore(data_storage_area="./tests/ddbb_batch")
+        self.assertEqual(rs.get("orders", "*", Rocketstore._ORDER)["result"],
+                         [{"total": 10}, {"total": 20}])
+        self.assertEqual(wal.pending(), [])
+
+        rs.checkpoint()
+        self.assertFalse(wal.exists())
+
+
+class TestFreeze(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_freeze")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.delete()
+
+    def test_freeze_and_read_only(self):
+        for i in range(50):
+            self.rs.post("ref", f"k{i:02}", {"i": i})
+        self.rs.post("ref", "other", "x")
+        self.assertEqual(self.rs.freeze("ref"), {"count": 51})
+
+        ro = Rocketstore(data_storage_area="./tests/ddbb_freeze",
+                         read_only=True)
+        self.assertEqual(ro.get("ref", "k07"), {
+            "count": 1, "key": ["k07"], "result": [{"i": 7}]})
+        self.assertEqual(ro.get("ref", "nope"), {"count": 0})
+        self.assertEqual(ro.get("ref", "k1*", Rocketstore._KEYS)["key"],
+                         [f"k{i}" for i in range(10, 20)])
+        self.assertEqual(ro.get("ref", "k?9", Rocketstore._COUNT), {
+            "count": 5})
+        self.assertEqual(ro.get("ref", "", Rocketstore._COUNT), {"count": 51})
+        self.assertEqual(ro.get("ref", "*", Rocketstore._ORDER_DESC)[
+                         "key"][0], "other")
+
+        # Served from the pack, without listing the collection
+        self.assertNotIn("ref", ro.key_cache)
+
+        with self.assertRaises(PermissionError):
+            ro.post("ref", "k99", 1)
+        with self.assertRaises(PermissionError):
+            ro.delete("ref", "k01")
+        ro.close()
+
+    def test_freeze_again(self):
+        self.rs.post("ref", "a", 1)
+        self.rs.freeze("ref")
+        ro = Rocketstore(data_storage_area="./tests/ddbb_freeze", read_only=True)
+        self.assertEqual(ro.get("ref", "a")["result"], [1])
+
+        # The mapping of the replaced pack isn't used anymore
+        self.rs.post("ref", "a", 2)
+        self.rs.post("ref", "b", 3)
+        self.rs.freeze("ref")
+        self.assertEqual(ro.get("ref", "a")["result"], [2])
+        self.assertEqual(ro.get("ref", "", Rocketstore._COUNT), {"count": 2})
+        ro.close()
+
+    def test_records_streamed_to_the_pack(self):
+        path = os.path.join("./tests/ddbb_freeze", "pack")
+        os.makedirs("./tests/ddbb_freeze", exist_ok=True)
+        written = []
+
+        def items():
+            for i in range(3):
+                yield f"k{i}", b"x" * 10000
+                # On disk already, not held until the last one
+                tmp = [e for e in os.listdir("./tests/ddbb_freeze") if e.endswith(".tmp")]
+                written.append(os.path.getsize(os.path.join("./tests/ddbb_freeze", tmp[0])))
+
+        self.assertEqual(write_pack(path, items()), 3)
+        self.assertEqual(written, [HEADER.size + n * 10000 for n in (1, 2, 3)])
+
+        pack = Pack(path)
+        self.assertEqual(pack.keys(), ["k0", "k1", "k2"])
+        self.assertEqual(bytes(pack.data_at(pack.find("k1"))), b"x" * 10000)
+        pack.close()
+
+
+class TestTTL(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_ttl")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_expired_records_are_absent(self):
+        self.rs.post("sessions", "a", 1, ttl=0.05)
+        self.rs.post("sessions", "b", 2, ttl=60)
+        self.rs.post("sessions", "c", 3)
+        self.assertEqual(self.rs.get("sessions", flags=Rocketstore._COUNT), {
+            "count": 3})
+
+        time.sleep(0.1)
+        self.assertEqual(self.rs.get("sessions", "*", Rocketstore._ORDER), {
+            "count": 2, "key": ["b", "c"], "result": [2, 3]})
+        self.assertEqual(self.rs.get("sessions", "a"), {"count": 0})
+        self.assertEqual(self.rs.get("sessions", flags=Rocketstore._COUNT), {
+            "count": 2})
+
+        with self.assertRaises(ValueError):
+            self.rs.post("sessions", "d", 4, ttl=-1)
+
+    def test_repost_clears_ttl(self):
+        self.rs.post("sessions", "a", 1, ttl=0.05)
+        self.rs.post("sessions", "a", 2)
+        time.sleep(0.1)
+        self.assertEqual(self.rs.get("sessions", "a")["result"], [2])
+
+    def test_reaper(self):
+        for i in range(20):
+            self.rs.post("sessions", f"s{i}", i, ttl=0.05 if i % 2 else 60)
+
+        # A fresh instance finds the persisted expiry index
+        rs = Rocketstore(data_storage_area="./tests/ddbb_ttl")
+        rs.start_reaper(interval=0.05, batch_size=4)
+        time.sleep(0.5)
+        rs.stop_reaper()
+
+        self.assertEqual(len(os.listdir(os.path.join(
+            rs.data_storage_area, "sessions"))), 10 + 1)  # + .rocketstore
+        self.assertEqual(rs.reap(), 0)
+
+    def test_expiry_of_other_writers(self):
+        self.rs.post("sessions", "x", 0, ttl=60)
+        self.rs.get("sessions", "*")
+
+        # Another process (worker) posts after this one loaded the index
+        self.rs.options(ttl_refresh_interval=0.05)
+        other = Rocketstore(data_storage_area="./tests/ddbb_ttl")
+        other.post("sessions", "s1", 1, ttl=0.05)
+        other.post("carts", "c1", 1, ttl=0.05)
+        time.sleep(0.1)
+
+        self.assertEqual(self.rs.get("sessions", "s1"), {"count": 0})
+        self.assertEqual(self.rs.reap(), 1)
+        self.assertEqual(other.get("carts", "*", Rocketstore._COUNT), {"count": 0})
+
+    def test_ttl_log_looked_at_once_per_interval(self):
+        self.rs.post("plain", "a", 1)
+        with mock.patch("os.stat", wraps=os.stat) as stat:
+            for i in range(20):
+                self.rs.post("plain", "a", i)
+                self.rs.get("plain", "a")
+        ttl_log = os.path.join("plain", ".rocketstore", "ttl")
+        self.assertFalse([c for c in stat.call_args_list if str(c.args[0]).endswith(ttl_log)])
+
+
+class TestGetMany(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_get_many")
+        self.rs.delete()
+        for i in range(30):
+            self.rs.post("person", f"p{i}", {"id": i})
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_request_order_and_missing(self):
+        keys = ["p3", "nobody", "p1", "p29", "p3"]
+        self.assertEqual(self.rs.get_many("person", keys), {
+            "count": 4,
+            "key": keys,
+            "result": [{"id": 3}, None, {"id": 1}, {"id": 29}, {"id": 3}],
+            "missing": ["nobody"]})
+
+        # Enough keys to go through the thread pool
+        keys = [f"p{i}" for i in reversed(range(30))]
+        result = self.rs.collection("person").get_many(keys)
+        self.assertEqual(result["result"], [{"id": i} for i in reversed(range(30))])
+        self.assertNotIn("missing", result)
+
+        self.assertEqual(self.rs.get_many("nothing", ["a"]), {
+            "count": 0, "key": ["a"], "result": [None], "missing": ["a"]})
+
+    def test_cached_missing_keys_are_not_opened(self):
+        self.rs.options(metrics=True)
+        self.rs.get("person", "*")  # fill the key cache
+        self.rs.stats(reset=True)
+
+        result = self.rs.get_many("person", ["x1", "p2", "x2"])
+        self.assertEqual(result["missing"], ["x1", "x2"])
+        self.assertEqual(self.rs.stats()["files_opened"], 1)
+
+    def test_expired_keys_are_missing(self):
+        self.rs.post("person", "temp", 1, ttl=0.05)
+        time.sleep(0.1)
+        self.assertEqual(self.rs.get_many("person", ["temp", "p0"])["missing"], ["temp"])
+
+    def test_keys_outside_the_collection(self):
+        with open("./tests/ddbb_get_many/secret.json", "w") as file:
+            file.write('{"password": "x"}')
+        for key in ["../secret.json", "p1/../../secret.json", "p\x00"]:
+            with self.assertRaises(ValueError):
+                self.rs.get_many("person", ["p1", key])
+            with self.assertRaises(ValueError):
+                self.rs.post("person", key, 1)
+        with self.assertRaises(ValueError):
+            self.rs.get_many("person", ["p*"])
+        self.assertEqual(self.rs.get("person", "../secret.json"), {"count": 0})
+
+
+class TestFields(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_fields")
+        self.rs.delete()
+        for i in range(5):
+            self.rs.post("person", f"p{i}", {
+                "id": i, "name": f"n{i}", "payload": "x" * 100})
+        self.rs.post("person", "scalar", 7)
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_get_fields(self):
+        self.assertEqual(self.rs.get("person", "p1", fields=["id", "name", "nope"]), {
+            "count": 1, "key": ["p1"], "result": [{"id": 1, "name": "n1"}]})
+        self.assertEqual(
+            self.rs.get_many("person", ["p2", "scalar"], fields=["id"])["result"],
+            [{"id": 2}, 7])
+
+    def test_iter_records(self):
+        items = list(self.rs.iter_records(
+            "person", "p*", Rocketstore._ORDER_DESC, fields=["name"]))
+        self.assertEqual(items, [(f"p{i}", {"name": f"n{i}"}) for i in reversed(range(5))])
+
+        self.assertEqual(len(list(self.rs.collection("person").iter_records())), 6)
+        self.assertEqual(list(self.rs.iter_records("nothing")), [])
+
+    def test_raw(self):
+        found = self.rs.get("person", "p1", Rocketstore._RAW)
+        self.assertIsInstance(found["result"][0], bytes)
+        self.assertEqual(json.loads(found["result"][0])["name"], "n1")
+
+        found = self.rs.get("person", "p*", Rocketstore._RAW_ARRAY | Rocketstore._ORDER)
+        self.assertEqual(found["key"], [f"p{i}" for i in range(5)])
+        self.assertEqual([r["id"] for r in json.loads(found["result"])], list(range(5)))
+        self.assertEqual(self.rs.get("person", "nope", Rocketstore._RAW_ARRAY),
+                         {"count": 0, "result": b"[]"})
+
+        with self.assertRaises(ValueError):
+            self.rs.get("person", "p1", Rocketstore._RAW, fields=["id"])
+
+        # Frozen collections hand out the bytes of their pack
+        self.rs.freeze("person")
+        ro = Rocketstore(data_storage_area="./tests/ddbb_fields", read_only=True)
+        self.assertEqual(json.loads(ro.get("person", "scalar", Rocketstore._RAW_ARRAY)["result"]), [7])
+        ro.close()
+
+
+class TestVersions(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_versions")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_if_version(self):
+        self.rs.post("account", "42", {"balance": 0})
+        found = self.rs.get("account", "42", Rocketstore._VERSION)
+        version = found["version"][0]
+
+        result = self.rs.post("account", "42", {"balance": 10}, if_version=version)
+        self.assertNotEqual(result["version"], version)
+        self.assertEqual(self.rs.get("account", "42", Rocketstore._VERSION)["version"],
+                         [result["version"]])
+
+        # The old version is stale now
+        with self.assertRaises(VersionConflict):
+            self.rs.post("account", "42", {"balance": 20}, if_version=version)
+        with self.assertRaises(VersionConflict):
+            self.rs.post("account", "nobody", {}, if_version=version)
+        with self.assertRaises(ValueError):
+            self.rs.post("account", "42", {}, Rocketstore._ADD_AUTO_INC, if_version=version)
+
+        self.assertEqual(self.rs.get("account", "*"), {
+            "count": 1, "key": ["42"], "result": [{"balance": 10}]})
+
+    def test_concurrent_increments(self):
+        self.rs.post("account", "42", {"balance": 0})
+
+        def increment():
+            for _ in range(20):
+                while True:
+                    found = self.rs.get("account", "42", Rocketstore._VERSION)
+                    record = found["result"][0]
+                    record["balance"] += 1
+                    try:
+                        self.rs.post("account", "42", record,
+                                     if_version=found["version"][0])
+                        break
+                    except VersionConflict:
+                        continue
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.rs.get("account", "42")["result"], [{"balance": 80}])
+
+
+class TestThreads(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_threads")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_shared_instance(self):
+        self.rs.post("shared", "seed", 0)
+        self.rs.get("shared", "*")  # caches in use from the start
+        self.rs.get("shared", "s*", Rocketstore._COUNT)
+        errors = []
+
+        def work(n):
+            try:
+                for i in range(50):
+                    self.rs.post("shared", f"t{n}-{i}", i)
+                    self.rs.get("shared", f"t{n}-*")
+                    if i % 2:
+                        self.rs.delete("shared", f"t{n}-{i}")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        on_disk = sorted(k for k in os.listdir(os.path.join(
+            self.rs.data_storage_area, "shared")) if k != ".rocketstore")
+        self.assertEqual(sorted(self.rs.get("shared", "*", Rocketstore._KEYS)["key"]), on_disk)
+        self.assertEqual(self.rs.get("shared", flags=Rocketstore._COUNT), {
+            "count": 1 + 8 * 25})
+        self.assertEqual(self.rs.get("shared", "t1-*", Rocketstore._COUNT), {"count": 25})
+
+
+class TestDecodeWorkers(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_decode")
+        self.rs.delete()
+        for i in range(1100):
+            self.rs.post("wide", f"{i:05}", {"id": i, "payload": "x" * 50})
+        self.rs.options(decode_workers=2)
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_wildcard_read_in_workers(self):
+        self.rs.get("wide", "*", Rocketstore._KEYS)  # cached, then removed behind our back
+        os.remove(os.path.join(self.rs.data_storage_area, "wide", "00007"))
+
+        result = self.rs.get("wide", "*", Rocketstore._ORDER)
+        self.assertEqual(result["count"], 1099)
+        self.assertEqual(result["result"][:8], [{"id": i, "payload": "x" * 50}
+                                                for i in range(7)] + ["*deleted*"])
+        self.assertEqual(self.rs.get("wide", "*", Rocketstore._COUNT), {"count": 1099})
+
+        items = list(self.rs.iter_records("wide", "*", Rocketstore._ORDER, fields=["id"]))
+        self.assertEqual(items[-1], ("01099", {"id": 1099}))
+        self.assertEqual(len(items), 1099)
+
+    def test_export_in_workers(self):
+        archive = "./tests/ddbb_decode_export.rsa"
+        try:
+            self.assertEqual(self.rs.export(archive)["records"], 1100)
+            self.rs.delete("wide")
+            self.rs.import_(archive)
+            self.assertEqual(self.rs.get("wide", "01099")["result"], [
+                {"id": 1099, "payload": "x" * 50}])
+        finally:
+            os.remove(archive)
+
+
+class TestKeyCache(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_key_cache")
+        self.rs.delete()
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_packed_keys(self):
+        keys = PackedKeys(["a", "b-1", "ü"])
+        keys.append("c")
+        self.assertEqual(list(keys), ["a", "b-1", "ü", "c"])
+        self.assertIn("b-1", keys)
+        self.assertNotIn("b", keys)
+        self.assertEqual(keys.remove_keys({"a", "zz"}), 1)
+        self.assertEqual((len(keys), list(keys)), (3, ["b-1", "ü", "c"]))
+
+    def test_large_collections_are_packed(self):
+        for i in range(PACK_THRESHOLD + 10):
+            self.rs.post("big", f"k{i}", i)
+        self.rs.get("big", "*", Rocketstore._KEYS)
+        self.rs.post("big", "extra", 1)
+        self.rs.delete("big", "k0")
+
+        info = self.rs.cache_info()["collections"]["big"]
+        self.assertTrue(info["packed"])
+        self.assertEqual(info["keys"], PACK_THRESHOLD + 10)
+        self.assertEqual(self.rs.get("big", "k1*", Rocketstore._COUNT)["count"], 1111)
+        self.assertEqual(self.rs.get("big", "extra")["result"], [1])
+
+    def test_memory_budget(self):
+        for name in ("a", "b", "c"):
+            for i in range(100):
+                self.rs.post(name, f"k{i}", i)
+            self.rs.get(name, "*", Rocketstore._KEYS)
+        size = self.rs.cache_info()["collections"]["a"]["bytes"]
+
+        self.rs.get("a", "k1")  # b is now the least recently used
+        self.rs.options(cache_memory=int(size * 2.5))
+        self.assertEqual(sorted(self.rs.cache_info()["collections"]), ["a", "c"])
+        self.assertLessEqual(self.rs.cache_info()["bytes"], int(size * 2.5))
+
+        # Evicted collections are read from disk again
+        self.assertEqual(self.rs.get("b", "*", Rocketstore._COUNT), {"count": 100})
+        self.assertEqual(len(self.rs.get("b", "*", Rocketstore._KEYS)["key"]), 100)
+
+
+class TestChangelog(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_changelog")
+        self.rs.delete()
+        self.rs.options(changelog=True)
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_changes(self):
+        self.rs.post("person", "a", 1)
+        self.rs.post("person", "b", 2)
+        self.rs.delete("person", "a")
+        with self.rs.batch() as batch:
+            batch.post("order", "1", {})
+        self.rs.delete("order")
+
+        changes = list(self.rs.changes())
+        self.assertEqual([(c["offset"], c["op"], c["collection"], c["key"]) for c in changes], [
+            (1, "post", "person", "a"),
+            (2, "post", "person", "b"),
+            (3, "delete", "person", "a"),
+            (4, "post", "order", "1"),
+            (5, "drop", "order", None),
+        ])
+
+        # Tail from the last offset seen
+        self.assertEqual(list(self.rs.changes(since=5)), [])
+        self.rs.post("person", "c", 3)
+        self.assertEqual([c["key"] for c in self.rs.changes(since=5)], ["c"])
+
+        # Offsets carry on after the whole storage area is deleted
+        self.rs.delete()
+        self.rs.post("person", "d", 4)
+        self.assertEqual([(c["offset"], c["op"]) for c in self.rs.changes(since=6)], [
+            (7, "drop"), (8, "post")])
+
+    def test_offsets_across_instances(self):
+        other = Rocketstore(data_storage_area="./tests/ddbb_changelog", changelog=True)
+        self.rs.post("person", "a", 1)
+        other.post("person", "b", 2)
+        self.rs.post("person", "c", 3)
+        self.assertEqual([(c["offset"], c["key"]) for c in other.changes()], [
+            (1, "a"), (2, "b"), (3, "c")])
+
+    def test_retention(self):
+        self.rs.options(changelog_segment_bytes=200, changelog_retention_bytes=400)
+        for i in range(40):
+            self.rs.post("person", f"k{i}", i)
+
+        changes = list(self.rs.changes())
+        self.assertEqual(changes[-1]["offset"], 40)
+        self.assertGreater(changes[0]["offset"], 1)
+        self.assertEqual([c["offset"] for c in changes],
+                         list(range(changes[0]["offset"], 41)))
+        with self.assertRaises(ValueError):
+            list(self.rs.changes(since=0))
+
+
+class TestAggregates(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_aggregates")
+        self.rs.delete()
+        for i, total in enumerate([10, 25.5, 5, "n/a"]):
+            self.rs.post("orders", f"o{i}", {"total": total, "tax": {"vat": i}})
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_incremental(self):
+        self.assertEqual(self.rs.define_aggregate("orders", "total"), {
+            "count": 3, "sum": 40.5, "min": 5, "max": 25.5})
+        self.assertEqual(self.rs.define_aggregate("orders", "tax.vat", ["sum"]), {"sum": 6})
+
+        self.rs.post("orders", "o4", {"total": 100})
+        self.rs.post("orders", "o0", {"total": 12})  # replaces 10
+        self.assertEqual(self.rs.aggregate("orders", "total"), {
+            "count": 4, "sum": 142.5, "min": 5, "max": 100})
+        self.assertEqual(self.rs.aggregate("orders", "tax.vat"), {"sum": 6})
+
+        # Deleting the max leaves it to be recomputed
+        self.rs.delete("orders", "o4")
+        self.rs.delete("orders", "o3")
+        self.assertEqual(self.rs.aggregate("orders", "total"), {
+            "count": 3, "sum": 42.5, "min": 5, "max": 25.5})
+
+        with self.assertRaises(ValueError):
+            self.rs.aggregate("orders", "nope")
+        with self.assertRaises(ValueError):
+            self.rs.define_aggregate("orders", "total", ["avg"])
+
+    def test_persisted(self):
+        self.rs.define_aggregate("orders", "total", ["count", "sum"])
+        self.rs.post("orders", "o9", {"total": 1})
+        self.rs.flush()
+
+        rs = Rocketstore(data_storage_area="./tests/ddbb_aggregates")
+        self.assertEqual(rs.aggregate("orders", "total"), {"count": 4, "sum": 41.5})
+        self.assertFalse(rs._aggregates_of(rs.collection("orders"))["total"].stale)
+
+        # Records added behind its back: the snapshot is recomputed
+        self.rs.post("orders", "o10", {"total": 2})
+        rs._cache_drop("orders")
+        self.assertEqual(rs.aggregate("orders", "total"), {"count": 5, "sum": 43.5})
+
+    def test_rewritten_by_other_writers(self):
+        self.rs.define_aggregate("orders", "total", ["sum"])
+        self.rs.flush()
+
+        # Another process rewrites o0 in place and exits without saving the aggregates
+        other = Rocketstore(data_storage_area="./tests/ddbb_aggregates")
+        other.post("orders", "o0", {"total": 1000})
+        other._aggregates_dirty.clear()
+
+        rs = Rocketstore(data_storage_area="./tests/ddbb_aggregates")
+        self.assertEqual(rs.aggregate("orders", "total"), {"sum": 1030.5})
+
+        # Later writes of others are seen too, own writes don't cost a recompute
+        other.post("orders", "o1", {"total": 0.5})
+        self.assertEqual(rs.aggregate("orders", "total"), {"sum": 1005.5})
+        rs.post("orders", "o2", {"total": 0})
+        rs.options(metrics=True)
+        self.assertEqual(rs.aggregate("orders", "total"), {"sum": 1000.5})
+        self.assertEqual(rs.stats()["files_opened"], 0)
+        self.assertLess(os.path.getsize("./tests/ddbb_aggregates/orders/.rocketstore/aggregates"), 1000)
+
+
+class TestColumns(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_columns", metrics=True)
+        self.rs.delete()
+        for i in range(30):
+            self.rs.post("orders", f"o{i:02}", {
+                "price": i, "country": ["DK", "SE", "NO"][i % 3],
+                "customer": {"vip": i % 10 == 0}, "note": "x"})
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_columns(self):
+        snap = self.rs.to_columns("orders", ["price", "country", "customer.vip", "nope"])
+        self.assertEqual(len(snap), 30)
+        self.assertEqual([snap[f].kind for f in snap.fields], ["int", "str", "bool", "object"])
+        self.assertEqual(snap["price"].data.typecode, "q")
+        self.assertEqual(snap["country"].dictionary, ["DK", "SE", "NO"])
+        self.assertEqual(snap.rows()[1], (1, "SE", False, None))
+
+        dk = snap.mask("country", "==", "DK")
+        cheap_dk = snap.mask("price", "<", 10, within=dk)
+        self.assertEqual(snap.select(cheap_dk), ["o00", "o03", "o06", "o09"])
+        self.assertEqual(snap.aggregate("price", cheap_dk),
+                         {"count": 4, "sum": 18, "min": 0, "max": 9})
+        self.assertEqual(snap.select(snap.mask("country", ">", "R")), [
+            f"o{i:02}" for i in range(1, 30, 3)])
+        self.assertEqual(len(snap.select(snap.mask("customer.vip", "==", True))), 3)
+
+        with self.assertRaises(ValueError):
+            snap.aggregate("country")
+        with self.assertRaises(ValueError):
+            snap.mask("price", "~", 1)
+        with self.assertRaises(ValueError):
+            self.rs.to_columns("orders", "price")
+
+    def test_incremental_refresh(self):
+        self.rs.to_columns("orders", ["price", "country"])
+        opened = self.rs.stats()["files_opened"]
+
+        # Unchanged: only the saved snapshot is read
+        snap = self.rs.to_columns("orders", ["country", "price"])
+        self.assertEqual(self.rs.stats()["files_opened"], opened)
+        self.assertEqual(snap.fields, ["country", "price"])
+
+        time.sleep(0.01)
+        self.rs.post("orders", "o01", {"price": 2.5, "country": "FI"})
+        self.rs.post("orders", "o99", {"price": None, "country": "DK"})
+        self.rs.delete("orders", "o02")
+        opened = self.rs.stats()["files_opened"]
+
+        snap = self.rs.to_columns("orders", ["price", "country"])
+        self.assertEqual(self.rs.stats()["files_opened"], opened + 2)
+        self.assertEqual(len(snap), 30)
+        self.assertEqual(snap["price"].kind, "float")
+        self.assertEqual(snap.rows()[1], (2.5, "FI"))
+        self.assertEqual(snap.rows()[-1], (None, "DK"))
+        self.assertNotIn("o02", snap.keys)
+        self.assertEqual(snap.aggregate("price")["count"], 29)
+
+
+class TestReplication(unittest.TestCase):
+    def setUp(self):
+        self.leader = Rocketstore(data_storage_area="./tests/ddbb_leader", changelog=True)
+        self.leader.delete()
+        for i in range(30):
+            self.leader.post("person", f"p{i}", {"n": i})
+        self.leader.post("orders", None, {"total": 5})
+        self.follower = Rocketstore(data_storage_area="./tests/ddbb_follower", read_only=True)
+
+    def tearDown(self):
+        for rs in (self.leader, self.follower):
+            rs.close()
+            rs.options(read_only=False)
+            rs.delete()
+
+    def test_follow(self):
+        # The first call copies the leader file by file
+        self.assertEqual(self.follower.follow("./tests/ddbb_leader"), 0)
+        self.assertEqual(self.follower.get("person")["count"], 30)
+        self.assertEqual(self.follower.get("orders", "1")["result"], [{"total": 5}])
+
+        self.leader.post("person", "p1", {"n": 100})
+        self.leader.delete("person", "p2")
+        self.leader.post("orders", None, {"total": 7})
+        self.leader.delete("orders")
+        self.leader.post("orders", None, {"total": 9})
+
+        info = self.follower.replication_info()
+        self.assertEqual(info["lag"], 7)  # sequences are logged too
+        self.assertGreater(info["lag_seconds"], 0)
+
+        self.assertEqual(self.follower.follow("./tests/ddbb_leader", batch_size=3), 7)
+        self.assertEqual(self.follower.get("person", "p1")["result"], [{"n": 100}])
+        self.assertEqual(self.follower.get("person")["count"], 29)
+        self.assertEqual(self.follower.get("orders")["result"], [{"total": 9}])
+        with open("./tests/ddbb_follower/orders_seq") as file:
+            self.assertEqual(file.read(), "1")
+
+        info = self.follower.replication_info()
+        self.assertEqual((info["lag"], info["applied"], info["resyncs"]), (0, 7, 1))
+
+        with self.assertRaises(PermissionError):
+            self.follower.post("person", "x", {})
+
+    def test_resync(self):
+        self.follower.follow("./tests/ddbb_leader")
+        self.leader.options(changelog_segment_bytes=200, changelog_retention_bytes=200)
+        for i in range(30, 60):
+            self.leader.post("person", f"p{i}", {"n": i})
+
+        # The changes were removed from the log before the follower got them
+        self.follower.follow("./tests/ddbb_leader")
+        self.assertEqual(self.follower.replication_info()["resyncs"], 2)
+        self.assertEqual(self.follower.get("person")["count"], 60)
+
+
+class TestNumericOrder(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_numeric")
+        self.rs.delete()
+        for i in range(12):
+            self.rs.post("events", "ev", {"n": i + 1}, Rocketstore._ADD_AUTO_INC)
+        self.rs.post("events", "note", {"n": 0})
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_order(self):
+        keys = self.rs.get("events", "*", Rocketstore._ORDER | Rocketstore._KEYS)["key"]
+        self.assertEqual(keys[:3], ["1-ev", "10-ev", "11-ev"])
+
+        keys = self.rs.get("events", "*", Rocketstore._ORDER_NUMERIC | Rocketstore._KEYS)["key"]
+        self.assertEqual(keys[:4], ["note", "1-ev", "2-ev", "3-ev"])
+        keys = self.rs.get("events", "*", Rocketstore._ORDER_NUMERIC | Rocketstore._ORDER_DESC
+                           | Rocketstore._KEYS)["key"]
+        self.assertEqual(keys[:2], ["12-ev", "11-ev"])
+
+    def test_latest(self):
+        result = self.rs.get("events", None, latest=3)
+        self.assertEqual(result["key"], ["12-ev", "11-ev", "10-ev"])
+        self.assertEqual(result["result"], [{"n": 12}, {"n": 11}, {"n": 10}])
+        self.assertEqual(self.rs.get("events", "*-ev", earliest=2)["key"], ["1-ev", "2-ev"])
+
+        # The index follows posts and deletes
+        self.rs.post("events", "ev", {"n": 13}, Rocketstore._ADD_AUTO_INC)
+        self.rs.delete("events", "12-ev")
+        self.assertEqual(self.rs.get("events", None, Rocketstore._KEYS, latest=2)["key"],
+                         ["13-ev", "11-ev"])
+        self.assertEqual(self.rs.get("events", None, Rocketstore._COUNT, latest=2), {"count": 2})
+
+        with self.assertRaises(ValueError):
+            self.rs.get("events", None, latest=2, earliest=2)
+        with self.assertRaises(ValueError):
+            self.rs.get("events", None, latest=0)
+
+
+class TestBlobs(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_blobs")
+        self.rs.delete()
+        self.data = os.urandom(3 * 1024 * 1024 + 17)
+        with open("./tests/ddbb_blobs_in.bin", "wb") as file:
+            file.write(self.data)
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+        os.remove("./tests/ddbb_blobs_in.bin")
+
+    def test_stream(self):
+        with open("./tests/ddbb_blobs_in.bin", "rb") as file:
+            result = self.rs.put_stream("files", "big.bin", file, content_type="image/png")
+        self.assertEqual(result, {"key": "big.bin", "count": 1, "size": len(self.data)})
+        self.rs.put_stream("files", "small", io.BytesIO(b"hello"), chunk_size=2)
+        self.rs.post("files", "meta", {"owner": "Adam"})
+
+        # Blobs are records of the collection
+        listing = self.rs.get("files", "*", Rocketstore._ORDER)
+        self.assertEqual(listing["key"], ["big.bin", "meta", "small"])
+        self.assertEqual(listing["result"][0],
+                         {"_blob": {"size": len(self.data), "content_type": "image/png"}})
+
+        with self.rs.open_stream("files", "big.bin") as stream:
+            self.assertEqual(stream.read(), self.data)
+        with self.rs.collection("files").open_stream("small") as stream:
+            self.assertEqual(stream.read(), b"hello")
+
+        with self.assertRaises(ValueError):
+            self.rs.open_stream("files", "meta")
+        with self.assertRaises(FileNotFoundError):
+            self.rs.open_stream("files", "nope")
+
+        self.rs.delete("files", "big.bin")
+        self.assertFalse(os.path.exists("./tests/ddbb_blobs/files/.rocketstore/blobs/big.bin"))
+
+    def test_export_import(self):
+        archive = "./tests/ddbb_blobs.rsa"
+        with open("./tests/ddbb_blobs_in.bin", "rb") as file:
+            self.rs.put_stream("files", "big.bin", file)
+        self.rs.put_stream("files", "empty", io.BytesIO(b""))
+        self.rs.post("files", "meta", {"owner": "Adam"})
+        try:
+            stats = self.rs.export(archive)
+            self.assertEqual((stats["records"], stats["blobs"]), (3, 2))
+            self.rs.delete()
+            self.assertEqual(self.rs.import_(archive)["blobs"], 2)
+        finally:
+            os.remove(archive)
+
+        with self.rs.open_stream("files", "big.bin") as stream:
+            self.assertEqual(stream.read(), self.data)
+        with self.rs.open_stream("files", "empty") as stream:
+            self.assertEqual(stream.read(), b"")
+
+        # A dump has no room for the bytes
+        with self.assertRaises(ValueError):
+            bulk.dump(self.rs, "files", "./tests/ddbb_blobs.jsonl")
+        os.remove("./tests/ddbb_blobs.jsonl")
+
+    def test_replaced(self):
+        self.rs.put_stream("files", "small", io.BytesIO(b"hello"))
+        self.rs.put_stream("files", "small", io.BytesIO(b"again"))
+        with self.rs.open_stream("files", "small") as stream:
+            self.assertEqual(stream.read(), b"again")
+
+        self.rs.post("files", "small", {"owner": "Adam"})
+        self.assertFalse(os.path.exists("./tests/ddbb_blobs/files/.rocketstore/blobs/small"))
+
+        # Collections that never had a blob don't look for bytes to remove
+        with mock.patch("os.remove") as remove:
+            self.rs.post("plain", "a", 1)
+            self.rs.post("plain", "a", 2)
+        remove.assert_not_called()
+
+
+class TestBloom(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_bloom", bloom=True)
+        self.rs.delete()
+        for i in range(500):
+            self.rs.post("users", f"u{i}", {"n": i})
+        self.rs.get("users", "u1")  # lists the collection, building the filter
+        self.rs.close()
+
+    def tearDown(self):
+        self.rs.delete()
+
+    def test_cold_misses(self):
+        rs = Rocketstore(data_storage_area="./tests/ddbb_bloom", bloom=True, metrics=True)
+        for i in range(100):
+            self.assertEqual(rs.get("users", f"nobody{i}"), {"count": 0})
+        self.assertEqual(rs.get_many("users", ["u7", "nobody"])["missing"], ["nobody"])
+
+        stats = rs.stats()
+        self.assertGreaterEqual(stats["bloom_negatives"], 95)
+        self.assertEqual(rs.get("users", "u7")["result"], [{"n": 7}])
+
+        # Keys posted later are added to the filter
+        rs.post("users", "new", {"n": -1})
+        rs._cache_drop("users")
+        self.assertEqual(rs.get("users", "new")["count"], 1)
+        rs.close()
+
+    def test_stale_filter(self):
+        # Written by an instance without the filter: the saved one is ignored
+        Rocketstore(data_storage_area="./tests/ddbb_bloom").post("users", "other", {})
+        rs = Rocketstore(data_storage_area="./tests/ddbb_bloom", bloom=True)
+        self.assertEqual(rs.get("users", "other")["count"], 1)
+
+        with self.assertRaises(ValueError):
+            rs.options(bloom_fp_rate=2.0)
+
+    def test_keys_of_other_writers(self):
+        # Another process adds a key after the filter was built, then this one
+        # writes and saves it: the saved filter must not miss the other key
+        rs = Rocketstore(data_storage_area="./tests/ddbb_bloom", bloom=True)
+        rs.get("users", "u1")
+        Rocketstore(data_storage_area="./tests/ddbb_bloom").post("users", "other", {})
+        rs.post("users", "mine", {})
+        rs.flush()
+
+        rs = Rocketstore(data_storage_area="./tests/ddbb_bloom", bloom=True)
+        self.assertEqual(rs.get("users", "other")["count"], 1)
+        self.assertEqual(rs.get("users", "mine")["count"], 1)
+
+    def test_own_writes_keep_the_filter_current(self):
+        rs = Rocketstore(data_storage_area="./tests/ddbb_bloom", bloom=True)
+        rs.get("users", "u1")
+
+        # Keys this instance posts are in the filter already: no listing to save it
+        with mock.patch.object(rs, "_listing", wraps=rs._listing) as listing:
+            for i in range(3):
+                rs.post("users", f"mine{i}", {})
+                rs.flush()
+        listing.assert_not_called()
+
+        rs = Rocketstore(data_storage_area="./tests/ddbb_bloom", bloom=True)
+        self.assertEqual(rs.get("users", "mine2")["count"], 1)
+
+
+class TestDedup(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_dedup", dedup=True, metrics=True)
+        self.rs.delete()
+        self.objects = os.path.join("./tests/ddbb_dedup", "cfg", ".rocketstore", "objects")
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+
+    def test_shared_payloads(self):
+        body = {"template": "x" * 2000}
+        for i in range(10):
+            self.rs.post("cfg", f"k{i}", body)
+        self.rs.post("cfg", "small", {"a": 1})
+
+        # One payload, written once, linked by every key
+        self.assertEqual(len(os.listdir(self.objects)), 1)
+        self.assertLess(self.rs.stats()["bytes_written"], 2 * 2020)
+        self.assertEqual(os.stat("./tests/ddbb_dedup/cfg/k3").st_nlink, 11)
+        self.assertEqual(os.stat("./tests/ddbb_dedup/cfg/small").st_nlink, 1)
+
+        found = self.rs.get("cfg", "k*")
+        self.assertEqual(found["result"], [body] * 10)
+        self.assertEqual(self.rs.stats()["dedup_hits"], 9)
+
+        # Rewriting a key never changes the others
+        self.rs.post("cfg", "k0", {"template": "y" * 2000})
+        self.assertEqual(self.rs.get("cfg", "k1")["result"], [body])
+        self.assertEqual(len(os.listdir(self.objects)), 2)
+
+    def test_release(self):
+        body = {"template": "x" * 2000}
+        for i in range(3):
+            self.rs.post("cfg", f"k{i}", body)
+
+        self.rs.delete("cfg", "k0")
+        self.rs.post("cfg", "k1", {"a": 1})
+        self.assertEqual(len(os.listdir(self.objects)), 1)
+
+        # The last key goes, and the payload with it; also without dedup on
+        plain = Rocketstore(data_storage_area="./tests/ddbb_dedup")
+        plain.post("cfg", "k2", {"b": 2})
+        self.assertEqual(os.listdir(self.objects), [])
+        self.assertEqual(self.rs.get("cfg", "k1")["result"], [{"a": 1}])
+
+        with self.assertRaises(ValueError):
+            self.rs.options(dedup_min_size=-1)
+
+    def test_linked_after_first_write(self):
+        # Written here before another instance starts sharing payloads
+        plain = Rocketstore(data_storage_area="./tests/ddbb_dedup")
+        plain.post("cfg", "x", {"a": 1})
+        body = {"template": "x" * 2000}
+        self.rs.post("cfg", "k1", body)
+        self.rs.post("cfg", "k2", body)
+
+        # Must not be rewritten in place, k2 links the same file
+        plain.post("cfg", "k1", {"b": 2})
+        self.assertEqual(self.rs.get("cfg", "k2")["result"], [body])
+        self.assertEqual(plain.get("cfg", "k1")["result"], [{"b": 2}])
+
+        # Collections without shared payloads are looked at once
+        with mock.patch("os.path.isdir", wraps=os.path.isdir) as isdir:
+            for i in range(10):
+                plain.post("plain", "x", {"n": i})
+        objects = [c for c in isdir.call_args_list if str(c.args[0]).endswith("objects")]
+        self.assertEqual(len(objects), 1)
+
+
+class TestBulk(unittest.TestCase):
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_bulk")
+        self.rs.delete()
+        os.makedirs("./tests/ddbb_bulk", exist_ok=True)
+        with open("./tests/ddbb_bulk_in.jsonl", "w") as file:
+            for i in range(1200):
+                file.write(json.dumps({"id": f"u{i:04}", "n": i}) + "\n")
+        with open("./tests/ddbb_bulk_in.csv", "w") as file:
+            file.write('id,name\nu1,"Adam, Jr."\nu2,Eve\n')
+
+    def tearDown(self):
+        self.rs.close()
+        self.rs.delete()
+        for name in ("in.jsonl", "in.csv", "out.jsonl.gz"):
+            if os.path.exists(f"./tests/ddbb_bulk_{name}"):
+                os.remove(f"./tests/ddbb_bulk_{name}")
+
+    def test_load_dump(self):
+        cli.main(["-d", "./tests/ddbb_bulk", "load", "users", "./tests/ddbb_bulk_in.jsonl",
+                  "-k", "id", "-w", "4", "-q"])
+        self.assertEqual(self.rs.get("users")["count"], 1200)
+        self.assertEqual(self.rs.get("users", "u0007")["result"], [{"id": "u0007", "n": 7}])
+
+        cli.main(["-d", "./tests/ddbb_bulk", "load", "csv", "./tests/ddbb_bulk_in.csv", "-q"])
+        self.assertEqual(self.rs.get("csv", "2")["result"], [{"id": "u2", "name": "Eve"}])
+
+        cli.main(["-d", "./tests/ddbb_bulk", "dump", "users", "./tests/ddbb_bulk_out.jsonl.gz",
+                  "-k", "_key", "-q"])
+        with gzip.open("./tests/ddbb_bulk_out.jsonl.gz", "rt") as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual(len(lines), 1200)
+        self.assertEqual(lines[0], {"_key": "u0000", "id": "u0000", "n": 0})
+        self.assertEqual([l["_key"] for l in lines], sorted(l["_key"] for l in lines))
+
+    def test_missing_key_field(self):
+        with self.assertRaises(ValueError):
+            bulk.load(self.rs, "users", [{"id": 1}, {"name": "x"}], key="id")
+
+
+class TestServer(unittest.TestCase):
+    address = "./tests/ddbb_server.sock"
+
+    def setUp(self):
+        self.rs = Rocketstore(data_storage_area="./tests/ddbb_server", sequence_block=10)
+        self.rs.delete()
+        self.server = make_server(self.rs, self.address)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = Client(self.address, pool_size=2)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.address)
+        self.rs.close()
+        self.rs.delete()
+
+    def test_calls(self):
+        self.assertEqual(self.client.post("person", "Adam", {"age": 30}),
+                         {"key": "Adam", "count": 1})
+        self.assertEqual(self.client.get("person", "Adam")["result"], [{"age": 30}])
+        self.assertEqual(self.client.get_many("person", ["Adam", "Eve"])["missing"], ["Eve"])
+        self.assertEqual(self.client.delete("person", "Adam")["count"], 1)
+        self.assertEqual(self.rs.get("person")["count"], 0)
+
+        with self.assertRaises(ValueError):
+            self.client.post("", "Adam", {})
+        with self.assertRaises(ValueError):
+            self.client.call("export", "/tmp/x.rsa")
+
+    def test_access(self):
+        self.assertEqual(os.stat(self.address).st_mode & 0o777, 0o600)
+
+        with self.assertRaises(ValueError):
+            make_server(self.rs, ("127.0.0.1", 0))
+        server = make_server(self.rs, ("127.0.0.1", 0), token="s3cret")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            address = server.server_address
+            client = Client(address, token="s3cret")
+            self.assertEqual(client.post("person", "Adam", {})["count"], 1)
+            client.close()
+            with self.assertRaises(PermissionError):
+                Client(address, token="guess").get("person", "Adam")
+            with self.assertRaises(PermissionError):
+                Client(address).get("person", "Adam")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # Larger than a request may be: the connection is closed before reading it
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(self.address)
+            sock.sendall(protocol.HEADER.pack(protocol.MAX_REQUEST + 1))
+            self.assertEqual(sock.recv(1), b"")
+
+    def test_pipeline(self):
+        with self.client.pipeline() as p:
+            for i in range(50):
+                p.post("items", f"i{i}", {"n": i})
+            p.get("items", "i7")
+        self.assertEqual(len(p.results), 51)
+        self.assertEqual(p.results[-1]["result"], [{"n": 7}])
+
+        # Larger than the socket buffers both ways
+        client = Client(self.address, timeout=30)
+        with client.pipeline() as p:
+            for i in range(3000):
+                p.post("big", f"b{i}", "x" * 4096)
+                p.get("big", f"b{i}")
+        self.assertEqual(p.results[-1]["result"], ["x" * 4096])
+        client.close()
+
+        p = self.client.pipeline()
+        p.get("items", "i1").post("", "i9", {}).get("items", "i2")
+        with self.assertRaises(ValueError):
+            p.execute()
+        self.assertEqual(p.results[2]["result"], [{"n": 2}])
+
+    def test_sequence_block(self):
+        def take():
+            for _ in range(25):
+                numbers.append(self.client.sequence("ids"))
+
+        numbers = []
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(numbers), list(range(1, 101)))
+        with open("./tests/ddbb_server/ids_seq") as file:
+            self.assertEqual(file.read(), "100")
+
+        # A new process starts after the block reserved on disk
+        other = Rocketstore(data_storage_area="./tests/ddbb_server")
+        self.assertEqual(other.sequence("ids"), 101)
+        self.assertEqual(self.client.sequence("ids"), 102)
+
+
 if __name__ == '__main__':
     unittest.main()